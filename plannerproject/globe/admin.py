@@ -1,4 +1,7 @@
 from django.contrib import admin
-from .models import Profile
+from .models import DestinationSearchStat, Profile, SavedTrip, StoredItinerary
 
 admin.site.register(Profile)
+admin.site.register(SavedTrip)
+admin.site.register(StoredItinerary)
+admin.site.register(DestinationSearchStat)
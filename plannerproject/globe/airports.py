@@ -0,0 +1,209 @@
+import csv
+import difflib
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import NamedTuple
+
+AIRPORTS_FILE = Path(__file__).resolve().parent / 'data' / 'airports.csv'
+
+
+class Airport(NamedTuple):
+    iata: str
+    city: str
+    country: str
+    lat: float
+    lng: float
+
+
+def normalize_place(name):
+    """Normalize a place name for lookups: 'São Paulo, Brazil ' -> 'sao paulo'"""
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    name = name.split(',')[0].lower()
+    name = re.sub(r'[^a-z0-9]+', ' ', name)
+    return name.strip()
+
+
+class AirportIndex:
+    """In-memory airport/city index backed by flat arrays.
+
+    Record fields live in parallel lists/arrays. Every searchable name (city,
+    aliases, IATA code) is kept in one sorted key list with a parallel array
+    of record positions, so exact and prefix lookups are a bisect away.
+    """
+
+    min_prefix = 3
+    # Fuzzy matching is only for typos: near-identical names a letter or two apart
+    fuzzy_cutoff = 0.9
+    fuzzy_max_edits = 2
+
+    def __init__(self, rows=()):
+        self.codes = []
+        self.cities = []
+        self.countries = []
+        self.lats = array('d')
+        self.lngs = array('d')
+        self._keys = []
+        self._refs = array('I')
+        self._learned = {}
+        self._lock = threading.Lock()
+
+        entries = []
+        for iata, city, country, lat, lng, aliases in rows:
+            position = len(self.codes)
+            self.codes.append(iata)
+            self.cities.append(city)
+            self.countries.append(country)
+            self.lats.append(lat)
+            self.lngs.append(lng)
+            names = {normalize_place(city), iata.lower()}
+            names.update(normalize_place(alias) for alias in aliases)
+            entries.extend((name, position) for name in names if name)
+
+        entries.sort()
+        for name, position in entries:
+            self._keys.append(name)
+            self._refs.append(position)
+
+    @classmethod
+    def from_csv(cls, path=AIRPORTS_FILE):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [
+                (
+                    row['iata'], row['city'], row['country'],
+                    float(row['latitude']), float(row['longitude']),
+                    [alias for alias in row['aliases'].split('|') if alias],
+                )
+                for row in csv.DictReader(f)
+            ]
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def record(self, position):
+        return Airport(
+            self.codes[position], self.cities[position], self.countries[position],
+            self.lats[position], self.lngs[position],
+        )
+
+    def __iter__(self):
+        return (self.record(position) for position in range(len(self.codes)))
+
+    def names(self):
+        """Yield ``(normalized name, Airport)`` for every city, alias and code"""
+        for key, position in zip(self._keys, self._refs):
+            yield key, self.record(position)
+
+    def find(self, name):
+        """Return the ``Airport`` for a city/alias/IATA code, or None.
+
+        Tries an exact match, then an unambiguous prefix ('bengal' ->
+        Bengaluru), then a typo-sized fuzzy match ('hyderbad' -> Hyderabad).
+        Anything looser returns None so the caller asks the live API instead
+        of guessing; 'bern' must not become Berlin. Results learned from the
+        live API are only known by code, so they come back without
+        coordinates.
+        """
+        key = normalize_place(name)
+        if not key:
+            return None
+
+        position = self._exact(key)
+        if position is None:
+            learned = self._learned.get(key)
+            if learned:
+                return Airport(learned, name.strip(), '', None, None)
+            position = self._prefix(key)
+        if position is None:
+            position = self._fuzzy(key)
+        if position is not None:
+            return self.record(position)
+        return None
+
+    def find_city(self, name):
+        """Return the ``Airport`` whose own city is exactly ``name``, or None.
+
+        Aliases, codes, prefixes and typos are left out: 'Maldives' finds
+        the airport at Male but is not at Male's coordinates.
+        """
+        key = normalize_place(name)
+        position = self._exact(key) if key else None
+        if position is not None and normalize_place(self.cities[position]) == key:
+            return self.record(position)
+        return None
+
+    def find_code(self, name):
+        airport = self.find(name)
+        return airport.iata if airport else None
+
+    def remember(self, name, iata):
+        """Add a code resolved elsewhere (e.g. the Amadeus API) to the index"""
+        key = normalize_place(name)
+        if key and iata:
+            with self._lock:
+                self._learned[key] = iata
+
+    def _exact(self, key):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._refs[i]
+        return None
+
+    def _prefix(self, key):
+        if len(key) < self.min_prefix:
+            return None
+        i = bisect_left(self._keys, key)
+        matches = set()
+        while i < len(self._keys) and self._keys[i].startswith(key):
+            matches.add(self._refs[i])
+            if len(matches) > 1:
+                return None  # Ambiguous, e.g. 'san' -> San Diego / San Francisco
+            i += 1
+        return matches.pop() if matches else None
+
+    def _fuzzy(self, key):
+        if len(key) < self.min_prefix:
+            return None
+        # Typos rarely hit the first letter, so only compare against keys
+        # sharing it; that keeps the scan to a small slice of the index.
+        start = bisect_left(self._keys, key[0])
+        end = bisect_left(self._keys, chr(ord(key[0]) + 1))
+        close = difflib.get_close_matches(key, self._keys[start:end], n=1, cutoff=self.fuzzy_cutoff)
+        if close and edit_distance(key, close[0], self.fuzzy_max_edits) <= self.fuzzy_max_edits:
+            return self._exact(close[0])
+        return None
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index():
+    """Return the process-wide airport index, loading the bundled dataset on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex.from_csv()
+    return _index
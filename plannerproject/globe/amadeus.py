@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .clients import get_client
+
+AMADEUS_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
+
+
+class AmadeusTokenProvider:
+    """Shares one Amadeus OAuth token across requests and workers.
+
+    The token lives in the Django cache for its ``expires_in`` lifetime and is
+    refreshed ``refresh_margin`` seconds before it runs out. Refreshes are
+    single-flight: a thread lock covers the current process and a cache lock
+    covers the other workers, so a burst of searches costs one token request.
+    """
+
+    cache_key = 'amadeus_access_token'
+    lock_key = 'amadeus_access_token_lock'
+
+    def __init__(self, refresh_margin=None, lock_timeout=10):
+        if refresh_margin is None:
+            refresh_margin = getattr(settings, 'AMADEUS_TOKEN_REFRESH_MARGIN', 120)
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        """Return a valid access token, refreshing it if needed"""
+        entry = cache.get(self.cache_key)
+        if self._is_fresh(entry):
+            return entry['token']
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            entry = cache.get(self.cache_key)
+            if self._is_fresh(entry):
+                return entry['token']
+            return self._refresh(entry)
+
+    def invalidate(self, token):
+        """Drop ``token`` from the cache, e.g. after Amadeus rejected it with a 401"""
+        entry = cache.get(self.cache_key)
+        if entry and entry['token'] == token:
+            cache.delete(self.cache_key)
+
+    def _is_fresh(self, entry):
+        return bool(entry) and entry['expires_at'] - self.refresh_margin > time.time()
+
+    def _is_valid(self, entry):
+        return bool(entry) and entry['expires_at'] > time.time()
+
+    def _refresh(self, stale_entry):
+        if cache.add(self.lock_key, True, self.lock_timeout):
+            try:
+                token = self._fetch()
+            finally:
+                cache.delete(self.lock_key)
+            if token is None and self._is_valid(stale_entry):
+                # The early refresh failed; the current token still works
+                return stale_entry['token']
+            return token
+
+        # Another worker is refreshing. Keep using the current token if it is
+        # still valid, otherwise wait for the new one to land in the cache.
+        if self._is_valid(stale_entry):
+            return stale_entry['token']
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(self.cache_key)
+            if self._is_valid(entry):
+                return entry['token']
+            if cache.get(self.lock_key) is None:
+                break
+        return self._fetch()
+
+    def _fetch(self):
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': settings.AMADEUS_API_KEY,
+            'client_secret': settings.AMADEUS_API_SECRET
+        }
+
+        try:
+            response = get_client('amadeus').post(AMADEUS_TOKEN_URL, data=data)
+            print(f"Token response status: {response.status_code}")  # Debug
+            if response.status_code == 200:
+                payload = response.json()
+                expires_in = int(payload.get('expires_in', 1799))
+                entry = {
+                    'token': payload['access_token'],
+                    'expires_at': time.time() + expires_in,
+                }
+                cache.set(self.cache_key, entry, expires_in)
+                return entry['token']
+            else:
+                print(f"Token error: {response.text}")  # Debug
+        except Exception as e:
+            print(f"Error getting Amadeus token: {e}")
+        return None
+
+
+token_provider = AmadeusTokenProvider()
+
+
+def amadeus_get(url, params, access_token=None):
+    """GET an Amadeus endpoint, retrying once with a fresh token on a 401"""
+    token = access_token or token_provider.get_token()
+    if not token:
+        raise RuntimeError("No Amadeus access token available")
+
+    client = get_client('amadeus')
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    if response.status_code == 401:
+        print("Amadeus token rejected, refreshing")  # Debug
+        token_provider.invalidate(token)
+        token = token_provider.get_token()
+        if token:
+            response = client.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    return response
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class GlobeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'globe'
+
+    def ready(self):
+        # Load the bundled airport index once per process, before the first search
+        from .airports import get_airport_index
+        get_airport_index()
+
+        from django.conf import settings
+        if settings.PROVIDER_STUBS:
+            from .stubs import install
+            install(latency=settings.PROVIDER_STUB_LATENCY, error_rate=settings.PROVIDER_STUB_ERROR_RATE)
+            print("PROVIDER_STUBS is on: external providers are answered from recorded fixtures")
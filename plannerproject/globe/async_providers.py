@@ -0,0 +1,250 @@
+"""Coroutine versions of ``globe.providers`` for the async views.
+
+HTTP calls go through ``AsyncProviderClient`` and Gemini through its async
+API, so a slow provider holds no thread. Work that only touches the cache
+or database is handed to ``sync_to_async``.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .airports import get_airport_index
+from .amadeus import token_provider
+from .clients import get_async_client
+from .geocoding import get_coords as _get_coords
+from .hotels import hotel_id_chunks, merge_offers, nearest_hotels, stay_nights
+from .itinerary import (
+    build_itinerary_prompt, cache_itinerary, clean_itinerary, get_cached_itinerary as _get_cached_itinerary,
+    get_itinerary_model, itinerary_cache_key,
+)
+from .providers import (
+    AMADEUS_FLIGHT_OFFERS_URL, AMADEUS_HOTEL_OFFERS_URL, AMADEUS_HOTELS_BY_CITY_URL, AMADEUS_LOCATIONS_URL,
+    EXCHANGE_RATES_URL, GOOGLE_PLACES_URL, OPENWEATHER_FORECAST_URL, add_place_images, airport_code_cache_key,
+    airport_search_params, flight_call_params, flight_search_params, hotel_list_call_params, hotel_list_params,
+    hotel_offers_call_params, hotel_offers_params, parse_exchange_rates, parse_weather, pick_airport_code,
+    place_call_params, places_params, rates_call_params, weather_call_params, weather_params,
+)
+from .response_cache import cached_response
+from .singleflight import do_async, single_flight
+
+# Geocoding reads the ORM, so it runs on the request's sync thread where
+# Django manages the connection. The itinerary lookup only touches the cache.
+get_coords = sync_to_async(_get_coords)
+get_cached_itinerary = sync_to_async(_get_cached_itinerary, thread_sensitive=False)
+
+
+async def get_amadeus_token():
+    """Get access token from Amadeus API (shared and reused until it expires)"""
+    # The provider's locks are thread locks, so refresh it in a worker thread
+    return await sync_to_async(token_provider.get_token, thread_sensitive=False)()
+
+
+async def amadeus_get(url, params, access_token=None):
+    """GET an Amadeus endpoint, retrying once with a fresh token on a 401"""
+    token = access_token or await get_amadeus_token()
+    if not token:
+        raise RuntimeError("No Amadeus access token available")
+
+    client = get_async_client('amadeus')
+    response = await client.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    if response.status_code == 401:
+        print("Amadeus token rejected, refreshing")  # Debug
+        await sync_to_async(token_provider.invalidate, thread_sensitive=False)(token)
+        token = await get_amadeus_token()
+        if token:
+            response = await client.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    return response
+
+
+async def get_airport_code(city_name, access_token=None):
+    """Get IATA airport code for a city with fallback options"""
+    airport_index = get_airport_index()
+    code = airport_index.find_code(city_name)
+    if code:
+        return code
+
+    cache_key = airport_code_cache_key(city_name)
+    code = await cache.aget(cache_key)
+    if code:
+        airport_index.remember(city_name, code)
+        return code
+
+    try:
+        response = await amadeus_get(AMADEUS_LOCATIONS_URL, airport_search_params(city_name), access_token)
+        print(f"Airport search for {city_name}: {response.status_code}")  # Debug
+
+        if response.status_code == 200:
+            code = pick_airport_code(response.json().get('data', []))
+            if code:
+                airport_index.remember(city_name, code)
+                await cache.aset(cache_key, code, settings.AIRPORT_CODE_CACHE_TIMEOUT)
+                return code
+        else:
+            print(f"Airport search error: {response.text}")  # Debug
+
+    except Exception as e:
+        print(f"Error getting airport code for {city_name}: {e}")
+    return None
+
+
+@cached_response('flights', flight_call_params)
+@single_flight('flights', flight_call_params)
+async def search_flights(origin_code, destination_code, departure_date, access_token=None, adults=1):
+    """Search for flights using Amadeus API"""
+    params = flight_search_params(origin_code, destination_code, departure_date, adults)
+
+    try:
+        response = await amadeus_get(AMADEUS_FLIGHT_OFFERS_URL, params, access_token)
+        print(f"Flight search response: {response.status_code}")  # Debug
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            print(f"Flight search error: {response.text}")  # Debug
+
+    except Exception as e:
+        print(f"Error searching flights: {e}")
+    return None
+
+
+@cached_response('google_places', place_call_params)
+@single_flight('google_places', place_call_params)
+async def get_google_places(city_name):
+    """Fetch top attractions for a given city using Google Places API."""
+    params = places_params(city_name)
+    try:
+        response = await get_async_client('google_places').get(GOOGLE_PLACES_URL, params=params)
+        if response.status_code == 200:
+            return add_place_images(response.json().get("results", []), params['key'])
+        else:
+            print(f"Google Places error: {response.text}")
+    except Exception as e:
+        print(f"Error fetching Google Places data: {e}")
+    return []
+
+
+@cached_response('hotel_list', hotel_list_call_params)
+@single_flight('hotel_list', hotel_list_call_params)
+async def get_city_hotels(city_code, access_token=None):
+    """The hotels nearest a city's centre, from the Amadeus hotel list"""
+    try:
+        response = await amadeus_get(AMADEUS_HOTELS_BY_CITY_URL, hotel_list_params(city_code), access_token)
+        print(f"Hotel list response: {response.status_code}")
+
+        if response.status_code == 200:
+            return nearest_hotels(response.json().get('data', []), settings.HOTEL_SEARCH_HOTELS)
+        else:
+            print(f"Hotel list error: {response.text}")
+    except Exception as e:
+        print(f"Error listing hotels: {e}")
+    return []
+
+
+@cached_response('hotel_offers', hotel_offers_call_params)
+@single_flight('hotel_offers', hotel_offers_call_params)
+async def get_hotel_offers(hotel_ids, checkin_date, checkout_date, access_token=None, adults=1):
+    """Offers for some hotels and dates using Amadeus API; None if the request failed"""
+    params = hotel_offers_params(hotel_ids, checkin_date, checkout_date, adults)
+
+    try:
+        response = await amadeus_get(AMADEUS_HOTEL_OFFERS_URL, params, access_token)
+        print(f"Hotel offers response: {response.status_code}")
+
+        if response.status_code == 200:
+            return response.json().get('data', [])
+        else:
+            print(f"Hotel offers error: {response.text}")
+    except Exception as e:
+        print(f"Error getting hotel offers: {e}")
+    return None
+
+
+# Keeps offer requests a search stopped waiting for alive, so their answers
+# still reach the cache
+_hotel_offer_tasks = set()
+
+
+async def search_hotels(city_code, checkin_date, checkout_date, access_token=None, adults=1):
+    """Hotels with their best offer for the dates, within ``HOTEL_SEARCH_BUDGET`` (see ``globe.hotels``)"""
+    deadline = time.monotonic() + settings.HOTEL_SEARCH_BUDGET
+    hotels = await get_city_hotels(city_code, access_token)
+    chunks = hotel_id_chunks(hotels, settings.HOTEL_OFFERS_CHUNK_SIZE)
+    tasks = [
+        asyncio.ensure_future(get_hotel_offers(chunk, checkin_date, checkout_date, access_token, adults))
+        for chunk in chunks
+    ]
+    late = set()
+    if tasks:
+        _, late = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+    for task in late:
+        _hotel_offer_tasks.add(task)
+        task.add_done_callback(_hotel_offer_tasks.discard)
+    if late:
+        print(f"Hotel offers: {len(late)} of {len(tasks)} requests missed the {settings.HOTEL_SEARCH_BUDGET}s budget")
+    answers = [(chunk, task.result()) for chunk, task in zip(chunks, tasks) if task not in late]
+    return merge_offers(hotels, answers, stay_nights(checkin_date, checkout_date))
+
+
+@cached_response('weather', weather_call_params)
+@single_flight('weather', weather_call_params)
+async def get_weather(city_name):
+    """Get the 5-day forecast using OpenWeather API (see ``weather.parse_forecast``)"""
+    params = weather_params(city_name)
+    if not params['appid']:
+        print("Warning: OPENWEATHER_API_KEY not found in environment variables")
+        return None
+
+    try:
+        response = await get_async_client('openweather').get(OPENWEATHER_FORECAST_URL, params=params)
+        print(f"Weather API response status: {response.status_code}")
+
+        if response.status_code == 200:
+            return parse_weather(response.json())
+        else:
+            print(f"Weather API error: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"Error fetching weather data: {e}")
+    return None
+
+
+@cached_response('exchange_rates', rates_call_params)
+@single_flight('exchange_rates', rates_call_params)
+async def get_exchange_rates(base):
+    """Exchange-rate table for ``base`` from the open ExchangeRate-API"""
+    try:
+        response = await get_async_client('exchange_rates').get(EXCHANGE_RATES_URL.format(base=base.upper()))
+        print(f"Exchange rates response: {response.status_code}")
+
+        if response.status_code == 200:
+            return parse_exchange_rates(response.json())
+        else:
+            print(f"Exchange rates error: {response.text}")
+    except Exception as e:
+        print(f"Error fetching exchange rates: {e}")
+    return None
+
+
+async def generate_itinerary(dest, attractions, num_days=3):
+    """Generate or retrieve cached itinerary for a destination"""
+    cached_itinerary = await get_cached_itinerary(dest, attractions, num_days)
+    if cached_itinerary:
+        print(f"Using cached itinerary for {dest} ({num_days} days)")
+        return cached_itinerary
+
+    async def fetch():
+        model = get_itinerary_model()
+        response = await model.generate_content_async(build_itinerary_prompt(dest, attractions, num_days))
+        itinerary = clean_itinerary(response.text)
+        await sync_to_async(cache_itinerary, thread_sensitive=False)(dest, attractions, num_days, itinerary)
+        return itinerary
+
+    try:
+        # Concurrent misses for the same trip share one model call
+        itinerary_cleaned = await do_async('itinerary', itinerary_cache_key(dest, attractions, num_days), fetch)
+    except Exception as e:
+        itinerary_cleaned = f"Could not generate itinerary: {str(e)}"
+
+    return itinerary_cleaned
@@ -0,0 +1,137 @@
+"""Async versions of the I/O-bound views, used when ``ASYNC_VIEWS`` is on.
+
+Served by an ASGI server (``uvicorn plannerproject.asgi:application``) a
+trip search or chat reply waits on the event loop instead of holding a
+worker thread, so one process can keep hundreds of them in flight.
+
+Streaming responses need an async iterator under ASGI: Django reads a sync
+one to the end before sending anything. The chat reply streams from
+Gemini's async API; the itinerary stream and the bulk zip keep their sync
+generators, advanced one item at a time in a worker thread.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+
+from . import async_providers, views
+from .pipeline import run_stages_async
+from .pregeneration import record_search
+from .trip_search import build_trip_context, parse_trip_search, trip_search_stages, trip_session_data
+from .views import build_chat_context, get_chat_model, read_chat_message, save_chat_exchange, sse_event, sse_response
+
+
+async def home(request):
+    context = {}
+
+    if request.method == "POST":
+        search = parse_trip_search(request.POST)
+        await sync_to_async(record_search)(search.dest, search.num_days)
+        results, failed_stages = await run_stages_async(trip_search_stages(search, async_providers))
+        context = build_trip_context(search, results, failed_stages)
+        await request.session.aupdate(trip_session_data(search, context))
+
+    # Templates read request.user, which may hit the database
+    return await sync_to_async(render)(request, "globe/home.html", context)
+
+
+@csrf_exempt
+async def chatbot(request):
+    """AI Travel Chatbot using Gemini"""
+    if request.method == 'POST':
+        try:
+            user_message = read_chat_message(request)
+
+            if not user_message:
+                return JsonResponse({'error': 'Message is required'}, status=400)
+
+            # Sessions may be database-backed, so load them off the event loop
+            chat_context = await sync_to_async(build_chat_context)(request.session, user_message)
+            model = get_chat_model()
+            response = await model.generate_content_async(chat_context)
+            bot_response = response.text.strip()
+
+            await sync_to_async(save_chat_exchange)(request.session, user_message, bot_response)
+
+            return JsonResponse({
+                'response': bot_response,
+                'success': True
+            })
+
+        except Exception as e:
+            print(f"Chatbot error: {e}")
+            return JsonResponse({
+                'error': 'Sorry, I encountered an error. Please try again.',
+                'success': False
+            }, status=500)
+
+    return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+
+@csrf_exempt
+async def chatbot_stream(request):
+    """Async ``views.chatbot_stream``: the reply is sent as Gemini produces it"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        user_message = read_chat_message(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not user_message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+
+    chat_context = await sync_to_async(build_chat_context)(request.session, user_message)
+    # As in the sync view, the history is saved once the reply is complete
+    await request.session.asetdefault('chat_history', [])
+    request.session.modified = True
+
+    async def events():
+        parts = []
+        try:
+            response = await get_chat_model().generate_content_async(chat_context, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield sse_event('chunk', {'text': chunk.text})
+
+            bot_response = ''.join(parts).strip()
+            save_chat_exchange(request.session, user_message, bot_response)
+            await request.session.asave()
+            yield sse_event('done', {'text': bot_response})
+        except Exception as e:
+            print(f"Chatbot error: {e}")
+            yield sse_event('error', {'message': 'Sorry, I encountered an error. Please try again.'})
+
+    return sse_response(events())
+
+
+_done = object()
+
+
+async def iterate_in_thread(iterator):
+    """Iterate a blocking iterator from the event loop, one item per trip to a worker thread"""
+    iterator = iter(iterator)
+    next_item = sync_to_async(next, thread_sensitive=False)
+    while (item := await next_item(iterator, _done)) is not _done:
+        yield item
+
+
+def streaming_in_thread(view):
+    """Async version of a sync view whose streaming response should be sent as it is produced"""
+    sync_view = sync_to_async(view)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        response = await sync_view(request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = iterate_in_thread(response.streaming_content)
+        return response
+
+    return async_view
+
+
+itinerary_stream = streaming_in_thread(views.itinerary_stream)
+export_trips_pdf = streaming_in_thread(views.export_trips_pdf)
@@ -0,0 +1,109 @@
+"""Load-generation helpers for the benchmark management commands"""
+import asyncio
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.urls import include, path
+
+from .urls import build_urlpatterns
+
+
+class BenchURLConf:
+    """A ROOT_URLCONF serving the app with the sync or the async views"""
+
+    def __init__(self, use_async_views):
+        self.urlpatterns = [path('', include(build_urlpatterns(use_async_views)))]
+
+
+def bench_settings(**overrides):
+    """``override_settings`` for driving the app through the test clients from a command.
+
+    The clients send ``Host: testserver``, which only the test runner adds
+    to ``ALLOWED_HOSTS``; without it every request is a 400.
+    """
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], **overrides)
+
+
+def checked_status(response, expected=(200,), server_errors=False):
+    """The response's status code, raising ``CommandError`` for an unexpected one.
+
+    Timing error pages measures nothing, so a misconfigured run stops at
+    the first bad response. With ``server_errors`` 5xx responses are let
+    through to be counted, for runs that inject provider failures.
+    """
+    status = response.status_code
+    if status in expected or (server_errors and status >= 500):
+        return status
+    body = b'' if response.streaming else response.content[:200]
+    raise CommandError(f"Benchmark request returned {status}, expected {'/'.join(map(str, expected))}: {body!r}")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def run_threaded(call, requests, concurrency):
+    """Run ``call(i)`` ``requests`` times on ``concurrency`` threads.
+
+    ``call`` returns an HTTP status. Returns ``(elapsed, outcomes)`` where
+    outcomes are ``(seconds, status)`` pairs.
+    """
+    def timed(i):
+        started = time.perf_counter()
+        status = call(i)
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, range(requests)))
+    return time.perf_counter() - started, outcomes
+
+
+async def run_concurrent(call, requests, concurrency):
+    """Async version of ``run_threaded``: at most ``concurrency`` ``await call(i)`` at once"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with semaphore:
+            started = time.perf_counter()
+            status = await call(i)
+            return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed(i) for i in range(requests)))
+    return time.perf_counter() - started, outcomes
+
+
+def summarize(elapsed, outcomes):
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    return {
+        'requests': len(outcomes),
+        'errors': sum(1 for _, status in outcomes if status != 200),
+        'throughput': len(outcomes) / elapsed if elapsed else 0.0,
+        'mean': statistics.fmean(latencies) if latencies else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1] if latencies else None,
+        'elapsed': elapsed,
+    }
+
+
+def format_summary(label, summary):
+    def ms(seconds):
+        return f"{seconds * 1000:.0f}ms" if seconds is not None else "n/a"
+
+    return (
+        f"{label}: {summary['throughput']:.1f} req/s, "
+        f"p50 {ms(summary['p50'])}, p95 {ms(summary['p95'])}, p99 {ms(summary['p99'])}, max {ms(summary['max'])}, "
+        f"{summary['errors']}/{summary['requests']} errors, {summary['elapsed']:.2f}s total"
+    )
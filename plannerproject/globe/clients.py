@@ -0,0 +1,282 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_failure(status_code):
+    """Whether a final response counts against the breaker: server errors, and rate limits outlasting the retries"""
+    return status_code >= 500 or status_code == 429
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a provider after repeated failures.
+
+    After ``threshold`` consecutive failures the breaker opens and calls fail
+    fast for ``cooldown`` seconds. Then a single trial call is let through;
+    if it succeeds the breaker closes again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def abandon_trial(self):
+        """Let another trial through; for a trial call cancelled before it finished"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class ProviderClient:
+    """HTTP client for one external provider.
+
+    Keeps a pooled keep-alive session per host, applies connect/read
+    timeouts, retries connection errors and 429/5xx responses with jittered
+    exponential backoff, and guards the provider with a circuit breaker.
+    """
+
+    def __init__(self, name, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff=None, breaker_threshold=None, breaker_cooldown=None, pool_size=None):
+        options = getattr(settings, 'PROVIDER_CLIENTS', {}).get(name, {})
+
+        def option(key, value):
+            if value is not None:
+                return value
+            return options.get(key, getattr(settings, f'PROVIDER_{key.upper()}'))
+
+        self.name = name
+        self.timeout = (option('connect_timeout', connect_timeout), option('read_timeout', read_timeout))
+        self.max_retries = option('max_retries', max_retries)
+        self.backoff = option('backoff', backoff)
+        self.pool_size = option('pool_size', pool_size)
+        self.breaker = CircuitBreaker(
+            option('breaker_threshold', breaker_threshold),
+            option('breaker_cooldown', breaker_cooldown),
+        )
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        """Return the shared session for the host of ``url``"""
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = self.make_adapter()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._sessions[host] = session
+        return session
+
+    def make_adapter(self):
+        return HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request and return the final response.
+
+        Raises ``CircuitOpenError`` while the breaker is open, or the last
+        ``requests`` exception once retries are used up.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable, skipping call")
+
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session_for(url)
+        attempt = 0
+        while True:
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                print(f"{self.name} request failed ({e}), retrying")  # Debug
+            except Exception:
+                # Not worth retrying, but it must still end a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    if is_failure(response.status_code):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return response
+                print(f"{self.name} returned {response.status_code}, retrying")  # Debug
+
+            attempt += 1
+            # Full jitter: sleep a random time up to the exponential backoff
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Return the shared ``ProviderClient`` for a provider, creating it on first use"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(name)
+    return client
+
+
+class AsyncProviderClient:
+    """``httpx`` counterpart of ``ProviderClient`` for async views.
+
+    Shares the sync client's settings and circuit breaker, so a provider
+    that is down is skipped by both code paths. httpx clients are bound to
+    the event loop they were created on, so one is kept per loop.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.sync_client = get_client(name)
+        self.breaker = self.sync_client.breaker
+        connect_timeout, read_timeout = self.sync_client.timeout
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=self.sync_client.pool_size * 5,
+            max_keepalive_connections=self.sync_client.pool_size,
+        )
+        self._clients = weakref.WeakKeyDictionary()
+
+    def http_client(self):
+        """Return the ``httpx.AsyncClient`` for the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout, limits=self.limits, transport=self.make_transport(),
+            )
+        return client
+
+    def make_transport(self):
+        """The httpx transport to send requests through; None for the default"""
+        return None
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        """Send a request and return the final response.
+
+        Raises ``CircuitOpenError`` while the breaker is open, or the last
+        ``httpx`` exception once retries are used up.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable, skipping call")
+
+        client = self.http_client()
+        max_retries, backoff = self.sync_client.max_retries, self.sync_client.backoff
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt >= max_retries:
+                        self.breaker.record_failure()
+                        raise
+                    print(f"{self.name} request failed ({e}), retrying")  # Debug
+                except Exception:
+                    # Not worth retrying, but it must still end a half-open trial
+                    self.breaker.record_failure()
+                    raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                        if is_failure(response.status_code):
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+                        return response
+                    print(f"{self.name} returned {response.status_code}, retrying")  # Debug
+
+                attempt += 1
+                # Full jitter: sleep a random time up to the exponential backoff
+                await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+        except asyncio.CancelledError:
+            # A stage timeout cancelled the call; that isn't the provider's fault
+            self.breaker.abandon_trial()
+            raise
+
+
+_async_clients = {}
+_async_clients_lock = threading.Lock()
+
+
+def get_async_client(name):
+    """Return the shared ``AsyncProviderClient`` for a provider, creating it on first use"""
+    client = _async_clients.get(name)
+    if client is None:
+        with _async_clients_lock:
+            client = _async_clients.get(name)
+            if client is None:
+                client = _async_clients[name] = AsyncProviderClient(name)
+    return client
+
+
+def reset_clients():
+    """Drop the shared clients so the next call builds fresh ones, e.g. after swapping transports"""
+    with _clients_lock:
+        _clients.clear()
+    with _async_clients_lock:
+        _async_clients.clear()
@@ -0,0 +1,278 @@
+"""Trip cost estimate: flights, hotel nights and daily spending.
+
+The estimate is plain data kept in the session. It holds the inputs (dates,
+the flight and hotel choices offered by the search, the chosen ones) and
+each part already worked out in ``COST_CURRENCY``:
+
+* ``flights``: the chosen outbound and return offers, the cheapest by default;
+* ``lodging``: the chosen hotel's nightly rate times the nights of the stay;
+* ``daily_spend``: food, local transport and activities per day at the
+  destination, from the table in data/daily_spend.csv, times the trip's days.
+
+Amounts in other currencies are converted with the exchange-rate table for
+``COST_CURRENCY``, which the providers fetch and cache like any other
+response. ``update_estimate`` applies a change of dates, flight or hotel
+and recomputes only the parts that depend on it.
+
+Flight and hotel offers are priced for the dates they were searched for.
+A change of dates that doesn't come with offers for the new dates leaves
+those parts in ``stale_parts`` until it does; the cost endpoint and the
+page's sections search them again through the cached providers.
+"""
+import csv
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+
+from .airports import get_airport_index, normalize_place
+from .hotels import stay_nights
+
+SPEND_FILE = Path(__file__).resolve().parent / 'data' / 'daily_spend.csv'
+
+# The inputs each part of the estimate is computed from
+PART_INPUTS = {
+    'flights': ('outbound_flight', 'return_flight', 'outbound_flights', 'return_flights'),
+    'lodging': ('hotel', 'hotels', 'nights'),
+    'daily_spend': ('num_days',),
+}
+CHOICES = {'outbound_flight': 'outbound_flights', 'return_flight': 'return_flights', 'hotel': 'hotels'}
+# The parts priced by offers searched for the trip's dates, and those offers
+DATED_PARTS = {'flights': ('outbound_flights', 'return_flights'), 'lodging': ('hotels',)}
+DATE_INPUTS = ('departure_date', 'return_date')
+
+
+class DailySpend(NamedTuple):
+    """Typical spending per person and day, in the local currency"""
+    place: str
+    currency: str
+    food: float
+    transport: float
+    activities: float
+
+    @property
+    def total(self):
+        return self.food + self.transport + self.activities
+
+
+class SpendTable:
+    """Daily spend by city or country; ``default`` covers everywhere else"""
+
+    def __init__(self, rows):
+        self.rows = {normalize_place(row.place): row for row in rows}
+
+    @classmethod
+    def from_csv(cls, path=SPEND_FILE):
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls([
+                DailySpend(
+                    row['place'], row['currency'],
+                    float(row['food']), float(row['transport']), float(row['activities']),
+                )
+                for row in csv.DictReader(f)
+            ])
+
+    def find(self, destination):
+        """The row for the destination city, else its country, else the default"""
+        row = self.rows.get(normalize_place(destination))
+        if row is None:
+            airport = get_airport_index().find(destination)
+            if airport:
+                row = self.rows.get(normalize_place(airport.city)) or self.rows.get(normalize_place(airport.country))
+        return row or self.rows['default']
+
+
+@lru_cache(maxsize=None)
+def get_spend_table():
+    return SpendTable.from_csv()
+
+
+def convert(amount, currency, rates):
+    """``amount`` in ``COST_CURRENCY``, or None without a rate for ``currency``"""
+    if amount is None:
+        return None
+    if currency == settings.COST_CURRENCY:
+        return amount
+    rate = (rates or {}).get(currency)
+    return amount / rate if rate else None
+
+
+def trip_dates(departure_date, return_date):
+    """``(num_days, nights)`` for the dates, counted as the trip search does"""
+    if not return_date:
+        return 3, 3
+    num_days = max((return_date - departure_date).days + 1, 1)
+    return num_days, stay_nights(departure_date.isoformat(), return_date.isoformat())
+
+
+def hotel_choice(hotel):
+    return {'name': hotel.name, 'nightly_price': hotel.nightly_price, 'currency': hotel.currency}
+
+
+def date_changes(search):
+    """Estimate inputs for a search's dates"""
+    return {
+        'departure_date': search.departure_date,
+        'return_date': search.return_date or '',
+        'num_days': search.num_days,
+        'nights': stay_nights(search.departure_date, search.checkout_date),
+    }
+
+
+def flight_choices(flights, return_flights):
+    """Estimate inputs offering these flights, cheapest first, with the first ones chosen"""
+    return {
+        'outbound_flights': {offer.offer_id: offer.as_dict() for offer in flights},
+        'return_flights': {offer.offer_id: offer.as_dict() for offer in return_flights},
+        'outbound_flight': flights[0].offer_id if flights else None,
+        'return_flight': return_flights[0].offer_id if return_flights else None,
+    }
+
+
+def hotel_choices(hotels):
+    """Estimate inputs offering the priced hotels, with the first chosen"""
+    hotels = [hotel for hotel in hotels if hotel.price is not None]
+    return {
+        'hotels': {hotel.hotel_id: hotel_choice(hotel) for hotel in hotels},
+        'hotel': hotels[0].hotel_id if hotels else None,
+    }
+
+
+def new_estimate(search, flights, return_flights, hotels, rates):
+    """The estimate for a trip search, with the cheapest flights and stay chosen.
+
+    ``flights`` and ``return_flights`` are the offers the user can choose
+    from, cheapest first; ``hotels`` the hotels, priced ones first by price.
+    """
+    spend = get_spend_table().find(search.dest)
+    estimate = {
+        'destination': search.dest,
+        **date_changes(search),
+        'daily_spend': {'place': spend.place, 'currency': spend.currency, 'per_day': spend.total},
+        **flight_choices(flights, return_flights),
+        **hotel_choices(hotels),
+        'parts': {},
+        'stale_parts': [],
+    }
+    for part in PART_INPUTS:
+        estimate['parts'][part] = compute_part(estimate, part, rates)
+    return estimate
+
+
+def flights_cost(estimate, rates):
+    total = None
+    for choice in ('outbound_flight', 'return_flight'):
+        offer = estimate[CHOICES[choice]].get(estimate[choice])
+        if offer:
+            amount = convert(float(offer['price']), offer['currency'], rates)
+            if amount is None:
+                return None
+            total = (total or 0) + amount
+    return total
+
+
+def lodging_cost(estimate, rates):
+    hotel = estimate['hotels'].get(estimate['hotel'])
+    if not hotel:
+        return None
+    return convert(hotel['nightly_price'] * estimate['nights'], hotel['currency'], rates)
+
+
+def daily_spend_cost(estimate, rates):
+    spend = estimate['daily_spend']
+    return convert(spend['per_day'] * estimate['num_days'], spend['currency'], rates)
+
+
+PART_COSTS = {'flights': flights_cost, 'lodging': lodging_cost, 'daily_spend': daily_spend_cost}
+
+
+def compute_part(estimate, part, rates):
+    amount = PART_COSTS[part](estimate, rates)
+    return round(amount, 2) if amount is not None else None
+
+
+def read_changes(estimate, data):
+    """Return ``(changes, error)`` for a change request to ``estimate``.
+
+    ``data`` may set ``departure_date``/``return_date`` (YYYY-MM-DD) and
+    choose an ``outbound_flight``, ``return_flight`` or ``hotel`` by id from
+    those the search found (null for none).
+    """
+    changes = {}
+    for choice, options in CHOICES.items():
+        if choice in data:
+            value = data[choice]
+            if value is not None and str(value) not in estimate[options]:
+                return None, f"Unknown {choice.replace('_', ' ')}: {value}"
+            changes[choice] = str(value) if value is not None else None
+
+    if 'departure_date' in data or 'return_date' in data:
+        try:
+            departure_date = date.fromisoformat(data.get('departure_date') or estimate['departure_date'])
+            return_value = data.get('return_date', estimate['return_date'])
+            return_date = date.fromisoformat(return_value) if return_value else None
+        except (TypeError, ValueError):
+            return None, "Dates must be YYYY-MM-DD"
+        if return_date and return_date < departure_date:
+            return None, "The return date must not be before the departure date"
+        changes['departure_date'] = departure_date.isoformat()
+        changes['return_date'] = return_date.isoformat() if return_date else ''
+        changes['num_days'], changes['nights'] = trip_dates(departure_date, return_date)
+    return changes, None
+
+
+def update_estimate(estimate, changes, rates):
+    """Apply ``changes`` and recompute the parts that depend on them; returns the parts recomputed.
+
+    ``changes`` come from ``read_changes``, or from a search of one section
+    (``date_changes``, ``flight_choices`` or ``hotel_choices``).
+    """
+    changed = {name for name, value in changes.items() if estimate.get(name) != value}
+    estimate.update(changes)
+    recomputed = [part for part, inputs in PART_INPUTS.items() if changed.intersection(inputs)]
+    for part in recomputed:
+        estimate['parts'][part] = compute_part(estimate, part, rates)
+
+    stale = set(estimate.get('stale_parts', ()))
+    for part, offers in DATED_PARTS.items():
+        if any(name in changes for name in offers):
+            stale.discard(part)
+        elif changed.intersection(DATE_INPUTS):
+            stale.add(part)
+    estimate['stale_parts'] = sorted(stale)
+    return recomputed
+
+
+def estimate_total(estimate):
+    """Sum of the parts that could be worked out, or None if none could"""
+    amounts = [amount for amount in estimate['parts'].values() if amount is not None]
+    return round(sum(amounts), 2) if amounts else None
+
+
+def chosen_offer(estimate, choice):
+    """The chosen flight offer's data, as stored for saved trips"""
+    return estimate[CHOICES[choice]].get(estimate[choice])
+
+
+def estimate_summary(estimate):
+    """The estimate as the cost endpoint and the page show it"""
+    hotel = estimate['hotels'].get(estimate['hotel'])
+    return {
+        'currency': settings.COST_CURRENCY,
+        'total': estimate_total(estimate),
+        'parts': estimate['parts'],
+        'departure_date': estimate['departure_date'],
+        'return_date': estimate['return_date'],
+        'num_days': estimate['num_days'],
+        'nights': estimate['nights'],
+        'outbound_flight': estimate['outbound_flight'],
+        'return_flight': estimate['return_flight'],
+        'hotel': estimate['hotel'],
+        'hotel_name': hotel['name'] if hotel else None,
+        # None when the table has no figures for the destination
+        'daily_spend_place': estimate['daily_spend']['place'] if estimate['daily_spend']['place'] != 'default' else None,
+        # Parts still priced for earlier dates
+        'stale_parts': estimate.get('stale_parts', []),
+    }
@@ -0,0 +1,140 @@
+"""Itinerary exports: PDF contexts for one trip, many trips, or a zip of PDFs.
+
+Per-trip PDFs go through ``pdf_jobs`` so they are rendered in the worker
+pool and reused from the PDF store, whether they were exported on their
+own or as part of a bulk export.
+"""
+import hashlib
+import io
+import zipfile
+from datetime import datetime
+
+from django.conf import settings
+
+from . import pdf_jobs
+from .itinerary_parser import parse_itinerary
+from .weather import add_day_weather
+
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def pdf_export(itinerary, destination, num_days, departure_date, return_date, parsed_itinerary=None, weather=()):
+    """Return ``(key, context, filename)`` for one itinerary PDF.
+
+    Dates are ``YYYY-MM-DD`` strings, as kept in the session. Pass
+    ``parsed_itinerary`` when it is already at hand to skip parsing.
+    ``weather`` is the trip's forecast, as ``DayWeather`` per day.
+    """
+    if parsed_itinerary is None:
+        parsed_itinerary = parse_itinerary(itinerary)
+    add_day_weather(parsed_itinerary.days, weather, departure_date)
+    key = pdf_jobs.pdf_key(
+        itinerary, destination, num_days, departure_date, return_date,
+        [day.as_dict() for day in weather],
+    )
+    context = {
+        'destination': destination,
+        'num_days': num_days,
+        'departure_date': parse_date(departure_date),
+        'return_date': parse_date(return_date),
+        'parsed_itinerary': parsed_itinerary.days,
+        'weather': weather,
+    }
+    return key, context, f"{destination}_{num_days}Day_Itinerary.pdf"
+
+
+def combined_pdf_export(exports):
+    """Return ``(key, context, filename)`` for one PDF holding every export in order"""
+    keys = '\n'.join(key for key, _, _ in exports)
+    key = hashlib.sha256(f"bulk\n{keys}".encode('utf-8')).hexdigest()
+    context = {'trips': [context for _, context, _ in exports]}
+    return key, context, f"Itineraries_{len(exports)}_Trips.pdf"
+
+
+class ZipStream(io.RawIOBase):
+    """Write-only, non-seekable sink for ``zipfile``; ``drain`` hands back what was written"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_name(filename, taken):
+    """``filename``, or ``name (2).pdf`` and so on if it's already in ``taken``"""
+    stem, dot, extension = filename.rpartition('.')
+    if not dot:
+        stem, extension = filename, ''
+    name, count = filename, 1
+    while name in taken:
+        count += 1
+        name = f"{stem} ({count}){dot}{extension}"
+    taken.add(name)
+    return name
+
+
+def stream_pdf_zip(exports):
+    """Yield a zip of one PDF per export, without holding more than a chunk in memory.
+
+    Up to two renders per PDF worker are queued ahead of the PDF being
+    written, so the pool stays busy while earlier PDFs stream out. PDFs
+    that fail to render are listed in ``errors.txt`` instead.
+    """
+    window = max(settings.PDF_RENDER_WORKERS * 2, 1)
+    failed = []
+    names = {'errors.txt'}
+
+    def request(index):
+        if index < len(exports):
+            key, context, filename = exports[index]
+            try:
+                pdf_jobs.request_pdf(key, context, filename)
+            except Exception as e:
+                print(f"Could not queue PDF {filename}: {e}")
+
+    for index in range(window):
+        request(index)
+
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for index, (key, context, filename) in enumerate(exports):
+            request(index + window)
+            status = pdf_jobs.wait_for_pdf(key, settings.PDF_RENDER_TIMEOUT)
+            if status != pdf_jobs.READY:
+                failed.append(filename)
+                continue
+
+            # PDFs are already compressed, so store them as they are
+            with open(pdf_jobs.pdf_path(key), 'rb') as pdf, archive.open(unique_name(filename, names), 'w') as entry:
+                while chunk := pdf.read(ZIP_CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield sink.drain()
+
+        if failed:
+            archive.writestr('errors.txt', "Could not render:\n" + '\n'.join(failed) + '\n')
+    yield sink.drain()
@@ -0,0 +1,91 @@
+"""Flexible-date flight search.
+
+Searches every outbound date within ``window`` days of the requested one,
+and every return date around the requested return, in one round: all the
+searches run in parallel, at most ``FARE_CALENDAR_CONCURRENCY`` at a time.
+Each (route, date) search goes through ``providers.search_flights`` and is
+cached on its own, so moving or widening the window only searches the new
+dates.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+
+from .flight_offers import cheapest_price
+
+# Fares are requested in rupees (see flight_search_params)
+FARE_CURRENCY = 'INR'
+
+
+def window_dates(center, window, earliest):
+    """Dates ``window`` days either side of ``center``, leaving out any before ``earliest``"""
+    return [
+        day for day in (center + timedelta(days=offset) for offset in range(-window, window + 1))
+        if day >= earliest
+    ]
+
+
+def search_fares(providers, searches, access_token):
+    """Cheapest fare for each ``(origin, destination, date)`` in ``searches``, searched in parallel"""
+    def search(route_date):
+        origin_code, destination_code, day = route_date
+        return cheapest_price(providers.search_flights(origin_code, destination_code, day.isoformat(), access_token))
+
+    with ThreadPoolExecutor(max_workers=settings.FARE_CALENDAR_CONCURRENCY) as pool:
+        return dict(zip(searches, pool.map(search, searches)))
+
+
+def fare_calendar(providers, origin_code, destination_code, departure_date, return_date=None,
+                  window=3, access_token=None):
+    """Price matrix of outbound x return dates around the requested ones.
+
+    ``matrix[i][j]`` is the cheapest outbound fare on ``departure_dates[i]``
+    plus the cheapest return fare on ``return_dates[j]``, or None when
+    either has no fare or the return would be before the departure. For a
+    one-way search ``return_dates`` is empty and the cheapest combination is
+    the cheapest outbound fare.
+    """
+    today = date.today()
+    departure_dates = window_dates(departure_date, window, today)
+    return_dates = []
+    if return_date:
+        return_dates = window_dates(return_date, window, departure_dates[0] if departure_dates else today)
+
+    searches = [(origin_code, destination_code, day) for day in departure_dates]
+    searches += [(destination_code, origin_code, day) for day in return_dates]
+    fares = search_fares(providers, searches, access_token)
+    outbound = [fares[(origin_code, destination_code, day)] for day in departure_dates]
+    inbound = [fares[(destination_code, origin_code, day)] for day in return_dates]
+
+    matrix = [
+        [
+            out + back if out is not None and back is not None and back_day >= out_day else None
+            for back_day, back in zip(return_dates, inbound)
+        ]
+        for out_day, out in zip(departure_dates, outbound)
+    ]
+
+    cheapest = None
+    if return_dates:
+        for i, row in enumerate(matrix):
+            for j, total in enumerate(row):
+                if total is not None and (cheapest is None or total < cheapest['price']):
+                    cheapest = {'departure_date': departure_dates[i].isoformat(),
+                                'return_date': return_dates[j].isoformat(), 'price': total}
+    else:
+        for day, price in zip(departure_dates, outbound):
+            if price is not None and (cheapest is None or price < cheapest['price']):
+                cheapest = {'departure_date': day.isoformat(), 'return_date': None, 'price': price}
+
+    return {
+        'origin': origin_code,
+        'destination': destination_code,
+        'currency': FARE_CURRENCY,
+        'departure_dates': [day.isoformat() for day in departure_dates],
+        'return_dates': [day.isoformat() for day in return_dates],
+        'outbound': outbound,
+        'return': inbound,
+        'matrix': matrix,
+        'cheapest': cheapest,
+    }
@@ -0,0 +1,290 @@
+"""Flight offers, parsed once per Amadeus response.
+
+``parse_offers`` turns the response into compact ``FlightOffer`` objects:
+every journey of the offer (outbound, and return for round-trip offers),
+every segment with interned carrier and airport codes, and the layovers
+between segments. The page, the cost estimate and saved trips all use
+these objects; nothing reads the raw JSON again.
+
+``OfferTable`` lays the offers' numbers out as columns (price, duration,
+stops, departure and arrival), so ranking, filtering and finding the
+cheapest fare are scans and sorts over plain numbers. That keeps a full
+page of offers (the API returns up to 250) cheap to process.
+"""
+import re
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from sys import intern
+
+# ISO 8601 durations as Amadeus writes them, e.g. PT2H10M or P1DT3H
+DURATION_PATTERN = re.compile(r'P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?)?')
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+MINUTES_PER_DAY = 24 * 60
+
+# Columns offers can be ranked by; prefix with '-' for descending
+RANK_COLUMNS = ('price', 'duration', 'stops', 'departure', 'arrival')
+
+
+def duration_minutes(value):
+    match = DURATION_PATTERN.fullmatch(value or '')
+    if not match:
+        return 0
+    days, hours, minutes = (int(match[part] or 0) for part in ('days', 'hours', 'minutes'))
+    return (days * 24 + hours) * 60 + minutes
+
+
+def format_minutes(minutes):
+    """``'1h 20m'`` style label"""
+    hours, minutes = divmod(minutes, 60)
+    if not hours:
+        return f"{minutes}m"
+    return f"{hours}h {minutes}m" if minutes else f"{hours}h"
+
+
+def local_minutes(value):
+    """Minutes since 1970 of an airport-local ISO time, ignoring time zones"""
+    return (datetime.fromisoformat(value) - EPOCH) // MINUTE
+
+
+def time_of_day(value):
+    """Minutes since midnight for ``'HH:MM'``, or the value itself if it is already a number"""
+    if isinstance(value, str):
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+    return value
+
+
+@dataclass(slots=True)
+class Segment:
+    carrier: str
+    number: str
+    origin: str
+    destination: str
+    departs_at: str  # ISO time, local to the origin airport
+    arrives_at: str  # ISO time, local to the destination airport
+    duration: int  # Minutes
+
+    @property
+    def flight_number(self):
+        return f"{self.carrier} {self.number}"
+
+
+@dataclass(slots=True)
+class Layover:
+    airport: str
+    minutes: int
+
+    @property
+    def duration_label(self):
+        return format_minutes(self.minutes)
+
+
+@dataclass(slots=True)
+class Journey:
+    """One direction of an offer: its segments and the layovers between them"""
+    segments: list
+    duration: int  # Minutes, door to door
+    layovers: list = field(default_factory=list)
+
+    @property
+    def first(self):
+        return self.segments[0]
+
+    @property
+    def last(self):
+        return self.segments[-1]
+
+    @property
+    def stops(self):
+        return len(self.segments) - 1
+
+    @property
+    def duration_label(self):
+        return format_minutes(self.duration)
+
+    @property
+    def legs(self):
+        """``(segment, layover after it or None)`` pairs, in order"""
+        return list(zip(self.segments, [*self.layovers, None]))
+
+    @property
+    def days_later(self):
+        """Days between the local departure and arrival dates, e.g. 1 for an overnight flight"""
+        return (date.fromisoformat(self.last.arrives_at[:10]) - date.fromisoformat(self.first.departs_at[:10])).days
+
+
+@dataclass(slots=True)
+class FlightOffer:
+    offer_id: str
+    price: float
+    price_text: str  # As quoted, for display
+    currency: str
+    journeys: list
+
+    @property
+    def outbound(self):
+        return self.journeys[0]
+
+    @property
+    def inbound(self):
+        """The return journey of a round-trip offer, else None"""
+        return self.journeys[1] if len(self.journeys) > 1 else None
+
+    def as_dict(self):
+        """Plain data for the session and saved trips; ``from_dict`` rebuilds the offer"""
+        return {
+            'id': self.offer_id,
+            'price': self.price_text,
+            'currency': self.currency,
+            'journeys': [
+                {'duration': journey.duration, 'segments': [
+                    [segment.carrier, segment.number, segment.origin, segment.destination,
+                     segment.departs_at, segment.arrives_at, segment.duration]
+                    for segment in journey.segments
+                ]}
+                for journey in self.journeys
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], float(data['price']), data['price'], intern(data['currency']), [
+            build_journey([
+                Segment(intern(carrier), number, intern(origin), intern(destination), departs_at, arrives_at, minutes)
+                for carrier, number, origin, destination, departs_at, arrives_at, minutes in journey['segments']
+            ], journey['duration'])
+            for journey in data['journeys']
+        ])
+
+
+def offer_data(offer):
+    """``offer.as_dict()``, or None without an offer"""
+    return offer.as_dict() if offer else None
+
+
+def build_journey(segments, duration):
+    """A ``Journey`` with the layovers between ``segments`` worked out"""
+    layovers = [
+        Layover(arriving.destination, local_minutes(leaving.departs_at) - local_minutes(arriving.arrives_at))
+        for arriving, leaving in zip(segments, segments[1:])
+    ]
+    return Journey(segments, duration, layovers)
+
+
+def parse_offers(flight_results):
+    """``FlightOffer``s from an Amadeus flight-offers response; offers it can't read are skipped"""
+    offers = []
+    # Durations repeat a lot across offers, so each is parsed once
+    minutes_for = {}
+
+    def minutes(text):
+        value = minutes_for.get(text)
+        if value is None:
+            value = minutes_for[text] = duration_minutes(text)
+        return value
+
+    for offer in (flight_results or {}).get('data', []):
+        try:
+            price = offer['price']
+            journeys = [
+                build_journey([
+                    Segment(
+                        intern(segment['carrierCode']), segment['number'],
+                        intern(segment['departure']['iataCode']), intern(segment['arrival']['iataCode']),
+                        segment['departure']['at'], segment['arrival']['at'], minutes(segment.get('duration')),
+                    )
+                    for segment in itinerary['segments']
+                ], minutes(itinerary.get('duration')))
+                for itinerary in offer['itineraries']
+            ]
+            if not journeys or not all(journey.segments for journey in journeys):
+                raise ValueError("offer has no segments")
+            offers.append(FlightOffer(
+                offer.get('id'), float(price['total']), price['total'], intern(price.get('currency', '')), journeys,
+            ))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"Skipping unreadable flight offer {offer.get('id')}: {e}")
+    return offers
+
+
+def cheapest_price(flight_results):
+    """Lowest total price in a flight-offers response, or None without offers"""
+    prices = [
+        float(offer['price']['total'])
+        for offer in (flight_results or {}).get('data', [])
+        if offer.get('price', {}).get('total')
+    ]
+    return min(prices) if prices else None
+
+
+class OfferTable:
+    """The offers of one search, with their outbound numbers as columns"""
+
+    def __init__(self, offers):
+        self.offers = offers
+        self.price = array('d', [offer.price for offer in offers])
+        self.duration = array('l', [offer.outbound.duration for offer in offers])  # Minutes
+        self.stops = array('l', [offer.outbound.stops for offer in offers])
+        # Minutes since 1970, local to the airport
+        self.departure = array('q', [local_minutes(offer.outbound.first.departs_at) for offer in offers])
+        self.arrival = array('q', [local_minutes(offer.outbound.last.arrives_at) for offer in offers])
+
+    @classmethod
+    def from_response(cls, flight_results):
+        return cls(parse_offers(flight_results))
+
+    def __len__(self):
+        return len(self.offers)
+
+    def cheapest(self):
+        """The cheapest offer, or None without offers"""
+        if not self.offers:
+            return None
+        return self.offers[min(range(len(self)), key=self.price.__getitem__)]
+
+    def cheapest_price(self):
+        return min(self.price) if self.price else None
+
+    def filter(self, indices=None, max_price=None, max_duration=None, max_stops=None,
+               departs_after=None, departs_before=None):
+        """Indices of the offers within every given limit.
+
+        ``departs_after`` and ``departs_before`` are times of day, ``'HH:MM'``
+        or minutes since midnight. ``max_duration`` is in minutes.
+        """
+        if indices is None:
+            indices = range(len(self))
+        if max_price is not None:
+            price = self.price
+            indices = [i for i in indices if price[i] <= max_price]
+        if max_duration is not None:
+            duration = self.duration
+            indices = [i for i in indices if duration[i] <= max_duration]
+        if max_stops is not None:
+            stops = self.stops
+            indices = [i for i in indices if stops[i] <= max_stops]
+        if departs_after is not None or departs_before is not None:
+            earliest = time_of_day(departs_after) if departs_after is not None else 0
+            latest = time_of_day(departs_before) if departs_before is not None else MINUTES_PER_DAY
+            departure = self.departure
+            indices = [i for i in indices if earliest <= departure[i] % MINUTES_PER_DAY <= latest]
+        return list(indices)
+
+    def rank(self, keys=('price', 'duration'), indices=None):
+        """Indices of the offers sorted by ``keys``, e.g. ``('stops', '-price')``"""
+        if indices is None:
+            indices = range(len(self))
+        indices = list(indices)
+        # Stable sorts from the last key to the first give the multi-key order
+        for key in reversed(keys):
+            if key.lstrip('-') not in RANK_COLUMNS:
+                raise ValueError(f"Can't rank flight offers by {key!r}")
+            column = getattr(self, key.lstrip('-'))
+            indices.sort(key=column.__getitem__, reverse=key.startswith('-'))
+        return indices
+
+    def pick(self, indices):
+        """The offers at ``indices``"""
+        return [self.offers[i] for i in indices]
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from opencage.geocoder import OpenCageGeocode
+
+from .airports import get_airport_index, normalize_place
+from .models import GeocodedPlace
+
+geocoder = OpenCageGeocode(settings.OPENCAGE_API_KEY)
+
+
+def geocode(place_name):
+    """Look up coordinates with OpenCage, bypassing the stored results"""
+    result = geocoder.geocode(place_name)
+    if result:
+        return result[0]['geometry']['lat'], result[0]['geometry']['lng']
+    return None, None
+
+
+def is_stale(place):
+    max_age = settings.GEOCODE_CACHE_TIMEOUT if place.latitude is not None else settings.GEOCODE_MISS_CACHE_TIMEOUT
+    return place.updated_at < timezone.now() - timedelta(seconds=max_age)
+
+
+def get_coords(city_name):
+    """Return ``(lat, lng)`` for a place, geocoding it at most once.
+
+    Names that are exactly a city in the bundled airport index are answered
+    from memory; aliases, codes and near matches are not, as the airport's
+    coordinates are not necessarily the place's. Anything else is looked up
+    in the stored geocode results by normalized name and only sent to
+    OpenCage when it is missing or stale. Misses are stored too, with a
+    shorter lifetime.
+    """
+    name = normalize_place(city_name)
+    if not name:
+        return None, None
+
+    airport = get_airport_index().find_city(city_name)
+    if airport and airport.lat is not None:
+        return airport.lat, airport.lng
+
+    place = GeocodedPlace.objects.filter(name=name).first()
+    if place and not is_stale(place):
+        return place.latitude, place.longitude
+
+    lat, lng = geocode(city_name)
+    GeocodedPlace.objects.update_or_create(name=name, defaults={'latitude': lat, 'longitude': lng})
+    return lat, lng
+
+
+def warm_geocode_cache(place_names=(), include_airport_index=True):
+    """Pre-fill the stored geocode results; returns ``(seeded, geocoded, missing)`` counts.
+
+    Every city in the airport index is stored with its bundled coordinates;
+    aliases are not, they are geocoded like any other name. Other names are
+    geocoded unless a fresh result is stored.
+    """
+    seeded = geocoded = missing = 0
+
+    if include_airport_index:
+        places = {}
+        for airport in get_airport_index():
+            name = normalize_place(airport.city)
+            places[name] = GeocodedPlace(name=name, latitude=airport.lat, longitude=airport.lng)
+        GeocodedPlace.objects.bulk_create(
+            places.values(),
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['latitude', 'longitude', 'updated_at'],
+        )
+        seeded = len(places)
+
+    for place_name in place_names:
+        name = normalize_place(place_name)
+        if not name:
+            continue
+        place = GeocodedPlace.objects.filter(name=name).first()
+        if place and not is_stale(place):
+            continue
+        lat, lng = geocode(place_name)
+        GeocodedPlace.objects.update_or_create(name=name, defaults={'latitude': lat, 'longitude': lng})
+        if lat is None:
+            missing += 1
+        else:
+            geocoded += 1
+
+    return seeded, geocoded, missing
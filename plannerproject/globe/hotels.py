@@ -0,0 +1,126 @@
+"""Hotel search in two stages: the city's hotel list, then offers for the dates.
+
+The list of hotels in a city barely changes, so it is cached for a long
+time (``hotel_list``). Prices depend on the dates, so offers are requested
+for the nearest hotels in chunks of ``HOTEL_OFFERS_CHUNK_SIZE`` IDs, all
+chunks in parallel, and each chunk is cached on its own (``hotel_offers``).
+The search waits at most ``HOTEL_SEARCH_BUDGET`` seconds for the chunks;
+chunks that answer later still fill the cache for the next search.
+
+``merge_offers`` combines the list with the offers that came back: hotels
+with an offer are ranked by price, then distance; hotels whose chunk did
+not answer in time follow, nearest first, without a price; hotels the API
+reported as unavailable for the dates are left out.
+"""
+from dataclasses import dataclass
+from datetime import date
+from sys import intern
+
+from django.conf import settings
+
+# Offers are requested in rupees, like the flights
+HOTEL_CURRENCY = 'INR'
+
+
+@dataclass(slots=True)
+class Hotel:
+    hotel_id: str
+    name: str
+    city_code: str
+    distance: float = None  # Kilometres from the city centre
+    price: float = None  # Total for the stay
+    price_text: str = ''  # As quoted, for display
+    currency: str = ''
+    nights: int = 1
+    room: str = ''
+
+    @property
+    def nightly_price(self):
+        return self.price / self.nights if self.price is not None else None
+
+
+def stay_nights(checkin_date, checkout_date):
+    """Nights between two ISO dates, at least one"""
+    try:
+        return max((date.fromisoformat(str(checkout_date)) - date.fromisoformat(str(checkin_date))).days, 1)
+    except ValueError:
+        return 1
+
+
+def hotel_distance(hotel):
+    distance = (hotel.get('distance') or {}).get('value')
+    return float(distance) if distance is not None else None
+
+
+def nearest_hotels(hotels, limit):
+    """The ``limit`` hotels of a by-city response nearest the centre, nearest first"""
+    hotels = [hotel for hotel in hotels if hotel.get('hotelId')]
+    hotels.sort(key=lambda hotel: (hotel_distance(hotel) is None, hotel_distance(hotel) or 0))
+    return hotels[:limit]
+
+
+def hotel_id_chunks(hotels, size):
+    """The hotels' IDs, ``size`` per offers request"""
+    hotel_ids = [hotel['hotelId'] for hotel in hotels]
+    return [hotel_ids[start:start + size] for start in range(0, len(hotel_ids), size)]
+
+
+def best_offer(offers):
+    """The cheapest offer of a hotel's offers, or None"""
+    priced = []
+    for offer in offers or []:
+        try:
+            priced.append((float(offer['price']['total']), offer))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return min(priced, key=lambda item: item[0])[1] if priced else None
+
+
+def room_description(offer):
+    room = offer.get('room') or {}
+    return (room.get('typeEstimated') or {}).get('category', '').replace('_', ' ').title()
+
+
+def merge_offers(hotels, answers, nights):
+    """Rank the hotels of the list by the offers that came back.
+
+    ``answers`` are ``(hotel IDs, offers)`` pairs for the offers requests
+    that finished in time; offers are the response's ``data`` list, or None
+    if the request failed.
+    """
+    offers = {}
+    answered = set()
+    for chunk, response in answers:
+        if response is None:
+            # The request failed; nothing is known about these hotels
+            continue
+        answered.update(chunk)
+        for item in response:
+            hotel_id = (item.get('hotel') or {}).get('hotelId')
+            offer = best_offer(item.get('offers')) if item.get('available', True) else None
+            if hotel_id and offer:
+                offers[hotel_id] = offer
+
+    priced, unknown = [], []
+    for data in hotels:
+        hotel = Hotel(
+            data['hotelId'], (data.get('name') or '').title(), intern(data.get('iataCode') or ''),
+            hotel_distance(data), nights=nights,
+        )
+        offer = offers.get(hotel.hotel_id)
+        if offer:
+            price = offer['price']
+            hotel.price, hotel.price_text = float(price['total']), price['total']
+            hotel.currency = intern(price.get('currency', ''))
+            hotel.room = room_description(offer)
+            priced.append(hotel)
+        elif hotel.hotel_id not in answered:
+            unknown.append(hotel)
+
+    priced.sort(key=lambda hotel: (hotel.price, hotel.distance is None, hotel.distance or 0))
+    return priced + unknown
+
+
+def best_hotels(hotels):
+    """The hotels to show"""
+    return hotels[:settings.HOTEL_RESULTS_SHOWN]
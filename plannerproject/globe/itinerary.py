@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+import google.generativeai as genai
+from django.conf import settings
+from django.core.cache import cache
+
+from . import singleflight
+from .airports import normalize_place
+from .metrics import record_cache_lookup
+
+ITINERARY_MODEL = "gemini-2.5-flash"
+
+
+def itinerary_cache_key(dest, attractions, num_days):
+    """Cache key for an itinerary, stable across processes and restarts.
+
+    The trip's dates and weather are left out, so every search of the same
+    trip shares one itinerary, pre-generated ones included. The forecast is
+    added to the days when the itinerary is shown (``add_day_weather``).
+    """
+    # Built from a content hash rather than hash(), which is randomized per
+    # process and made every worker miss every other worker's entries
+    attraction_names = [a.get('name', '') for a in attractions[:5]]
+    payload = json.dumps([normalize_place(dest), num_days, attraction_names], ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    return f"itinerary_{normalize_place(dest).replace(' ', '_')}_{num_days}days_{digest}"
+
+
+def build_itinerary_prompt(dest, attractions, num_days):
+    attractions_list = ", ".join([a["name"] for a in attractions]) if attractions else "None"
+    return (
+        f"Create a {num_days}-day travel itinerary for a trip to {dest}. "
+        f"The top attractions are: {attractions_list}. "
+        f"Organize by Day 1, Day 2, {'Day 3, ' if num_days >= 3 else ''}etc., with morning, afternoon, and evening plans for each day. "
+        f"Keep the tone friendly and concise."
+    )
+
+
+def clean_itinerary(text):
+    """Strip the markdown bold markers Gemini likes to add"""
+    return re.sub(r"\*\*(.*?)\*\*", r"\1", text.strip())
+
+
+def get_cached_itinerary(dest, attractions, num_days):
+    """Return the cached itinerary, or None without calling the model"""
+    cached_itinerary = cache.get(itinerary_cache_key(dest, attractions, num_days))
+    record_cache_lookup('itinerary', hit=bool(cached_itinerary))
+    return cached_itinerary
+
+
+def session_itinerary(session):
+    """The itinerary text of the last trip search, from the session or from the cache if it was streamed"""
+    itinerary = session.get('itinerary', '')
+    if not itinerary and session.get('itinerary_cache_key'):
+        itinerary = cache.get(session['itinerary_cache_key'], '')
+    return itinerary
+
+
+def get_itinerary_model():
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(ITINERARY_MODEL)
+
+
+def itinerary_generated_at_key(cache_key):
+    return f"{cache_key}_generated_at"
+
+
+def cache_itinerary(dest, attractions, num_days, itinerary):
+    """Cache a generated itinerary, noting when, so it can be refreshed before it expires"""
+    cache_key = itinerary_cache_key(dest, attractions, num_days)
+    cache.set_many({
+        cache_key: itinerary,
+        itinerary_generated_at_key(cache_key): time.time(),
+    }, settings.ITINERARY_CACHE_TIMEOUT)
+    print(f"Cached new itinerary for {dest} ({num_days} days)")
+
+
+def itinerary_age(dest, attractions, num_days):
+    """Seconds since the cached itinerary was generated, or None if it isn't cached"""
+    cache_key = itinerary_cache_key(dest, attractions, num_days)
+    generated_at_key = itinerary_generated_at_key(cache_key)
+    cached = cache.get_many([cache_key, generated_at_key])
+    if cache_key not in cached:
+        return None
+    # Entries cached before generation times were kept count as about to expire
+    return time.time() - cached.get(generated_at_key, 0)
+
+
+def fetch_itinerary(dest, attractions, num_days):
+    """Ask the model for a new itinerary and cache it; raises if the call fails"""
+    model = get_itinerary_model()
+    response = model.generate_content(build_itinerary_prompt(dest, attractions, num_days))
+    itinerary_cleaned = clean_itinerary(response.text)
+    cache_itinerary(dest, attractions, num_days, itinerary_cleaned)
+    return itinerary_cleaned
+
+
+def generate_itinerary(dest, attractions, num_days=3):
+    """Generate or retrieve cached itinerary for a destination"""
+    itinerary_cleaned = None
+
+    # Try to get from cache first (cache for 7 days)
+    cached_itinerary = get_cached_itinerary(dest, attractions, num_days)
+    if cached_itinerary:
+        print(f"Using cached itinerary for {dest} ({num_days} days)")
+        return cached_itinerary
+
+    try:
+        # Concurrent misses for the same trip share one model call
+        itinerary_cleaned = singleflight.do(
+            'itinerary', itinerary_cache_key(dest, attractions, num_days),
+            lambda: fetch_itinerary(dest, attractions, num_days),
+        )
+    except Exception as e:
+        itinerary_cleaned = f"Could not generate itinerary: {str(e)}"
+
+    return itinerary_cleaned
+
+
+def stream_itinerary(dest, attractions, num_days=3):
+    """Yield the itinerary text in chunks as the model produces it.
+
+    A cached itinerary is yielded in one piece. A generated one is cached
+    once the stream completes, so the next request gets it instantly.
+    Chunks are raw model output; the final cleaned text is what gets cached.
+    """
+    cached_itinerary = get_cached_itinerary(dest, attractions, num_days)
+    if cached_itinerary:
+        print(f"Using cached itinerary for {dest} ({num_days} days)")
+        yield cached_itinerary
+        return
+
+    def generate():
+        model = get_itinerary_model()
+        response = model.generate_content(build_itinerary_prompt(dest, attractions, num_days), stream=True)
+        parts = []
+        for chunk in response:
+            text = chunk.text
+            if text:
+                parts.append(text)
+                yield text
+
+        cache_itinerary(dest, attractions, num_days, clean_itinerary(''.join(parts)))
+
+    # Concurrent streams of the same trip share one model call; the ones that
+    # joined another stream get the whole itinerary when it completes
+    yield from singleflight.stream(
+        'itinerary', itinerary_cache_key(dest, attractions, num_days), generate,
+        combine=lambda parts: clean_itinerary(''.join(parts)),
+    )
@@ -0,0 +1,122 @@
+"""Structured itinerary model, parsed from the model's plain-text itinerary.
+
+The text looks like::
+
+    Day 1: Arrival
+    Morning: Check in and freshen up.
+    * Breakfast at a nearby cafe
+    Afternoon: ...
+
+One compiled pattern classifies every line in a single scan of the text,
+so each line is matched once instead of trying a pattern per line type.
+The result is shared by the results page, the PDF templates and the
+chatbot prompt.
+"""
+import re
+from dataclasses import dataclass, field
+
+TIME_ICONS = {
+    'morning': 'fa-sun',
+    'afternoon': 'fa-cloud-sun',
+    'evening': 'fa-moon',
+    'night': 'fa-star',
+    'breakfast': 'fa-coffee',
+    'lunch': 'fa-utensils',
+    'dinner': 'fa-wine-glass-alt',
+}
+
+# One alternative per line type, tried in order: day header, time block,
+# bullet, plain text. Blank lines match nothing and are skipped. Each
+# captured field starts and ends on a non-space, which strips the line
+# without a separate pass; ``lastgroup`` then names the line type.
+LINE_PATTERN = re.compile(r"""
+    ^[ \t\r\f\v]*
+    (?:
+        Day[ \t]+(?P<day_num>\d+)[ \t:]*(?P<title>(?:\S(?:.*\S)?)?)
+      | (?P<time>Morning|Afternoon|Evening|Night|Breakfast|Lunch|Dinner):[ \t]*(?P<time_text>(?:\S(?:.*\S)?)?)
+      | [*\-•][ \t]+(?P<activity>\S(?:.*\S)?)
+      | (?P<text>\S(?:.*\S)?)
+    )
+""", re.IGNORECASE | re.MULTILINE | re.VERBOSE)
+
+ACTIVITY = 'activity'
+TEXT = 'text'
+
+
+@dataclass(slots=True)
+class ItineraryItem:
+    type: str  # ACTIVITY or TEXT
+    content: str
+    number: int = 0  # Position among the block's activities, from 1
+
+
+@dataclass(slots=True)
+class TimeBlock:
+    time: str  # '' for lines before the day's first time of day
+    items: list = field(default_factory=list)
+
+    @property
+    def icon(self):
+        return TIME_ICONS.get(self.time.lower(), 'fa-clock')
+
+
+@dataclass(slots=True)
+class ItineraryDay:
+    day_num: int
+    title: str
+    times: list = field(default_factory=list)
+    weather: object = None  # The day's DayWeather, from weather.add_day_weather
+
+
+@dataclass(slots=True)
+class ParsedItinerary:
+    intro: list = field(default_factory=list)  # Lines before the first day
+    days: list = field(default_factory=list)
+
+    def outline(self):
+        """One line per day, e.g. ``Day 2: Culture and History``"""
+        return '\n'.join(
+            f"Day {day.day_num}: {day.title}" if day.title else f"Day {day.day_num}"
+            for day in self.days
+        )
+
+
+def parse_itinerary(text):
+    """Parse itinerary text into a ``ParsedItinerary``"""
+    itinerary = ParsedItinerary()
+    day = None
+    block = None
+    activities = 0
+
+    for match in LINE_PATTERN.finditer(text or ''):
+        kind = match.lastgroup
+
+        if kind == 'title':
+            day = ItineraryDay(int(match['day_num']), match['title'])
+            itinerary.days.append(day)
+            block = None
+            continue
+
+        if day is None:
+            itinerary.intro.append(match.group().strip())
+            continue
+
+        if kind == 'time_text':
+            block = TimeBlock(match['time'])
+            day.times.append(block)
+            activities = 0
+            if not match['time_text']:
+                continue
+        elif block is None:
+            # Lines before the day's first time of day
+            block = TimeBlock('')
+            day.times.append(block)
+            activities = 0
+
+        if kind == 'activity':
+            activities += 1
+            block.items.append(ItineraryItem(ACTIVITY, match['activity'], activities))
+        else:
+            block.items.append(ItineraryItem(TEXT, match[kind]))
+
+    return itinerary
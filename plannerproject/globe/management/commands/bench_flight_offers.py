@@ -0,0 +1,133 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from globe.benchmarks import percentile
+from globe.flight_offers import OfferTable, duration_minutes
+
+AIRPORTS = ['DEL', 'BOM', 'BLR', 'MAA', 'HYD', 'CCU', 'GOI', 'DXB', 'SIN', 'LHR']
+CARRIERS = ['AI', '6E', 'UK', 'SG', 'EK', 'SQ', 'BA']
+
+
+def legacy_parse(flight_results):
+    """The previous per-offer dict copy (first segment only), kept here as the baseline"""
+    flights_data = []
+    for flight in flight_results['data']:
+        itinerary_data = flight['itineraries'][0]
+        segment = itinerary_data['segments'][0]
+        flights_data.append({
+            'airline': segment['carrierCode'],
+            'flight_number': segment['number'],
+            'departure_time': segment['departure']['at'],
+            'arrival_time': segment['arrival']['at'],
+            'departure_airport': segment['departure']['iataCode'],
+            'arrival_airport': segment['arrival']['iataCode'],
+            'duration': itinerary_data['duration'],
+            'price': flight['price']['total'],
+            'currency': flight['price']['currency'],
+            'stops': len(itinerary_data['segments']) - 1
+        })
+    return flights_data
+
+
+def legacy_query(flights, shown):
+    """Rank dict rows by price then duration, keep morning departures, and find the cheapest"""
+    ranked = sorted(flights, key=lambda f: (float(f['price']), duration_minutes(f['duration'])))
+    morning = [f for f in ranked if '06:00' <= f['departure_time'][11:16] <= '12:00']
+    cheapest = min([float(f['price']) for f in flights])
+    return ranked[:shown], morning[:shown], cheapest
+
+
+def table_query(offers, shown):
+    ranked = offers.rank(('price', 'duration'))
+    morning = offers.filter(ranked, departs_after='06:00', departs_before='12:00')
+    return offers.pick(ranked[:shown]), offers.pick(morning[:shown]), offers.cheapest_price()
+
+
+def sample_response(rng, num_offers):
+    """A flight-offers response shaped like Amadeus's, with one to three segments per offer"""
+    offers = []
+    day = datetime(2030, 11, 1)
+    for offer_id in range(1, num_offers + 1):
+        at = day + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+        segments = []
+        for _ in range(rng.choice([1, 1, 2, 2, 3])):
+            minutes = rng.randrange(60, 600, 5)
+            segments.append({
+                'departure': {'iataCode': rng.choice(AIRPORTS), 'at': at.isoformat(timespec='seconds')},
+                'arrival': {'iataCode': rng.choice(AIRPORTS), 'at': (at + timedelta(minutes=minutes)).isoformat(timespec='seconds')},
+                'carrierCode': rng.choice(CARRIERS),
+                'number': str(rng.randint(100, 9999)),
+                'duration': f"PT{minutes // 60}H{minutes % 60}M",
+            })
+            at += timedelta(minutes=minutes + rng.randrange(45, 240, 5))
+        total = (datetime.fromisoformat(segments[-1]['arrival']['at']) - datetime.fromisoformat(segments[0]['departure']['at']))
+        total = int(total.total_seconds() // 60)
+        price = f"{rng.randint(3000, 90000)}.00"
+        offers.append({
+            'type': 'flight-offer',
+            'id': str(offer_id),
+            'itineraries': [{'duration': f"PT{total // 60}H{total % 60}M", 'segments': segments}],
+            'price': {'currency': 'INR', 'total': price, 'base': price, 'grandTotal': price},
+        })
+    return {'meta': {'count': num_offers}, 'data': offers}
+
+
+class Command(BaseCommand):
+    help = "Time the columnar offer table against the old dict rows: parsing, then ranking and filtering"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offers', type=int, default=250, help="Offers per response (the API maximum is 250)")
+        parser.add_argument('--responses', type=int, default=50)
+        parser.add_argument('--shown', type=int, default=5, help="Offers kept for the page")
+        parser.add_argument('--repeat', type=int, default=5, help="Passes over the responses per implementation")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        responses = [sample_response(rng, options['offers']) for _ in range(options['responses'])]
+        self.stdout.write(f"{len(responses)} responses of {options['offers']} offers")
+
+        shown = options['shown']
+        legacy_rows = [legacy_parse(response) for response in responses]
+        tables = [OfferTable.from_response(response) for response in responses]
+        same = sum(
+            legacy_query(rows, shown)[2] == table_query(table, shown)[2]
+            and [f['price'] for f in legacy_query(rows, shown)[1]] == [offer.price_text for offer in table_query(table, shown)[1]]
+            for rows, table in zip(legacy_rows, tables)
+        )
+        self.stdout.write(f"same cheapest fare and morning offers as the dict rows: {same}/{len(responses)}")
+
+        self.stdout.write("parsing a response:")
+        self.compare(
+            self.time_each(legacy_parse, responses, options['repeat']),
+            self.time_each(OfferTable.from_response, responses, options['repeat']),
+        )
+        self.stdout.write("ranking, a departure-window filter and the cheapest fare, per request:")
+        self.compare(
+            self.time_each(lambda rows: legacy_query(rows, shown), legacy_rows, options['repeat']),
+            self.time_each(lambda table: table_query(table, shown), tables, options['repeat']),
+        )
+
+    def compare(self, before, after):
+        self.report("  dict rows (first segment only)", before)
+        self.report("  offer table (every segment)", after)
+        self.stdout.write(f"  speedup: {statistics.median(before) / statistics.median(after):.2f}x (p50)")
+
+    def time_each(self, process, items, repeat):
+        timings = []
+        for _ in range(repeat):
+            for item in items:
+                started = time.perf_counter()
+                process(item)
+                timings.append(time.perf_counter() - started)
+        return sorted(timings)
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f"{label}: mean {statistics.fmean(timings) * 1000:.2f}ms, "
+            f"p50 {percentile(timings, 50) * 1000:.2f}ms, p95 {percentile(timings, 95) * 1000:.2f}ms"
+        )
@@ -0,0 +1,147 @@
+import random
+import re
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from globe.benchmarks import percentile
+from globe.itinerary_parser import parse_itinerary
+
+TIMES = ['Morning', 'Breakfast', 'Afternoon', 'Lunch', 'Evening', 'Dinner', 'Night']
+PLACES = ['the old town', 'the fort', 'the spice bazaar', 'the riverside promenade', 'the city museum',
+          'the botanical gardens', 'a rooftop restaurant', 'the night market', 'the cathedral', 'the harbour']
+
+
+def legacy_parse(itinerary_text):
+    """The previous parse_itinerary_for_pdf, kept here as the baseline"""
+    days = []
+    current_day = None
+    current_time = None
+    for line in itinerary_text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if re.match(r'^Day\s+\d+', line, re.IGNORECASE):
+            if current_day and current_time:
+                current_day['times'].append(current_time)
+            if current_day:
+                days.append(current_day)
+            match = re.match(r'Day\s+(\d+)[:\s]*(.*)', line, re.IGNORECASE)
+            day_num = match.group(1) if match else len(days) + 1
+            title = match.group(2).strip() if match and match.group(2) else ''
+            current_day = {'day_num': day_num, 'title': title, 'times': []}
+            current_time = None
+        elif re.match(r'^(Morning|Afternoon|Evening|Night|Breakfast|Lunch|Dinner):', line, re.IGNORECASE):
+            if current_time:
+                current_day['times'].append(current_time)
+            match = re.match(r'^([^:]+):(.*)', line)
+            current_time = {'time': match.group(1).strip(), 'items': []}
+            if match.group(2).strip():
+                current_time['items'].append({'type': 'text', 'content': match.group(2).strip()})
+        elif re.match(r'^[\*\-•]\s+', line):
+            content = re.sub(r'^[\*\-•]\s+', '', line)
+            if current_time:
+                current_time['items'].append({'type': 'activity', 'content': content})
+            elif current_day:
+                if not current_day['times']:
+                    current_day['times'].append({'time': '', 'items': []})
+                current_day['times'][-1]['items'].append({'type': 'activity', 'content': content})
+        else:
+            if current_time:
+                current_time['items'].append({'type': 'text', 'content': line})
+            elif current_day and current_day['times']:
+                current_day['times'][-1]['items'].append({'type': 'text', 'content': line})
+    if current_time and current_day:
+        current_day['times'].append(current_time)
+    if current_day:
+        days.append(current_day)
+    return days
+
+
+def as_legacy(days):
+    """The parsed model in the old nested-dict shape, for comparison"""
+    return [
+        {
+            'day_num': str(day.day_num),
+            'title': day.title,
+            'times': [
+                {'time': block.time, 'items': [{'type': item.type, 'content': item.content} for item in block.items]}
+                for block in day.times
+            ],
+        }
+        for day in days
+    ]
+
+
+def sample_itinerary(rng, num_days):
+    """A long itinerary in the shapes Gemini writes: bullets, notes and the odd indented line"""
+    lines = [f"Here is your {num_days}-day adventure!", '']
+    for day in range(1, num_days + 1):
+        lines.append(f"Day {day}: Exploring {rng.choice(PLACES).title()}")
+        for time_of_day in rng.sample(TIMES, rng.randint(3, 5)):
+            lines.append(f"{time_of_day}: Spend some time at {rng.choice(PLACES)}.")
+            for _ in range(rng.randint(1, 4)):
+                bullet = rng.choice(['*', '-', '•', '*  '])
+                lines.append(f"{bullet} Visit {rng.choice(PLACES)} and {rng.choice(PLACES)}")
+            if rng.random() < 0.5:
+                lines.append(f"   Tip: book {rng.choice(PLACES)} a day ahead.")
+        lines.append('')
+    lines.append("Enjoy your trip!")
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = "Time the compiled itinerary parser against the old per-line regex parser on long itineraries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--itineraries', type=int, default=50, help="Itineraries in the corpus")
+        parser.add_argument('--min-weeks', type=int, default=2)
+        parser.add_argument('--max-weeks', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=5, help="Passes over the corpus per parser")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        corpus = [
+            sample_itinerary(rng, 7 * rng.randint(options['min_weeks'], options['max_weeks']))
+            for _ in range(options['itineraries'])
+        ]
+        total_kb = sum(len(text) for text in corpus) / 1024
+        self.stdout.write(f"{len(corpus)} itineraries, {total_kb:.0f}KB of text")
+
+        same = sum(as_legacy(parse_itinerary(text).days) == legacy_parse(text) for text in corpus)
+        self.stdout.write(f"same structure as the old parser: {same}/{len(corpus)}")
+
+        before = self.time_parser(legacy_parse, corpus, options['repeat'])
+        after = self.time_parser(parse_itinerary, corpus, options['repeat'])
+        self.report("old per-line regexes", before)
+        self.report("compiled single pass", after)
+        self.stdout.write(f"speedup: {statistics.median(before) / statistics.median(after):.2f}x per itinerary (p50)")
+
+        old_kb, new_kb = self.parsed_size(legacy_parse, corpus), self.parsed_size(parse_itinerary, corpus)
+        self.stdout.write(f"memory for the parsed corpus: {old_kb:.0f}KB old, {new_kb:.0f}KB slotted ({old_kb / new_kb:.1f}x less)")
+
+    def time_parser(self, parse, corpus, repeat):
+        timings = []
+        for _ in range(repeat):
+            for text in corpus:
+                started = time.perf_counter()
+                parse(text)
+                timings.append(time.perf_counter() - started)
+        return sorted(timings)
+
+    def parsed_size(self, parse, corpus):
+        tracemalloc.start()
+        parsed = [parse(text) for text in corpus]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del parsed
+        return size / 1024
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f"{label}: mean {statistics.fmean(timings) * 1000:.2f}ms, "
+            f"p50 {percentile(timings, 50) * 1000:.2f}ms, p95 {percentile(timings, 95) * 1000:.2f}ms"
+        )
@@ -0,0 +1,78 @@
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from globe.benchmarks import percentile
+from globe.itinerary_parser import parse_itinerary
+from globe.pdf_jobs import PDF_TEMPLATE
+from globe.pdf_render import PDF_STYLESHEET, PdfRenderer
+from globe.stubs import itinerary_text
+
+
+def time_import(module):
+    """Seconds a fresh interpreter spends importing ``module``"""
+    def run(code):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        return time.perf_counter() - started
+
+    return max(run(f'import {module}') - run('pass'), 0.0)
+
+
+class Command(BaseCommand):
+    help = "Time itinerary PDF rendering: WeasyPrint from scratch per PDF vs the long-lived PdfRenderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=20, help="PDFs to render each way")
+        parser.add_argument('--days', type=int, default=5, help="Days in the sample itinerary")
+
+    def handle(self, *args, **options):
+        html_string = render_to_string(PDF_TEMPLATE, {
+            'destination': 'Mumbai',
+            'num_days': options['days'],
+            'departure_date': None,
+            'return_date': None,
+            'parsed_itinerary': parse_itinerary(itinerary_text(options['days'])).days,
+        })
+        # The old export inlined the stylesheet, so every PDF re-parsed it
+        inline_html = html_string.replace(
+            '</head>', f"<style>{PDF_STYLESHEET.read_text(encoding='utf-8')}</style></head>", 1,
+        )
+
+        self.stdout.write(f"import weasyprint (fresh process): {time_import('weasyprint') * 1000:.0f}ms")
+
+        from weasyprint import HTML
+
+        def from_scratch():
+            # Fresh font configuration and stylesheet parse, as the inline export did
+            HTML(string=inline_html).write_pdf()
+
+        started = time.perf_counter()
+        renderer = PdfRenderer()
+        renderer.warm_up()
+        self.stdout.write(f"PdfRenderer setup and warm-up: {(time.perf_counter() - started) * 1000:.0f}ms (once per worker)")
+
+        before = self.time_renders(from_scratch, options['renders'])
+        after = self.time_renders(lambda: renderer.render(html_string), options['renders'])
+        self.report("from scratch", before)
+        self.report("PdfRenderer", after)
+        self.stdout.write(f"speedup: {statistics.median(before) / statistics.median(after):.2f}x per PDF (p50)")
+
+    def time_renders(self, render, count):
+        render()  # Leave one-off import costs out of the per-PDF numbers
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f"{label}: mean {statistics.fmean(timings) * 1000:.1f}ms, "
+            f"p50 {percentile(timings, 50) * 1000:.1f}ms, p95 {percentile(timings, 95) * 1000:.1f}ms"
+        )
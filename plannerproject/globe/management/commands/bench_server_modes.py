@@ -0,0 +1,52 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from globe.benchmarks import (
+    BenchURLConf, bench_settings, checked_status, format_summary, run_concurrent, run_threaded, summarize,
+)
+from globe.stubs import offline_providers
+
+SEARCH = {
+    'source_city': 'Delhi',
+    'destination_city': 'Mumbai',
+    'departure_date': '2030-11-01',
+    'return_date': '2030-11-04',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare trip-search throughput of the sync (WSGI) and async (ASGI) views against stubbed providers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Trip searches per mode")
+        parser.add_argument('--concurrency', type=int, default=100, help="Searches in flight at once")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Worker threads of the simulated WSGI server (e.g. gunicorn --threads)")
+        parser.add_argument('--latency', type=float, default=0.2, help="Seconds each stubbed provider call takes")
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+
+    def handle(self, *args, **options):
+        requests, concurrency = options['requests'], options['concurrency']
+        self.stdout.write(
+            f"{requests} searches, {concurrency} in flight, {options['latency'] * 1000:.0f}ms per provider call"
+        )
+
+        # Signed-cookie sessions keep the session store out of the measurement
+        with offline_providers(latency=options['latency']), \
+                bench_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            if options['mode'] in ('both', 'wsgi'):
+                with override_settings(ROOT_URLCONF=BenchURLConf(False)):
+                    threads = min(options['threads'], concurrency)
+                    summary = summarize(*run_threaded(
+                        lambda _: checked_status(Client().post('/', SEARCH)), requests, threads,
+                    ))
+                    self.stdout.write(format_summary(f"WSGI ({threads} threads)", summary))
+            if options['mode'] in ('both', 'asgi'):
+                with override_settings(ROOT_URLCONF=BenchURLConf(True)):
+                    summary = summarize(*asyncio.run(run_concurrent(self.async_search, requests, concurrency)))
+                    self.stdout.write(format_summary("ASGI (1 event loop)", summary))
+
+    async def async_search(self, _):
+        return checked_status(await AsyncClient().post('/', SEARCH))
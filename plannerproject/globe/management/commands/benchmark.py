@@ -0,0 +1,144 @@
+import asyncio
+import json
+from queue import Queue
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from globe.benchmarks import (
+    BenchURLConf, bench_settings, checked_status, format_summary, run_concurrent, run_threaded, summarize,
+)
+from globe.response_cache import local_cache
+from globe.stubs import StubConfig, offline_providers
+
+TARGETS = ['home', 'chatbot', 'pdf']
+
+SEARCH = {
+    'source_city': 'Delhi',
+    'destination_city': 'Mumbai',
+    'departure_date': '2030-11-01',
+    'return_date': '2030-11-04',
+}
+
+CHAT_MESSAGE = json.dumps({'message': "What's the best time to visit Mumbai?"})
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the trip search, chatbot and PDF export against the offline provider stubs "
+        "and report throughput and p50/p95/p99 latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', dest='targets', action='append', choices=TARGETS,
+                            help="What to benchmark; repeat for several (default: all)")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per target")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+        parser.add_argument('--latency', type=float, default=0.2, help="Seconds each provider call takes")
+        parser.add_argument('--jitter', type=float, default=0.2, help="Random +/- fraction applied to the latency")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of provider calls that fail")
+        parser.add_argument('--seed', type=int, default=None, help="Seed for jitter and error injection")
+        parser.add_argument('--async-views', action='store_true',
+                            help="Drive the async home/chatbot views through the ASGI handler")
+        parser.add_argument('--clear-cache', action='store_true',
+                            help="Clear the cache before each target so nothing is served warm")
+
+    def handle(self, *args, **options):
+        targets = options['targets'] or TARGETS
+        config = StubConfig(
+            latency=options['latency'], error_rate=options['error_rate'],
+            jitter=options['jitter'], seed=options['seed'],
+        )
+        self.stdout.write(
+            f"{options['requests']} requests per target, {options['concurrency']} in flight, "
+            f"{options['latency'] * 1000:.0f}ms provider latency, {options['error_rate']:.0%} provider errors"
+        )
+
+        # Signed-cookie sessions keep the session store out of the measurement
+        with offline_providers(config), bench_settings(
+            ROOT_URLCONF=BenchURLConf(options['async_views']),
+            SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        ):
+            for target in targets:
+                if options['clear_cache']:
+                    cache.clear()
+                    local_cache.clear()
+                config.calls.clear()
+                config.failures.clear()
+                elapsed, outcomes = getattr(self, f'bench_{target}')(options)
+                self.stdout.write(format_summary(target, summarize(elapsed, outcomes)))
+                calls = ', '.join(
+                    f"{provider} {count}" + (f" ({config.failures[provider]} failed)" if config.failures[provider] else '')
+                    for provider, count in sorted(config.calls.items())
+                )
+                self.stdout.write(f"  provider calls: {calls or 'none'}")
+
+    def clients(self, options, prepare=None):
+        """A queue of test clients, one per concurrent user"""
+        clients = Queue()
+        for _ in range(min(options['concurrency'], options['requests'])):
+            client = Client(raise_request_exception=False)
+            if prepare:
+                prepare(client)
+            clients.put(client)
+        return clients
+
+    def threaded(self, options, send, prepare=None, expected=(200,)):
+        clients = self.clients(options, prepare)
+
+        def call(_):
+            client = clients.get()
+            try:
+                return self.status(send(client), options, expected)
+            finally:
+                clients.put(client)
+
+        return run_threaded(call, options['requests'], options['concurrency'])
+
+    def bench_home(self, options):
+        if options['async_views']:
+            return asyncio.run(run_concurrent(
+                lambda _: self.async_status(AsyncClient().post('/', SEARCH), options),
+                options['requests'], options['concurrency'],
+            ))
+        return self.threaded(options, lambda client: client.post('/', SEARCH))
+
+    def bench_chatbot(self, options):
+        def send(client):
+            return client.post('/chatbot/', CHAT_MESSAGE, content_type='application/json')
+
+        if options['async_views']:
+            return asyncio.run(run_concurrent(
+                lambda _: self.async_status(
+                    AsyncClient().post('/chatbot/', CHAT_MESSAGE, content_type='application/json'), options,
+                ),
+                options['requests'], options['concurrency'],
+            ))
+        return self.threaded(options, send)
+
+    def bench_pdf(self, options):
+        def prepare(client):
+            # Each user searches first so their session has an itinerary
+            checked_status(client.post('/', SEARCH))
+            # With ITINERARY_STREAMING the itinerary only exists once streamed
+            response = client.get(reverse('itinerary_stream'))
+            checked_status(response)
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        # One untimed export first: WeasyPrint's first import is not thread-safe
+        warmup = Client(raise_request_exception=False)
+        prepare(warmup)
+        checked_status(warmup.get('/export-pdf/'))
+
+        # Under load a render can outlast PDF_EXPORT_WAIT and answer 202
+        return self.threaded(options, lambda client: client.get('/export-pdf/'), prepare, expected=(200, 202))
+
+    def status(self, response, options, expected=(200,)):
+        # Injected provider failures may surface as 5xx; count those as errors
+        return checked_status(response, expected, server_errors=options['error_rate'] > 0)
+
+    async def async_status(self, request, options):
+        return self.status(await request, options)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from globe.response_cache import cache_report, reset_report
+
+
+def percent(value):
+    return f"{value:.1%}" if value is not None else "n/a"
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters for the shared caches and how many provider calls were coalesced"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        for row in cache_report():
+            self.stdout.write(
+                f"{row['name']}: {row['hits']} hits ({row['stale_hits']} stale), {row['misses']} misses, "
+                f"hit rate {percent(row['hit_rate'])}; "
+                f"{row['upstream_calls']} upstream calls, {row['shared_calls']} shared, "
+                f"dedup ratio {percent(row['dedup_ratio'])}"
+            )
+
+        if options['reset']:
+            reset_report()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
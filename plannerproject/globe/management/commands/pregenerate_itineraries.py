@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from globe.pregeneration import Pregenerator, popular_trips
+
+
+class Command(BaseCommand):
+    help = "Generate the itineraries of the most searched trips ahead of time, and refresh them before they expire"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=settings.PREGENERATE_TOP_TRIPS,
+                            help="How many (destination, days) pairs to keep warm")
+        parser.add_argument('--window-days', type=int, default=settings.PREGENERATE_WINDOW_DAYS,
+                            help="Only count destinations searched within this many days (0 for all)")
+        parser.add_argument('--concurrency', type=int, default=settings.PREGENERATE_CONCURRENCY)
+        parser.add_argument('--rate', type=int, default=settings.GEMINI_REQUESTS_PER_MINUTE,
+                            help="Most Gemini requests per minute (0 for no limit)")
+        parser.add_argument('--refresh-margin', type=int, default=settings.ITINERARY_REFRESH_MARGIN,
+                            help="Regenerate itineraries with less than this many seconds of cache left")
+        parser.add_argument('--force', action='store_true', help="Regenerate even fresh itineraries")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the trips that would be kept warm")
+        parser.add_argument('--every', type=int, default=0,
+                            help="Keep running, starting a new pass every this many seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            self.run_once(options)
+            if not options['every']:
+                return
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
+
+    def run_once(self, options):
+        stats = popular_trips(options['top'], options['window_days'])
+        self.stdout.write(f"{len(stats)} popular trips")
+        if options['dry_run']:
+            for stat in stats:
+                self.stdout.write(f"  {stat.name}, {stat.num_days} days: {stat.search_count} searches")
+            return
+
+        pregenerator = Pregenerator(
+            per_minute=options['rate'],
+            concurrency=options['concurrency'],
+            refresh_margin=options['refresh_margin'],
+            force=options['force'],
+        )
+        started = time.monotonic()
+        outcomes = pregenerator.run(stats)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {outcomes['generated']}, {outcomes['fresh']} still fresh, "
+            f"{outcomes['failed']} failed in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from globe.geocoding import warm_geocode_cache
+
+
+class Command(BaseCommand):
+    help = "Pre-fill stored geocode results from the airport index and an optional list of places"
+
+    def add_arguments(self, parser):
+        parser.add_argument('places', nargs='*', help="Extra place names to geocode")
+        parser.add_argument('--file', help="File with one place name per line")
+        parser.add_argument(
+            '--skip-airports', action='store_true',
+            help="Don't seed the cities from the bundled airport index",
+        )
+
+    def handle(self, *args, **options):
+        places = list(options['places'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                places.extend(line.strip() for line in f if line.strip())
+
+        seeded, geocoded, missing = warm_geocode_cache(
+            places, include_airport_index=not options['skip_airports'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {seeded} cities from the airport index, geocoded {geocoded} places "
+            f"({missing} not found)"
+        ))
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.core.cache.backends.base import BaseCache
+
+METRICS_PREFIX = 'metrics_'
+
+
+def has_native_incr():
+    """Whether the cache backend increments in place (Redis, local memory) rather than with a get and a set"""
+    return cache.incr.__func__ is not BaseCache.incr
+
+
+def incr(name, amount=1):
+    """Increment a counter kept in the shared cache, so it covers every worker.
+
+    Counters are stored without a timeout. Redis increments them atomically;
+    on the file cache an increment is a read then a write, so concurrent
+    increments from several workers can be lost and the counts are
+    approximate.
+    """
+    key = METRICS_PREFIX + name
+    if has_native_incr():
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # First use: create the counter. If another worker won the race,
+            # add() is a no-op and the increment below still lands.
+            if not cache.add(key, amount, None):
+                cache.incr(key, amount)
+        return
+
+    # The generic incr() sets the value again with the default timeout, so
+    # counters would vanish five minutes after their last increment
+    if not cache.add(key, amount, None):
+        cache.set(key, cache.get(key, 0) + amount, None)
+
+
+def get_counters(*names):
+    values = cache.get_many([METRICS_PREFIX + name for name in names])
+    return {name: values.get(METRICS_PREFIX + name, 0) for name in names}
+
+
+def reset(*names):
+    cache.delete_many([METRICS_PREFIX + name for name in names])
+
+
+def record_cache_lookup(namespace, hit):
+    incr(f"{namespace}_{'hits' if hit else 'misses'}")
+
+
+def cache_hit_rate(namespace):
+    """Return ``(hits, misses, hit rate or None)`` for a cache namespace"""
+    counters = get_counters(f'{namespace}_hits', f'{namespace}_misses')
+    hits, misses = counters[f'{namespace}_hits'], counters[f'{namespace}_misses']
+    total = hits + misses
+    return hits, misses, (hits / total if total else None)
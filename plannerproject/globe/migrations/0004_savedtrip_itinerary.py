@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globe', '0003_geocodedplace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedtrip',
+            name='itinerary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='savedtrip',
+            name='return_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:59
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from globe.itinerary_parser import parse_itinerary
+
+
+def store_saved_itineraries(apps, schema_editor):
+    """Move itinerary text saved on trips into stored itineraries"""
+    SavedTrip = apps.get_model('globe', 'SavedTrip')
+    StoredItinerary = apps.get_model('globe', 'StoredItinerary')
+    StoredItineraryDay = apps.get_model('globe', 'StoredItineraryDay')
+    StoredTimeBlock = apps.get_model('globe', 'StoredTimeBlock')
+    StoredItineraryItem = apps.get_model('globe', 'StoredItineraryItem')
+
+    for trip in SavedTrip.objects.exclude(itinerary=''):
+        text = trip.itinerary.strip()
+        content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        stored = StoredItinerary.objects.filter(content_hash=content_hash).first()
+        if stored is None:
+            parsed = parse_itinerary(text)
+            stored = StoredItinerary.objects.create(content_hash=content_hash, text=text, intro='\n'.join(parsed.intro))
+            for day_position, day in enumerate(parsed.days):
+                day_row = StoredItineraryDay.objects.create(
+                    itinerary=stored, position=day_position, day_num=day.day_num, title=day.title,
+                )
+                for block_position, block in enumerate(day.times):
+                    block_row = StoredTimeBlock.objects.create(day=day_row, position=block_position, time=block.time)
+                    StoredItineraryItem.objects.bulk_create([
+                        StoredItineraryItem(
+                            block=block_row, position=position, type=item.type, content=item.content, number=item.number,
+                        )
+                        for position, item in enumerate(block.items)
+                    ])
+        trip.stored_itinerary = stored
+        trip.save(update_fields=['stored_itinerary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globe', '0004_savedtrip_itinerary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredItinerary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField()),
+                ('intro', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='savedtrip',
+            name='share_token',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='savedtrip',
+            name='stored_itinerary',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='saved_trips', to='globe.storeditinerary'),
+        ),
+        migrations.CreateModel(
+            name='StoredItineraryDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('day_num', models.PositiveIntegerField()),
+                ('title', models.TextField(blank=True, default='')),
+                ('itinerary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='globe.storeditinerary')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StoredTimeBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('time', models.CharField(blank=True, default='', max_length=20)),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='times', to='globe.storeditineraryday')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StoredItineraryItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('type', models.CharField(choices=[('activity', 'Activity'), ('text', 'Text')], max_length=10)),
+                ('content', models.TextField()),
+                ('number', models.PositiveIntegerField(default=0)),
+                ('block', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='globe.storedtimeblock')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='storeditineraryday',
+            constraint=models.UniqueConstraint(fields=('itinerary', 'position'), name='unique_itinerary_day_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='storedtimeblock',
+            constraint=models.UniqueConstraint(fields=('day', 'position'), name='unique_time_block_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='storeditineraryitem',
+            constraint=models.UniqueConstraint(fields=('block', 'position'), name='unique_itinerary_item_position'),
+        ),
+        migrations.RunPython(store_saved_itineraries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='savedtrip',
+            name='itinerary',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globe', '0005_stored_itinerary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationSearchStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destination', models.CharField(max_length=200)),
+                ('name', models.CharField(max_length=200)),
+                ('num_days', models.PositiveSmallIntegerField()),
+                ('search_count', models.PositiveIntegerField(default=0)),
+                ('last_searched_at', models.DateTimeField()),
+                ('last_pregenerated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-search_count'], name='destination_search_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('destination', 'num_days'), name='unique_destination_search')],
+            },
+        ),
+    ]
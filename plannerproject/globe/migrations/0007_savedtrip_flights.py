@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('globe', '0006_destinationsearchstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedtrip',
+            name='outbound_flight',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedtrip',
+            name='return_flight',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -30,12 +30,102 @@ class SavedTrip(models.Model):
     source_city = models.CharField(max_length=200)
     destination_city = models.CharField(max_length=200)
     departure_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
     estimated_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
+    stored_itinerary = models.ForeignKey(
+        'StoredItinerary', on_delete=models.SET_NULL, null=True, blank=True, related_name='saved_trips',
+    )
+    # Set when the owner shares the trip; anyone with the link can view it
+    share_token = models.CharField(max_length=32, unique=True, null=True, blank=True)
+    # Cheapest offers found when the trip was saved (FlightOffer.as_dict())
+    outbound_flight = models.JSONField(null=True, blank=True)
+    return_flight = models.JSONField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return f"{self.source_city} to {self.destination_city} - {self.departure_date}"
+
+
+class GeocodedPlace(models.Model):
+    """Stored geocoding result, keyed by normalized place name"""
+    name = models.CharField(max_length=200, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.latitude}, {self.longitude})"
+
+
+class DestinationSearchStat(models.Model):
+    """How often trips to a destination for a number of days are searched"""
+    destination = models.CharField(max_length=200)  # Normalized place name
+    name = models.CharField(max_length=200)  # As first typed, used in the prompt
+    num_days = models.PositiveSmallIntegerField()
+    search_count = models.PositiveIntegerField(default=0)
+    last_searched_at = models.DateTimeField()
+    last_pregenerated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['destination', 'num_days'], name='unique_destination_search'),
+        ]
+        indexes = [
+            models.Index(fields=['-search_count'], name='destination_search_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.num_days} days): {self.search_count} searches"
+
+class StoredItinerary(models.Model):
+    """Generated itinerary text, stored once per distinct text along with its parsed days"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    intro = models.TextField(blank=True, default='')  # Lines before the first day
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Itinerary {self.content_hash[:12]}"
+
+
+class StoredItineraryDay(models.Model):
+    itinerary = models.ForeignKey(StoredItinerary, on_delete=models.CASCADE, related_name='days')
+    position = models.PositiveIntegerField()
+    day_num = models.PositiveIntegerField()
+    title = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['itinerary', 'position'], name='unique_itinerary_day_position'),
+        ]
+
+
+class StoredTimeBlock(models.Model):
+    day = models.ForeignKey(StoredItineraryDay, on_delete=models.CASCADE, related_name='times')
+    position = models.PositiveIntegerField()
+    time = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'position'], name='unique_time_block_position'),
+        ]
+
+
+class StoredItineraryItem(models.Model):
+    block = models.ForeignKey(StoredTimeBlock, on_delete=models.CASCADE, related_name='items')
+    position = models.PositiveIntegerField()
+    type = models.CharField(max_length=10, choices=[('activity', 'Activity'), ('text', 'Text')])
+    content = models.TextField()
+    number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['block', 'position'], name='unique_itinerary_item_position'),
+        ]
@@ -0,0 +1,201 @@
+"""Background PDF rendering for the itinerary export.
+
+PDFs are rendered in a process pool and stored on disk under a key hashed
+from everything that goes into them: the itinerary, the trip details and
+the template source. Exporting the same itinerary again is then a file read.
+Concurrent requests for the same PDF share one render. Within a process
+they share the pending future; across workers they share a job record in
+the cache, which the first worker claims with ``cache.add``. Stored PDFs
+are deleted ``PDF_STORE_TIMEOUT`` after they were rendered, when their job
+record expires, by a sweep that one export runs every
+``PDF_STORE_SWEEP_INTERVAL``.
+"""
+import hashlib
+import json
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+
+from .pdf_render import PDF_STYLESHEET, render_pdf_file, warm_up
+
+PDF_TEMPLATE = 'globe/itinerary_pdf.html'
+BULK_PDF_TEMPLATE = 'globe/itinerary_bulk_pdf.html'
+PDF_TEMPLATES = (PDF_TEMPLATE, BULK_PDF_TEMPLATE, 'globe/itinerary_pdf_trip.html')
+# Bump to re-render every stored PDF, e.g. after upgrading WeasyPrint
+PDF_RENDER_VERSION = 2
+
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+MISSING = 'missing'
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = {}  # key -> Future, for renders started by this process
+_pending_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def template_version():
+    """Hash of the PDF templates and stylesheet, so editing any of them invalidates stored PDFs"""
+    source = ''.join(get_template(name).template.source for name in PDF_TEMPLATES)
+    source += PDF_STYLESHEET.read_text(encoding='utf-8')
+    return hashlib.sha256(f"{PDF_RENDER_VERSION}:{source}".encode('utf-8')).hexdigest()[:16]
+
+
+def pdf_key(itinerary, destination, num_days, departure_date, return_date, weather=()):
+    payload = json.dumps(
+        [template_version(), itinerary, destination, num_days, departure_date, return_date, list(weather)],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_valid_key(key):
+    return bool(re.fullmatch(r'[0-9a-f]{64}', key or ''))
+
+
+def pdf_path(key):
+    return Path(settings.PDF_STORE_DIR) / f"{key}.pdf"
+
+
+def job_cache_key(key):
+    return f"pdf_job_{key}"
+
+
+def get_pool():
+    """Return the process-wide render pool, starting it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawn rather than fork: the web process runs threads.
+                # Each worker loads WeasyPrint and the stylesheet up front.
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=warm_up,
+                )
+    return _pool
+
+
+def _submit(*args):
+    global _pool
+    try:
+        return get_pool().submit(*args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool
+        with _pool_lock:
+            _pool = None
+        return get_pool().submit(*args)
+
+
+def pdf_job(key):
+    """Return the job record for ``key``: ``{'status', 'filename', ...}``"""
+    job = cache.get(job_cache_key(key)) or {'status': MISSING}
+    if pdf_path(key).exists():
+        job = {**job, 'status': READY}
+    elif job['status'] == READY:
+        job = {**job, 'status': MISSING}  # Removed from the store since
+    return job
+
+
+def sweep_pdf_store(now=None):
+    """Delete stored PDFs rendered more than ``PDF_STORE_TIMEOUT`` ago; returns how many"""
+    cutoff = (now or time.time()) - settings.PDF_STORE_TIMEOUT
+    removed = 0
+    for path in Path(settings.PDF_STORE_DIR).glob('*.pdf'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass  # Swept by another worker
+    if removed:
+        print(f"Removed {removed} expired PDFs from the store")
+    return removed
+
+
+def maybe_sweep_pdf_store():
+    """Sweep the store in the background, at most once per ``PDF_STORE_SWEEP_INTERVAL`` across workers"""
+    if cache.add('pdf_store_sweep', True, settings.PDF_STORE_SWEEP_INTERVAL):
+        threading.Thread(target=sweep_pdf_store, daemon=True).start()
+
+
+def request_pdf(key, context, filename, template=PDF_TEMPLATE):
+    """Make sure the PDF for ``key`` is stored or being rendered; returns its status"""
+    maybe_sweep_pdf_store()
+    if pdf_path(key).exists():
+        return READY
+    if key in _pending:
+        return PENDING
+
+    # Rendering the HTML can take a while for long itineraries, so it is done
+    # before taking the lock; a request that loses the race throws it away
+    html_string = render_to_string(template, context)
+
+    with _pending_lock:
+        if key in _pending:
+            return PENDING
+
+        job = {'status': PENDING, 'filename': filename}
+        if not cache.add(job_cache_key(key), job, settings.PDF_RENDER_TIMEOUT):
+            existing = cache.get(job_cache_key(key))
+            if existing and existing['status'] == PENDING:
+                return PENDING  # Another worker is rendering it
+            # A failed render, or a stored PDF that has been removed since
+            cache.set(job_cache_key(key), job, settings.PDF_RENDER_TIMEOUT)
+
+        try:
+            Path(settings.PDF_STORE_DIR).mkdir(parents=True, exist_ok=True)
+            future = _submit(render_pdf_file, html_string, str(pdf_path(key)))
+        except Exception:
+            cache.delete(job_cache_key(key))
+            raise
+        _pending[key] = future
+
+    future.add_done_callback(lambda f: _finish(key, filename, f))
+    return PENDING
+
+
+def _finish(key, filename, future):
+    try:
+        future.result()
+    except Exception as e:
+        print(f"PDF render failed for {key}: {e}")
+        # Keep the failure briefly so pollers see it, then allow a retry
+        cache.set(job_cache_key(key), {'status': FAILED, 'filename': filename, 'error': str(e)}, 60)
+    else:
+        cache.set(job_cache_key(key), {'status': READY, 'filename': filename}, settings.PDF_STORE_TIMEOUT)
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+
+
+def wait_for_pdf(key, timeout):
+    """Wait up to ``timeout`` seconds for a pending render; returns the final status"""
+    deadline = time.monotonic() + timeout
+    future = _pending.get(key)
+    if future is not None:
+        try:
+            future.result(timeout)
+        except FutureTimeoutError:
+            return PENDING
+        except Exception:
+            return FAILED
+
+    # Rendered by another worker: watch the store
+    while True:
+        status = pdf_job(key)['status']
+        if status != PENDING or time.monotonic() >= deadline:
+            return status
+        time.sleep(0.2)
@@ -0,0 +1,77 @@
+"""PDF rendering that runs in the PDF worker processes.
+
+Kept free of Django imports so worker processes start quickly and never
+touch settings, the database or the cache.
+"""
+import os
+import threading
+from pathlib import Path
+
+PDF_STYLESHEET = Path(__file__).resolve().parent / 'static' / 'globe' / 'css' / 'itinerary_pdf.css'
+
+WARM_UP_HTML = (
+    '<html><body><div class="header"><h1>WanderMate</h1></div>'
+    '<div class="day"><h2 class="day-title">Day 1</h2><p>Warm-up</p></div></body></html>'
+)
+
+
+class PdfRenderer:
+    """Long-lived WeasyPrint renderer.
+
+    Imports WeasyPrint once, compiles the itinerary stylesheet into a
+    ``CSS`` object reused for every document, and shares one
+    ``FontConfiguration`` so font lookups are cached across renders.
+    """
+
+    def __init__(self, stylesheet_path=PDF_STYLESHEET):
+        from weasyprint import CSS, HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        self._html = HTML
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(filename=str(stylesheet_path), font_config=self.font_config)
+
+    def render(self, html_string, target=None):
+        """Render to ``target`` (a path or file), or return the PDF bytes"""
+        return self._html(string=html_string).write_pdf(
+            target, stylesheets=[self.stylesheet], font_config=self.font_config,
+        )
+
+    def warm_up(self):
+        """Render a tiny document so font discovery and layout setup happen now"""
+        self.render(WARM_UP_HTML)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """Return this process's renderer, creating it on first use"""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PdfRenderer()
+    return _renderer
+
+
+def warm_up():
+    """Process pool initializer: get the renderer ready before the first job"""
+    try:
+        get_renderer().warm_up()
+    except Exception as e:
+        # Don't break the pool; the render itself will report the problem
+        print(f"PDF renderer warm-up failed: {e}")
+
+
+def render_pdf_file(html_string, path):
+    """Render ``html_string`` to a PDF at ``path``, replacing it atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        get_renderer().render(html_string, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.db import connections
+
+
+# When the stage running in this thread or task is given up on, as time.monotonic()
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+
+def time_left(limit):
+    """Seconds until the current stage's deadline, at most ``limit``; ``limit`` outside a stage"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return limit
+    return max(min(limit, deadline - time.monotonic()), 0)
+
+
+def stage_expired():
+    """Whether the deadline of the stage running in this thread or task has passed"""
+    deadline = current_deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class PipelineError(Exception):
+    """Raised when a stage fails and the pipeline is not in partial mode"""
+
+
+class Stage:
+    """A single step in the trip-search pipeline.
+
+    ``func`` is called with the results of the stages listed in ``requires``
+    as positional arguments, in the same order.
+    """
+
+    def __init__(self, name, func, requires=(), timeout=None, default=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.timeout = timeout
+        self.default = default
+
+
+def select_stages(stages, targets):
+    """The stages needed to produce ``targets``: those stages and everything they require"""
+    by_name = {stage.name: stage for stage in stages}
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        if name not in by_name:
+            raise ValueError(f"Unknown stage: '{name}'")
+        selected.add(name)
+        pending.extend(by_name[name].requires)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def _run_stage(func, args, deadline):
+    token = current_deadline.set(deadline)
+    try:
+        return func(*args)
+    finally:
+        current_deadline.reset(token)
+        # Worker threads get their own DB connections; don't leak them
+        connections.close_all()
+
+
+def run_stages(stages, timeout=None, partial=True, max_workers=None):
+    """Run stages concurrently, starting each one as soon as its inputs are ready.
+
+    Returns ``(results, errors)``. In partial mode a stage that raises or runs
+    past its timeout gets its ``default`` value and its error is recorded, so
+    dependent stages still run. Otherwise a ``PipelineError`` is raised.
+    """
+    stages = {stage.name: stage for stage in stages}
+    for stage in stages.values():
+        missing = [name for name in stage.requires if name not in stages]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' requires unknown stages: {missing}")
+
+    if timeout is None:
+        timeout = getattr(settings, 'TRIP_SEARCH_TIMEOUT', 20)
+    default_stage_timeout = getattr(settings, 'TRIP_SEARCH_STAGE_TIMEOUT', 10)
+    max_workers = max_workers or getattr(settings, 'TRIP_SEARCH_MAX_WORKERS', 8)
+
+    results = {}
+    errors = {}
+    pending = dict(stages)
+    running = {}  # future -> (stage, deadline)
+    deadline = time.monotonic() + timeout
+
+    def fail(stage, error):
+        if not partial:
+            raise PipelineError(f"Stage '{stage.name}' failed: {error}") from error
+        print(f"Pipeline stage '{stage.name}' failed: {error}")
+        results[stage.name] = stage.default
+        errors[stage.name] = str(error) or error.__class__.__name__
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trip-search')
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.requires):
+                    if time.monotonic() >= deadline:
+                        del pending[name]
+                        fail(stage, TimeoutError(f"pipeline timed out after {timeout}s"))
+                        continue
+                    args = [results[dep] for dep in stage.requires]
+                    stage_timeout = stage.timeout or default_stage_timeout
+                    ends_at = time.monotonic() + stage_timeout
+                    future = executor.submit(_run_stage, stage.func, args, min(ends_at, deadline))
+                    running[future] = (stage, ends_at)
+                    del pending[name]
+
+            if not running:
+                # Only reachable when the remaining stages depend on each other
+                raise ValueError(f"Pipeline has a dependency cycle: {sorted(pending)}")
+
+            now = time.monotonic()
+            next_deadline = min(min(d for _, d in running.values()), deadline)
+            done, _ = wait(running, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, _ = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    fail(stage, e)
+
+            now = time.monotonic()
+            for future, (stage, stage_deadline) in list(running.items()):
+                if now >= stage_deadline or now >= deadline:
+                    future.cancel()
+                    del running[future]
+                    fail(stage, TimeoutError(f"timed out after {stage.timeout or default_stage_timeout}s"))
+    finally:
+        # Abandon stragglers instead of blocking the response on them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results, errors
+
+
+async def run_stages_async(stages, timeout=None, partial=True):
+    """Async counterpart of ``run_stages`` for use on an event loop.
+
+    Each stage is a task that awaits the stages it requires. ``func`` may
+    return an awaitable, which is awaited under the stage timeout; plain
+    values are used as they are, so cheap guard clauses can stay sync.
+    Returns ``(results, errors)`` with the same partial-mode semantics.
+    """
+    stages = {stage.name: stage for stage in stages}
+    for stage in stages.values():
+        missing = [name for name in stage.requires if name not in stages]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' requires unknown stages: {missing}")
+
+    if timeout is None:
+        timeout = getattr(settings, 'TRIP_SEARCH_TIMEOUT', 20)
+    default_stage_timeout = getattr(settings, 'TRIP_SEARCH_STAGE_TIMEOUT', 10)
+
+    results = {}
+    errors = {}
+    tasks = {}
+    deadline = time.monotonic() + timeout
+
+    def fail(stage, error):
+        if not partial:
+            raise PipelineError(f"Stage '{stage.name}' failed: {error}") from error
+        print(f"Pipeline stage '{stage.name}' failed: {error}")
+        results[stage.name] = stage.default
+        errors[stage.name] = str(error) or error.__class__.__name__
+
+    async def run(stage):
+        args = [await tasks[dep] for dep in stage.requires]
+        stage_timeout = stage.timeout or default_stage_timeout
+        # Each task runs in its own copy of the context
+        current_deadline.set(min(time.monotonic() + stage_timeout, deadline))
+        try:
+            result = stage.func(*args)
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, stage_timeout)
+        except asyncio.TimeoutError:
+            fail(stage, TimeoutError(f"timed out after {stage_timeout}s"))
+        except Exception as e:
+            fail(stage, e)
+        else:
+            results[stage.name] = result
+        return results[stage.name]
+
+    visiting = set()
+
+    def schedule(stage):
+        if stage.name in tasks:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Pipeline has a dependency cycle: {sorted(visiting)}")
+        visiting.add(stage.name)
+        for dep in stage.requires:
+            schedule(stages[dep])
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+
+    try:
+        for stage in stages.values():
+            schedule(stage)
+        await asyncio.wait_for(asyncio.gather(*tasks.values()), timeout)
+    except asyncio.TimeoutError:
+        # wait_for cancelled the stragglers; give them their defaults
+        for name, stage in stages.items():
+            if name not in results:
+                fail(stage, TimeoutError(f"pipeline timed out after {timeout}s"))
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+    return results, errors
@@ -0,0 +1,150 @@
+"""Pre-generating itineraries for the most searched trips.
+
+Every trip search counts towards its (destination, number of days) pair.
+``pregenerate_itineraries`` generates the itineraries of the top pairs
+ahead of time, and regenerates them before their cache entry expires, so
+searches for popular trips find the itinerary in the cache instead of
+waiting on Gemini.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections
+from django.db.models import F
+from django.utils import timezone
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+
+from . import providers
+from .airports import normalize_place
+from .itinerary import fetch_itinerary, itinerary_age
+from .models import DestinationSearchStat
+
+
+def record_search(dest, num_days):
+    """Count a trip search towards its destination's popularity"""
+    destination = normalize_place(dest)
+    if not destination:
+        return
+    now = timezone.now()
+    try:
+        updated = DestinationSearchStat.objects.filter(destination=destination, num_days=num_days).update(
+            search_count=F('search_count') + 1, last_searched_at=now,
+        )
+        if not updated:
+            try:
+                DestinationSearchStat.objects.create(
+                    destination=destination, name=dest.strip(), num_days=num_days,
+                    search_count=1, last_searched_at=now,
+                )
+            except IntegrityError:
+                # Created by a concurrent search in the meantime
+                record_search(dest, num_days)
+    except Exception as e:
+        # Never fail a search over its statistics
+        print(f"Could not record search for {dest}: {e}")
+
+
+def popular_trips(top, window_days=None):
+    """The ``top`` most searched pairs, counting destinations searched in the last ``window_days``"""
+    stats = DestinationSearchStat.objects.order_by('-search_count', 'destination')
+    if window_days:
+        stats = stats.filter(last_searched_at__gte=timezone.now() - timedelta(days=window_days))
+    return list(stats[:top])
+
+
+def is_rate_limited(error):
+    return isinstance(error, (ResourceExhausted, TooManyRequests)) or getattr(error, 'code', None) == 429
+
+
+class RateLimiter:
+    """Spaces calls ``60 / per_minute`` seconds apart across threads"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+    def back_off(self, seconds):
+        """Hold every caller for ``seconds``, e.g. after the API said we are over quota"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+class Pregenerator:
+    """Generates itineraries for popular trips within the model's rate limit.
+
+    ``refresh_margin`` is how long before the cache entry expires an
+    itinerary gets regenerated.
+    """
+
+    def __init__(self, per_minute, concurrency, refresh_margin, max_retries=3, retry_delay=10.0, force=False):
+        self.limiter = RateLimiter(per_minute)
+        self.concurrency = concurrency
+        self.refresh_after = max(settings.ITINERARY_CACHE_TIMEOUT - refresh_margin, 0)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.force = force
+        self._attractions = {}
+        self._attraction_locks = {}
+        self._locks_lock = threading.Lock()
+
+    def attractions(self, name):
+        """Attractions for ``name``, fetched once per run however many trip lengths need them"""
+        with self._locks_lock:
+            lock = self._attraction_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._attractions:
+                self._attractions[name] = providers.get_google_places(name)
+            return self._attractions[name]
+
+    def needs_refresh(self, name, attractions, num_days):
+        if self.force:
+            return True
+        age = itinerary_age(name, attractions, num_days)
+        return age is None or age >= self.refresh_after
+
+    def generate(self, name, attractions, num_days):
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                return fetch_itinerary(name, attractions, num_days)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                print(f"Rate limited generating {name} ({num_days} days); retrying in {delay:.0f}s")
+                self.limiter.back_off(delay)
+                delay *= 2
+
+    def pregenerate(self, stat):
+        """Returns 'generated', 'fresh' or 'failed'"""
+        try:
+            attractions = self.attractions(stat.name)
+            if not self.needs_refresh(stat.name, attractions, stat.num_days):
+                return 'fresh'
+            self.generate(stat.name, attractions, stat.num_days)
+            DestinationSearchStat.objects.filter(pk=stat.pk).update(last_pregenerated_at=timezone.now())
+            return 'generated'
+        except Exception as e:
+            print(f"Could not pregenerate {stat.name} ({stat.num_days} days): {e}")
+            return 'failed'
+        finally:
+            connections.close_all()  # This worker thread's connections
+
+    def run(self, stats):
+        """Pregenerate every pair in ``stats``; returns ``{outcome: count}``"""
+        outcomes = {'generated': 0, 'fresh': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for outcome in pool.map(self.pregenerate, stats):
+                outcomes[outcome] += 1
+        return outcomes
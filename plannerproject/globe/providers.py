@@ -0,0 +1,320 @@
+"""Blocking helpers for the external travel data providers.
+
+``globe.async_providers`` offers the same functions as coroutines; both
+modules share the request building and response parsing defined here.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .airports import get_airport_index, normalize_place
+from .amadeus import amadeus_get, token_provider
+from .clients import get_client
+from .geocoding import get_coords  # noqa: F401 (part of the provider interface)
+from .hotels import HOTEL_CURRENCY, hotel_id_chunks, merge_offers, nearest_hotels, stay_nights
+from .itinerary import generate_itinerary, get_cached_itinerary  # noqa: F401
+from .response_cache import cached_response
+from .singleflight import single_flight
+from .weather import forecast_run, parse_forecast
+
+AMADEUS_LOCATIONS_URL = "https://test.api.amadeus.com/v1/reference-data/locations"
+AMADEUS_FLIGHT_OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+AMADEUS_HOTELS_BY_CITY_URL = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
+AMADEUS_HOTEL_OFFERS_URL = "https://test.api.amadeus.com/v3/shopping/hotel-offers"
+GOOGLE_PLACES_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+OPENWEATHER_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+EXCHANGE_RATES_URL = "https://open.er-api.com/v6/latest/{base}"
+
+
+def airport_code_cache_key(city_name):
+    return f"airport_code_{normalize_place(city_name).replace(' ', '_')}"
+
+
+def pick_airport_code(locations):
+    """Pick the best IATA code from an Amadeus locations response"""
+    # Prefer airports, then cities with an associated airport, then any
+    # location with a code
+    return (
+        next((loc.get('iataCode') for loc in locations if loc.get('subType') == 'AIRPORT'), None)
+        or next((loc.get('iataCode') for loc in locations if loc.get('subType') == 'CITY'), None)
+        or next((loc.get('iataCode') for loc in locations if loc.get('iataCode')), None)
+    )
+
+
+def airport_search_params(city_name):
+    return {
+        'keyword': city_name,
+        'subType': 'AIRPORT,CITY',
+    }
+
+
+def flight_search_params(origin_code, destination_code, departure_date, adults=1):
+    return {
+        'originLocationCode': origin_code,
+        'destinationLocationCode': destination_code,
+        'departureDate': departure_date,
+        'adults': adults,
+        'currencyCode': 'INR',
+        'max': settings.FLIGHT_SEARCH_MAX_OFFERS
+    }
+
+
+def hotel_list_params(city_code):
+    return {
+        'cityCode': city_code,
+        'radius': settings.HOTEL_SEARCH_RADIUS,
+        'radiusUnit': 'KM',
+    }
+
+
+def hotel_offers_params(hotel_ids, checkin_date, checkout_date, adults=1):
+    return {
+        'hotelIds': ','.join(hotel_ids),
+        'checkInDate': checkin_date,
+        'checkOutDate': checkout_date,
+        'adults': adults,
+        'currency': HOTEL_CURRENCY,
+        'bestRateOnly': 'true',
+    }
+
+
+def places_params(city_name):
+    return {
+        "query": f"top attractions in {city_name}",
+        "key": os.getenv("GOOGLE_PLACES_API_KEY")
+    }
+
+
+def add_place_images(results, api_key):
+    """Enrich Google Places results with image URLs"""
+    for place in results:
+        if place.get('photos'):
+            # Get the first photo reference
+            photo_reference = place['photos'][0]['photo_reference']
+            # Construct the photo URL
+            place['image_url'] = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_reference}&key={api_key}"
+        else:
+            # Placeholder image if no photo available
+            place['image_url'] = "https://via.placeholder.com/400x300?text=No+Image"
+    return results
+
+
+def weather_params(city_name):
+    return {
+        "q": city_name,
+        "appid": os.getenv("OPENWEATHER_API_KEY"),
+        "units": "metric",
+        "cnt": 40  # Every 3-hour slot of the 5-day forecast
+    }
+
+
+def place_call_params(city_name):
+    return [normalize_place(city_name)]
+
+
+def weather_call_params(city_name):
+    # A new forecast run comes out every three hours; each run is cached on its own
+    return [normalize_place(city_name), forecast_run()]
+
+
+def flight_call_params(origin_code, destination_code, departure_date, access_token=None, adults=1):
+    # The token doesn't change the answer, so callers with different tokens share a call
+    return [origin_code, destination_code, str(departure_date), adults]
+
+
+def hotel_list_call_params(city_code, access_token=None):
+    return [city_code]
+
+
+def hotel_offers_call_params(hotel_ids, checkin_date, checkout_date, access_token=None, adults=1):
+    return [sorted(hotel_ids), str(checkin_date), str(checkout_date), adults]
+
+
+def rates_call_params(base):
+    return [base.upper()]
+
+
+def parse_exchange_rates(data):
+    """Units of each currency per unit of the base currency, or None"""
+    if data.get('result') != 'success':
+        print(f"Exchange rates error: {data.get('error-type')}")
+        return None
+    return data.get('rates')
+
+
+def parse_weather(data):
+    print(f"Weather data received for: {data.get('city', {}).get('name')}")
+    return parse_forecast(data)
+
+
+def get_amadeus_token():
+    """Get access token from Amadeus API (shared and reused until it expires)"""
+    return token_provider.get_token()
+
+
+def get_airport_code(city_name, access_token=None):
+    """Get IATA airport code for a city with fallback options"""
+    # The bundled airport index answers almost every lookup without I/O
+    airport_index = get_airport_index()
+    code = airport_index.find_code(city_name)
+    if code:
+        return code
+
+    # Codes other workers already resolved through the API
+    cache_key = airport_code_cache_key(city_name)
+    code = cache.get(cache_key)
+    if code:
+        airport_index.remember(city_name, code)
+        return code
+
+    try:
+        response = amadeus_get(AMADEUS_LOCATIONS_URL, airport_search_params(city_name), access_token)
+        print(f"Airport search for {city_name}: {response.status_code}")  # Debug
+
+        if response.status_code == 200:
+            code = pick_airport_code(response.json().get('data', []))
+            if code:
+                airport_index.remember(city_name, code)
+                cache.set(cache_key, code, settings.AIRPORT_CODE_CACHE_TIMEOUT)
+                return code
+        else:
+            print(f"Airport search error: {response.text}")  # Debug
+
+    except Exception as e:
+        print(f"Error getting airport code for {city_name}: {e}")
+    return None
+
+
+@cached_response('flights', flight_call_params)
+@single_flight('flights', flight_call_params)
+def search_flights(origin_code, destination_code, departure_date, access_token=None, adults=1):
+    """Search for flights using Amadeus API"""
+    params = flight_search_params(origin_code, destination_code, departure_date, adults)
+
+    try:
+        response = amadeus_get(AMADEUS_FLIGHT_OFFERS_URL, params, access_token)
+        print(f"Flight search response: {response.status_code}")  # Debug
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            print(f"Flight search error: {response.text}")  # Debug
+
+    except Exception as e:
+        print(f"Error searching flights: {e}")
+    return None
+
+
+@cached_response('google_places', place_call_params)
+@single_flight('google_places', place_call_params)
+def get_google_places(city_name):
+    """Fetch top attractions for a given city using Google Places API."""
+    params = places_params(city_name)
+    try:
+        response = get_client('google_places').get(GOOGLE_PLACES_URL, params=params)
+        if response.status_code == 200:
+            return add_place_images(response.json().get("results", []), params['key'])
+        else:
+            print(f"Google Places error: {response.text}")
+    except Exception as e:
+        print(f"Error fetching Google Places data: {e}")
+    return []
+
+
+@cached_response('hotel_list', hotel_list_call_params)
+@single_flight('hotel_list', hotel_list_call_params)
+def get_city_hotels(city_code, access_token=None):
+    """The hotels nearest a city's centre, from the Amadeus hotel list"""
+    try:
+        response = amadeus_get(AMADEUS_HOTELS_BY_CITY_URL, hotel_list_params(city_code), access_token)
+        print(f"Hotel list response: {response.status_code}")
+
+        if response.status_code == 200:
+            return nearest_hotels(response.json().get('data', []), settings.HOTEL_SEARCH_HOTELS)
+        else:
+            print(f"Hotel list error: {response.text}")
+    except Exception as e:
+        print(f"Error listing hotels: {e}")
+    return []
+
+
+@cached_response('hotel_offers', hotel_offers_call_params)
+@single_flight('hotel_offers', hotel_offers_call_params)
+def get_hotel_offers(hotel_ids, checkin_date, checkout_date, access_token=None, adults=1):
+    """Offers for some hotels and dates using Amadeus API; None if the request failed"""
+    params = hotel_offers_params(hotel_ids, checkin_date, checkout_date, adults)
+
+    try:
+        response = amadeus_get(AMADEUS_HOTEL_OFFERS_URL, params, access_token)
+        print(f"Hotel offers response: {response.status_code}")
+
+        if response.status_code == 200:
+            return response.json().get('data', [])
+        else:
+            print(f"Hotel offers error: {response.text}")
+    except Exception as e:
+        print(f"Error getting hotel offers: {e}")
+    return None
+
+
+# Offer requests outlive a search that stops waiting for them, so their
+# answers still reach the cache
+_hotel_offers_pool = ThreadPoolExecutor(max_workers=settings.HOTEL_OFFERS_CONCURRENCY, thread_name_prefix='hotel-offers')
+
+
+def search_hotels(city_code, checkin_date, checkout_date, access_token=None, adults=1):
+    """Hotels with their best offer for the dates, within ``HOTEL_SEARCH_BUDGET`` (see ``globe.hotels``)"""
+    deadline = time.monotonic() + settings.HOTEL_SEARCH_BUDGET
+    hotels = get_city_hotels(city_code, access_token)
+    chunks = hotel_id_chunks(hotels, settings.HOTEL_OFFERS_CHUNK_SIZE)
+    futures = [
+        _hotel_offers_pool.submit(get_hotel_offers, chunk, checkin_date, checkout_date, access_token, adults)
+        for chunk in chunks
+    ]
+    done, late = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    if late:
+        print(f"Hotel offers: {len(late)} of {len(futures)} requests missed the {settings.HOTEL_SEARCH_BUDGET}s budget")
+    answers = [(chunk, future.result()) for chunk, future in zip(chunks, futures) if future in done]
+    return merge_offers(hotels, answers, stay_nights(checkin_date, checkout_date))
+
+
+@cached_response('weather', weather_call_params)
+@single_flight('weather', weather_call_params)
+def get_weather(city_name):
+    """Get the 5-day forecast using OpenWeather API (see ``weather.parse_forecast``)"""
+    params = weather_params(city_name)
+    if not params['appid']:
+        print("Warning: OPENWEATHER_API_KEY not found in environment variables")
+        return None
+
+    try:
+        response = get_client('openweather').get(OPENWEATHER_FORECAST_URL, params=params)
+        print(f"Weather API response status: {response.status_code}")
+
+        if response.status_code == 200:
+            return parse_weather(response.json())
+        else:
+            print(f"Weather API error: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"Error fetching weather data: {e}")
+    return None
+
+
+@cached_response('exchange_rates', rates_call_params)
+@single_flight('exchange_rates', rates_call_params)
+def get_exchange_rates(base):
+    """Exchange-rate table for ``base`` from the open ExchangeRate-API"""
+    try:
+        response = get_client('exchange_rates').get(EXCHANGE_RATES_URL.format(base=base.upper()))
+        print(f"Exchange rates response: {response.status_code}")
+
+        if response.status_code == 200:
+            return parse_exchange_rates(response.json())
+        else:
+            print(f"Exchange rates error: {response.text}")
+    except Exception as e:
+        print(f"Error fetching exchange rates: {e}")
+    return None
@@ -0,0 +1,229 @@
+"""Tiered response cache for the travel data providers.
+
+Each provider's responses live for their own time (``PROVIDER_CACHE_TTLS``):
+attractions barely change, forecasts update every few hours and fares only
+hold for minutes. After that a response is stale, but it is still served
+for up to ``PROVIDER_CACHE_STALE`` more seconds while one background call
+replaces it, so searches only wait on the provider when nothing usable is
+cached.
+
+Lookups try a size-bounded LRU in this process first, then the shared
+cache. Empty responses, which is what the providers return when a call
+fails, are never cached.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import cache_hit_rate, get_counters, incr, record_cache_lookup, reset
+from .singleflight import FLIGHTS, dedup_stats, flight_key, reset_stats
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+class LocalLRU:
+    """Thread-safe mapping that drops its least recently used entry when full"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalLRU(settings.PROVIDER_CACHE_LOCAL_ENTRIES)
+
+# Stale entries being refreshed by this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='response-refresh')
+# Keeps refresh tasks alive until they finish
+_refresh_tasks = set()
+
+
+def response_cache_key(key):
+    return f"response_{key}"
+
+
+def lifetimes(name):
+    """``(fresh seconds, extra stale seconds)`` for provider ``name``"""
+    return settings.PROVIDER_CACHE_TTLS[name], settings.PROVIDER_CACHE_STALE.get(name, 0)
+
+
+def lookup(name, key):
+    """Return ``(response, 'fresh' | 'stale' | None)``, counting the lookup"""
+    now = time.time()
+    # Entries are (response, fresh until, stale until)
+    entry = local_cache.get(key)
+    if entry is None or entry[1] <= now:
+        # Another worker may have refreshed it
+        try:
+            shared = cache.get(response_cache_key(key))
+        except Exception as e:
+            print(f"Response cache unavailable for {name}: {e}")
+            shared = None
+        if shared is not None:
+            entry = shared
+            local_cache.set(key, entry)
+
+    state = None
+    if entry is not None and entry[2] > now:
+        state = FRESH if entry[1] > now else STALE
+    record_cache_lookup(name, hit=state is not None)
+    if state == STALE:
+        incr(f"{name}_stale")
+    return (entry[0] if state else None), state
+
+
+def store(name, key, response):
+    if not response:
+        return
+    fresh, stale = lifetimes(name)
+    now = time.time()
+    entry = (response, now + fresh, now + fresh + stale)
+    local_cache.set(key, entry)
+    try:
+        cache.set(response_cache_key(key), entry, fresh + stale)
+    except Exception as e:
+        print(f"Could not cache {name} response: {e}")
+
+
+def claim_refresh(name, key):
+    """True if this caller should refresh the stale entry; one per entry across workers"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+    try:
+        claimed = cache.add(f"response_refresh_{key}", True, settings.SINGLEFLIGHT_WAIT)
+    except Exception:
+        claimed = True
+    if not claimed:
+        end_refresh(key)
+    return claimed
+
+
+def end_refresh(key):
+    with _refreshing_lock:
+        _refreshing.discard(key)
+
+
+def refresh(name, key, call):
+    try:
+        store(name, key, call())
+    except Exception as e:
+        print(f"Could not refresh {name} response: {e}")
+    finally:
+        end_refresh(key)
+
+
+async def arefresh(name, key, call):
+    try:
+        response = await call()
+        await sync_to_async(store, thread_sensitive=False)(name, key, response)
+    except Exception as e:
+        print(f"Could not refresh {name} response: {e}")
+    finally:
+        end_refresh(key)
+
+
+def cached_response(name, params):
+    """Cache the decorated provider function's responses under ``name``'s lifetimes.
+
+    ``params`` takes the function's arguments and returns the normalized
+    values that identify the response, as for ``single_flight``.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            alookup = sync_to_async(lookup, thread_sensitive=False)
+            aclaim_refresh = sync_to_async(claim_refresh, thread_sensitive=False)
+            astore = sync_to_async(store, thread_sensitive=False)
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = flight_key(name, params(*args, **kwargs))
+                response, state = await alookup(name, key)
+                if state == STALE and await aclaim_refresh(name, key):
+                    task = asyncio.get_running_loop().create_task(arefresh(name, key, lambda: func(*args, **kwargs)))
+                    _refresh_tasks.add(task)
+                    task.add_done_callback(_refresh_tasks.discard)
+                if state:
+                    return response
+                response = await func(*args, **kwargs)
+                await astore(name, key, response)
+                return response
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = flight_key(name, params(*args, **kwargs))
+            response, state = lookup(name, key)
+            if state == STALE and claim_refresh(name, key):
+                _refresh_pool.submit(refresh, name, key, lambda: func(*args, **kwargs))
+            if state:
+                return response
+            response = func(*args, **kwargs)
+            store(name, key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_report():
+    """One row per cached response type: lifetimes, hit rate and how many calls were coalesced"""
+    rows = []
+    for name in ['itinerary', *settings.PROVIDER_CACHE_TTLS]:
+        hits, misses, hit_rate = cache_hit_rate(name)
+        if name == 'itinerary':
+            fresh, stale = settings.ITINERARY_CACHE_TIMEOUT, 0
+        else:
+            fresh, stale = lifetimes(name)
+        upstream, shared, dedup_ratio = dedup_stats(name) if name in FLIGHTS else (0, 0, None)
+        rows.append({
+            'name': name,
+            'ttl': fresh,
+            'stale_ttl': stale,
+            'hits': hits,
+            'stale_hits': get_counters(f"{name}_stale")[f"{name}_stale"],
+            'misses': misses,
+            'hit_rate': hit_rate,
+            'upstream_calls': upstream,
+            'shared_calls': shared,
+            'dedup_ratio': dedup_ratio,
+        })
+    return rows
+
+
+def reset_report():
+    names = ['itinerary', *settings.PROVIDER_CACHE_TTLS]
+    reset(*[f"{name}_{kind}" for name in names for kind in ('hits', 'misses', 'stale')])
+    reset_stats(*FLIGHTS)
@@ -0,0 +1,178 @@
+"""Saved trips and their stored itineraries.
+
+An itinerary is stored once per distinct text, keyed by a hash of the
+text, and parsed into day, time block and item rows at that point.
+Opening, exporting or sharing a saved trip reads those rows back and
+never asks the model for the itinerary again.
+"""
+import hashlib
+import secrets
+from datetime import date
+
+from django.db import IntegrityError, transaction
+
+from .exports import parse_date, pdf_export
+from .flight_offers import FlightOffer, offer_data
+from .itinerary import session_itinerary
+from .itinerary_parser import ItineraryDay, ItineraryItem, ParsedItinerary, TimeBlock, parse_itinerary
+from .models import SavedTrip, StoredItinerary, StoredItineraryDay, StoredItineraryItem, StoredTimeBlock
+
+
+def itinerary_hash(text):
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+
+def store_itinerary(text):
+    """Return the ``StoredItinerary`` for ``text``, storing it on first sight"""
+    content_hash = itinerary_hash(text)
+    stored = StoredItinerary.objects.filter(content_hash=content_hash).first()
+    if stored:
+        return stored
+
+    parsed = parse_itinerary(text)
+    try:
+        with transaction.atomic():
+            stored = StoredItinerary.objects.create(
+                content_hash=content_hash, text=text.strip(), intro='\n'.join(parsed.intro),
+            )
+            # One insert per level rather than one per row
+            day_rows = StoredItineraryDay.objects.bulk_create([
+                StoredItineraryDay(itinerary=stored, position=position, day_num=day.day_num, title=day.title)
+                for position, day in enumerate(parsed.days)
+            ])
+            blocks = [
+                (day_row, position, block)
+                for day_row, day in zip(day_rows, parsed.days)
+                for position, block in enumerate(day.times)
+            ]
+            block_rows = StoredTimeBlock.objects.bulk_create([
+                StoredTimeBlock(day=day_row, position=position, time=block.time)
+                for day_row, position, block in blocks
+            ])
+            StoredItineraryItem.objects.bulk_create([
+                StoredItineraryItem(
+                    block=block_row, position=position, type=item.type, content=item.content, number=item.number,
+                )
+                for block_row, (_, _, block) in zip(block_rows, blocks)
+                for position, item in enumerate(block.items)
+            ])
+    except IntegrityError:
+        # Stored by a concurrent request in the meantime
+        return StoredItinerary.objects.get(content_hash=content_hash)
+    return stored
+
+
+def trips_with_itineraries():
+    """Saved trips with their itinerary rows prefetched, three queries however many trips"""
+    return SavedTrip.objects.select_related('stored_itinerary').prefetch_related('stored_itinerary__days__times__items')
+
+
+def load_itinerary(stored):
+    """Rebuild the ``ParsedItinerary`` from its rows (prefetched by ``trips_with_itineraries``)"""
+    days = []
+    for day_row in stored.days.all():
+        day = ItineraryDay(day_row.day_num, day_row.title)
+        for block_row in day_row.times.all():
+            day.times.append(TimeBlock(block_row.time, [
+                ItineraryItem(item.type, item.content, item.number) for item in block_row.items.all()
+            ]))
+        days.append(day)
+    return ParsedItinerary(stored.intro.split('\n') if stored.intro else [], days)
+
+
+def session_date(value):
+    parsed = parse_date(value)
+    return parsed.date() if parsed else None
+
+
+def save_trip(user, session):
+    """Save the session's last trip search for ``user``; returns the ``SavedTrip``"""
+    itinerary = session_itinerary(session)
+    return SavedTrip.objects.create(
+        user=user,
+        source_city=session.get('source', ''),
+        destination_city=session['destination'],
+        departure_date=session_date(session.get('departure_date')) or date.today(),
+        return_date=session_date(session.get('return_date')),
+        estimated_cost=session.get('estimated_cost'),
+        stored_itinerary=store_itinerary(itinerary) if itinerary else None,
+        outbound_flight=session.get('outbound_flight'),
+        return_flight=session.get('return_flight'),
+    )
+
+
+def share_trip(trip):
+    """Give ``trip`` a share token if it has none; returns the token"""
+    if not trip.share_token:
+        trip.share_token = secrets.token_urlsafe(16)
+        trip.save(update_fields=['share_token'])
+    return trip.share_token
+
+
+def trip_num_days(trip, parsed_itinerary=None):
+    if trip.return_date:
+        return max((trip.return_date - trip.departure_date).days + 1, 1)
+    if parsed_itinerary and parsed_itinerary.days:
+        return len(parsed_itinerary.days)
+    return 3
+
+
+def saved_offer(data):
+    return FlightOffer.from_dict(data) if data else None
+
+
+def saved_trip_context(trip):
+    """Context for the results page showing ``trip``, read from the database only"""
+    parsed_itinerary = load_itinerary(trip.stored_itinerary) if trip.stored_itinerary else None
+    outbound_flight, return_flight = saved_offer(trip.outbound_flight), saved_offer(trip.return_flight)
+    return {
+        'saved_trip': trip,
+        'source': trip.source_city,
+        'destination': trip.destination_city,
+        'departure_date': trip.departure_date.isoformat(),
+        'return_date': trip.return_date.isoformat() if trip.return_date else '',
+        'num_days': trip_num_days(trip, parsed_itinerary),
+        'estimated_cost': trip.estimated_cost,
+        'itinerary': trip.stored_itinerary.text if trip.stored_itinerary else None,
+        'parsed_itinerary': parsed_itinerary,
+        'flights': [outbound_flight] if outbound_flight else [],
+        'return_flights': [return_flight] if return_flight else [],
+        'cheapest_flight': outbound_flight,
+        'cheapest_return_flight': return_flight,
+    }
+
+
+def saved_trip_session_data(context):
+    """Session values for a reopened trip, as ``trip_session_data`` stores for a search"""
+    return {
+        'itinerary': context['itinerary'] or '',
+        'itinerary_cache_key': None,
+        'itinerary_request': None,
+        'source': context['source'],
+        'destination': context['destination'],
+        'num_days': context['num_days'],
+        'itinerary_num_days': context['num_days'],
+        'departure_date': context['departure_date'],
+        'return_date': context['return_date'],
+        'estimated_cost': float(context['estimated_cost']) if context['estimated_cost'] is not None else None,
+        'outbound_flight': offer_data(context['cheapest_flight']),
+        'return_flight': offer_data(context['cheapest_return_flight']),
+        # The cost estimate and forecast only follow a fresh search
+        'trip_costs': None,
+        'trip_weather': None,
+    }
+
+
+def trip_pdf_export(trip):
+    """``(key, context, filename)`` for a saved trip's itinerary PDF, or None without one"""
+    if not trip.stored_itinerary:
+        return None
+    parsed_itinerary = load_itinerary(trip.stored_itinerary)
+    num_days = trip_num_days(trip, parsed_itinerary)
+    key, context, filename = pdf_export(
+        trip.stored_itinerary.text, trip.destination_city, num_days,
+        trip.departure_date.isoformat(), trip.return_date.isoformat() if trip.return_date else '',
+        parsed_itinerary=parsed_itinerary,
+    )
+    # Trip ids keep names unique when several trips go to the same place
+    return key, context, f"{trip.pk}_{filename}"
@@ -0,0 +1,375 @@
+"""Request coalescing ("single-flight") for identical provider calls.
+
+When a destination trends, many requests miss the cache for the same
+places, weather, flights and itinerary at once. Only the first of them
+(the leader) calls the provider; the others wait for its result instead
+of repeating the call:
+
+* within a process, followers wait on the leader's in-flight call;
+* across workers, the leader claims a short lock in the shared cache and
+  publishes its result there, and other workers' leaders poll for it.
+
+The cache lock is a best effort: with the Redis cache ``add()`` is atomic,
+with the file cache two workers can occasionally both lead. A follower
+that waits longer than ``SINGLEFLIGHT_WAIT``, or whose leader fails
+without a result, makes the call itself, so coalescing never costs a
+request its answer. Inside a trip search stage the wait also ends at the
+stage's deadline; the pipeline has given up on the stage by then, so the
+follower raises ``TimeoutError`` instead of calling the provider.
+
+Each call is counted as ``upstream`` (it called the provider),
+``shared_local`` or ``shared_remote``; ``cache_stats`` reports the ratio.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import secrets
+import threading
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import get_counters, incr, reset
+from .pipeline import stage_expired, time_left
+
+KEY_PREFIX = 'singleflight_'
+POLL_INTERVAL = 0.05
+OUTCOMES = ('upstream', 'shared_local', 'shared_remote')
+# Names of the coalesced calls, for reporting
+FLIGHTS = ['google_places', 'weather', 'flights', 'hotel_list', 'hotel_offers', 'exchange_rates', 'itinerary']
+
+_MISSING = object()
+
+
+def flight_key(name, params):
+    """Key for a call to ``name``; ``params`` must already be normalized"""
+    payload = json.dumps(params, default=str, sort_keys=True, ensure_ascii=False)
+    return f"{name}_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}"
+
+
+def lock_key(key):
+    return f"{KEY_PREFIX}{key}"
+
+
+def result_key(key, token):
+    return f"{KEY_PREFIX}{key}_{token}"
+
+
+def follower_wait():
+    """Seconds a follower waits for the call it joined"""
+    return time_left(settings.SINGLEFLIGHT_WAIT)
+
+
+def _check_stage(key):
+    """Raise instead of calling the provider for a stage that was given up on while we waited"""
+    if stage_expired():
+        raise TimeoutError(f"Stage deadline passed while waiting for {key}")
+
+
+def count(name, outcome):
+    try:
+        incr(f"singleflight_{name}_{outcome}")
+    except Exception as e:
+        print(f"Could not count single-flight {outcome} for {name}: {e}")
+
+
+def dedup_stats(name):
+    """Return ``(upstream calls, shared results, dedup ratio or None)`` for ``name``"""
+    counters = get_counters(*[f"singleflight_{name}_{outcome}" for outcome in OUTCOMES])
+    upstream = counters[f"singleflight_{name}_upstream"]
+    shared = counters[f"singleflight_{name}_shared_local"] + counters[f"singleflight_{name}_shared_remote"]
+    total = upstream + shared
+    return upstream, shared, (shared / total if total else None)
+
+
+def reset_stats(*names):
+    reset(*[f"singleflight_{name}_{outcome}" for name in names for outcome in OUTCOMES])
+
+
+class _Flight:
+    """A call in progress in this process, awaited by its followers"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = _MISSING
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _join(key):
+    """Return ``(flight, is_leader)`` for ``key``"""
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = _Flight()
+        return flight, True
+
+
+def _land(key, flight):
+    with _flights_lock:
+        _flights.pop(key, None)
+    flight.done.set()
+
+
+# Cross-worker coordination. Cache errors never fail the call: without the
+# cache every worker simply leads its own flights.
+
+def _claim(key):
+    """Claim the cross-worker lock; returns ``(token, is_leader)``"""
+    token = secrets.token_hex(8)
+    try:
+        if cache.add(lock_key(key), token, settings.SINGLEFLIGHT_WAIT):
+            return token, True
+        return cache.get(lock_key(key)), False
+    except Exception as e:
+        print(f"Single-flight lock unavailable for {key}: {e}")
+        return None, True
+
+
+def _publish(key, token, result):
+    try:
+        cache.set(result_key(key, token), (result,), settings.SINGLEFLIGHT_RESULT_TIMEOUT)
+    except Exception as e:
+        print(f"Could not share result for {key}: {e}")
+
+
+def _release(key, token):
+    try:
+        if cache.get(lock_key(key)) == token:
+            cache.delete(lock_key(key))
+    except Exception as e:
+        print(f"Could not release single-flight lock for {key}: {e}")
+
+
+def _await_remote(key, token):
+    """Wait for another worker's result; returns ``(result,)`` or ``_MISSING``"""
+    deadline = time.monotonic() + follower_wait()
+    try:
+        while token and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            shared = cache.get(result_key(key, token), _MISSING)
+            if shared is not _MISSING:
+                return shared
+            if cache.get(lock_key(key)) != token:
+                # Released just now (look once more), expired or failed
+                return cache.get(result_key(key, token), _MISSING)
+    except Exception as e:
+        print(f"Stopped waiting for {key}: {e}")
+    return _MISSING
+
+
+def _call_shared(name, key, func):
+    """Call ``func`` unless another worker is already making the same call"""
+    token, leader = _claim(key)
+    if not leader:
+        shared = _await_remote(key, token)
+        if shared is not _MISSING:
+            count(name, 'shared_remote')
+            return shared[0]
+        _check_stage(key)
+        count(name, 'upstream')
+        return func()
+
+    count(name, 'upstream')
+    try:
+        result = func()
+        if token:
+            _publish(key, token, result)
+        return result
+    finally:
+        if token:
+            _release(key, token)
+
+
+def do(name, key, func):
+    """Call ``func()`` once for all concurrent callers with the same ``key``"""
+    flight, leader = _join(key)
+    if not leader:
+        if flight.done.wait(follower_wait()) and flight.result is not _MISSING:
+            count(name, 'shared_local')
+            return flight.result
+        if flight.error is not None and flight.done.is_set():
+            count(name, 'shared_local')
+            raise flight.error
+        # The leader is slow or went away; don't hold this request on it
+        _check_stage(key)
+        count(name, 'upstream')
+        return func()
+
+    try:
+        flight.result = _call_shared(name, key, func)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        _land(key, flight)
+
+
+def stream(name, key, func, combine=''.join):
+    """Like ``do()`` for a call that yields chunks.
+
+    The leader yields the chunks as they arrive; followers yield the leader's
+    ``combine``d chunks in one piece once it finishes. If the leader's
+    stream stops early, e.g. because its client went away, followers stream
+    the call themselves.
+    """
+    flight, leader = _join(key)
+    if not leader:
+        if flight.done.wait(follower_wait()) and flight.result is not _MISSING:
+            count(name, 'shared_local')
+            yield flight.result
+            return
+        _check_stage(key)
+        count(name, 'upstream')
+        yield from func()
+        return
+
+    try:
+        token, remote_leader = _claim(key)
+        if not remote_leader:
+            shared = _await_remote(key, token)
+            if shared is not _MISSING:
+                count(name, 'shared_remote')
+                flight.result = shared[0]
+                yield flight.result
+                return
+            _check_stage(key)
+            token = None
+
+        count(name, 'upstream')
+        parts = []
+        try:
+            for chunk in func():
+                parts.append(chunk)
+                yield chunk
+            flight.result = combine(parts)
+            if token:
+                _publish(key, token, flight.result)
+        finally:
+            if token:
+                _release(key, token)
+    finally:
+        _land(key, flight)
+
+
+# Coroutine callers share futures on their own event loop
+
+_async_flights = weakref.WeakKeyDictionary()
+_acount = sync_to_async(count, thread_sensitive=False)
+
+
+async def _aclaim(key):
+    token = secrets.token_hex(8)
+    try:
+        if await cache.aadd(lock_key(key), token, settings.SINGLEFLIGHT_WAIT):
+            return token, True
+        return await cache.aget(lock_key(key)), False
+    except Exception as e:
+        print(f"Single-flight lock unavailable for {key}: {e}")
+        return None, True
+
+
+async def _aawait_remote(key, token):
+    deadline = time.monotonic() + follower_wait()
+    try:
+        while token and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            shared = await cache.aget(result_key(key, token), _MISSING)
+            if shared is not _MISSING:
+                return shared
+            if await cache.aget(lock_key(key)) != token:
+                return await cache.aget(result_key(key, token), _MISSING)
+    except Exception as e:
+        print(f"Stopped waiting for {key}: {e}")
+    return _MISSING
+
+
+async def _acall_shared(name, key, func):
+    token, leader = await _aclaim(key)
+    if not leader:
+        shared = await _aawait_remote(key, token)
+        if shared is not _MISSING:
+            await _acount(name, 'shared_remote')
+            return shared[0]
+        _check_stage(key)
+        await _acount(name, 'upstream')
+        return await func()
+
+    await _acount(name, 'upstream')
+    try:
+        result = await func()
+        if token:
+            await sync_to_async(_publish, thread_sensitive=False)(key, token, result)
+        return result
+    finally:
+        if token:
+            await sync_to_async(_release, thread_sensitive=False)(key, token)
+
+
+async def do_async(name, key, func):
+    """Coroutine version of ``do()``; ``func`` is a coroutine function"""
+    loop = asyncio.get_running_loop()
+    flights = _async_flights.setdefault(loop, {})
+    future = flights.get(key)
+    if future is not None:
+        try:
+            shared = await asyncio.wait_for(asyncio.shield(future), follower_wait())
+        except asyncio.TimeoutError:
+            shared = None
+        if shared is not None:
+            await _acount(name, 'shared_local')
+            return shared[0]
+        # The leader is slow or was cancelled; make the call ourselves
+        _check_stage(key)
+        await _acount(name, 'upstream')
+        return await func()
+
+    # Resolves to ``(result,)``, or None if the leader was cancelled
+    future = flights[key] = loop.create_future()
+    try:
+        result = await _acall_shared(name, key, func)
+        future.set_result((result,))
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Followers re-raise it; nobody else needs to
+        raise
+    finally:
+        if not future.done():
+            future.set_result(None)
+        flights.pop(key, None)
+
+
+def single_flight(name, params):
+    """Coalesce concurrent calls of the decorated provider function.
+
+    ``params`` takes the function's arguments and returns the normalized
+    values that identify the call (e.g. leaving out the access token).
+    Works for plain and coroutine functions.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = flight_key(name, params(*args, **kwargs))
+                return await do_async(name, key, lambda: func(*args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = flight_key(name, params(*args, **kwargs))
+            return do(name, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,343 @@
+"""Offline stand-ins for the external providers.
+
+``install()`` answers Amadeus, Google Places, OpenWeather and exchange-rate
+requests from the recorded responses in data/provider_fixtures and swaps in
+fake OpenCage and Gemini clients. Every call waits the configured latency
+and fails at the configured error rate. That lets the whole search be run
+and benchmarked without network access. Set PROVIDER_STUBS=true to run the dev server this way.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache, partial
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qsl, urlsplit
+
+import google.generativeai as genai
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from . import clients, geocoding
+from .airports import get_airport_index
+from .hotels import stay_nights
+from .weather import SLOT_HOURS, forecast_run
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'data' / 'provider_fixtures'
+
+# Providers skip their call entirely without a key, so stub mode fills them in
+STUB_API_KEYS = ['GOOGLE_PLACES_API_KEY', 'OPENWEATHER_API_KEY', 'GEMINI_API_KEY']
+
+HOST_PROVIDERS = {
+    'test.api.amadeus.com': 'amadeus',
+    'maps.googleapis.com': 'google_places',
+    'api.openweathermap.org': 'openweather',
+    'open.er-api.com': 'exchange_rates',
+}
+
+
+class StubConfig:
+    """Latency (seconds) and error rate (0-1) of the stand-in providers.
+
+    Both take one number for every provider, or a dict keyed by provider
+    ('amadeus', 'google_places', 'openweather', 'exchange_rates', 'opencage',
+    'gemini') with an optional 'default'. ``jitter`` varies each delay by up to that
+    fraction. ``calls`` and ``failures`` count calls per provider.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.calls = Counter()
+        self.failures = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _option(self, value, provider):
+        if isinstance(value, dict):
+            return value.get(provider, value.get('default', 0.0))
+        return value
+
+    def begin_call(self, provider):
+        """Count a call; return ``(delay, fail)`` for it"""
+        latency = self._option(self.latency, provider)
+        with self._lock:
+            delay = latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self._option(self.error_rate, provider)
+            self.calls[provider] += 1
+            if fail:
+                self.failures[provider] += 1
+        return max(delay, 0.0), fail
+
+
+@lru_cache(maxsize=None)
+def _fixture_text(name):
+    return (FIXTURES_DIR / name).read_text(encoding='utf-8')
+
+
+def load_fixture(name, **values):
+    """Load a recorded response, filling in its ``$placeholders``"""
+    text = _fixture_text(name)
+    if name.endswith('.json'):
+        # Substitute JSON-escaped values so names with quotes stay valid
+        values = {key: json.dumps(str(value))[1:-1] for key, value in values.items()}
+        return json.loads(Template(text).safe_substitute(values))
+    return Template(text).safe_substitute(values)
+
+
+def place_code(name):
+    """IATA-looking code for a place: the real one if the airport index knows it"""
+    return get_airport_index().find_code(name) or (re.sub(r'[^A-Za-z]', '', name or '')[:3].upper() or 'XXX')
+
+
+def place_coords(name):
+    """Coordinates for a place: real ones from the airport index, else stable made-up ones"""
+    airport = get_airport_index().find(name)
+    if airport and airport.lat is not None:
+        return airport.lat, airport.lng
+    digest = int(hashlib.sha256((name or '').lower().encode('utf-8')).hexdigest(), 16)
+    return round((digest % 12000) / 100 - 60, 4), round((digest // 12000 % 36000) / 100 - 180, 4)
+
+
+def hotel_offer(hotel_id, checkin_date, checkout_date):
+    """The recorded hotel offer for one hotel, with a nightly rate made up from its ID"""
+    digest = int(hashlib.sha256(hotel_id.encode('utf-8')).hexdigest(), 16)
+    nightly = 2500 + digest % 90 * 100
+    return load_fixture(
+        'amadeus_hotel_offer.json', hotelId=hotel_id, cityCode=hotel_id[2:5], offerId=f"{hotel_id}{checkin_date}",
+        checkIn=checkin_date, checkOut=checkout_date,
+        category=['STANDARD_ROOM', 'SUPERIOR_ROOM', 'DELUXE_ROOM'][digest % 3],
+        total=f"{nightly * stay_nights(checkin_date, checkout_date)}.00",
+    )
+
+
+def weather_forecast(city, count):
+    """The recorded day of forecast slots, repeated for ``count`` slots from the current run"""
+    forecast = load_fixture('openweather_forecast.json', city=city, date='')
+    recorded = forecast['list']
+    start = int(datetime.strptime(forecast_run(), '%Y-%m-%dT%H').replace(tzinfo=timezone.utc).timestamp())
+    slots = []
+    for number in range(count):
+        slot = dict(recorded[number % len(recorded)])
+        slot['dt'] = start + number * SLOT_HOURS * 60 * 60
+        slot['dt_txt'] = datetime.fromtimestamp(slot['dt'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        slots.append(slot)
+    return {**forecast, 'cnt': count, 'list': slots}
+
+
+def http_fixture(method, url):
+    """Return ``(status, payload)`` for a provider request"""
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    path = parts.path
+
+    if path.endswith('/security/oauth2/token'):
+        return 200, load_fixture('amadeus_token.json')
+    if path.endswith('/locations/hotels/by-city'):
+        city_code = params.get('cityCode', '')
+        return 200, load_fixture('amadeus_hotels_by_city.json', cityCode=city_code, CITY=city_code)
+    if path.endswith('/shopping/hotel-offers'):
+        hotel_ids = [hotel_id for hotel_id in params.get('hotelIds', '').split(',') if hotel_id]
+        checkin_date, checkout_date = params.get('checkInDate', ''), params.get('checkOutDate', '')
+        return 200, {'data': [hotel_offer(hotel_id, checkin_date, checkout_date) for hotel_id in hotel_ids]}
+    if path.endswith('/reference-data/locations'):
+        keyword = params.get('keyword', '')
+        return 200, load_fixture('amadeus_locations.json', keyword=keyword.upper(), code=place_code(keyword))
+    if path.endswith('/shopping/flight-offers'):
+        return 200, load_fixture(
+            'amadeus_flight_offers.json',
+            origin=params.get('originLocationCode', ''),
+            destination=params.get('destinationLocationCode', ''),
+            date=params.get('departureDate', ''),
+        )
+    if path.endswith('/place/textsearch/json'):
+        city = params.get('query', '').replace('top attractions in ', '')
+        return 200, load_fixture('google_places_textsearch.json', city=city)
+    if path.endswith('/data/2.5/forecast'):
+        return 200, weather_forecast(params.get('q', ''), int(params.get('cnt', 40)))
+    if path.startswith('/v6/latest/'):
+        return 200, load_fixture('exchange_rates.json', base=path.rsplit('/', 1)[-1])
+    return 404, {'errors': [{'status': 404, 'title': f'No stub for {method} {path}'}]}
+
+
+def stub_response(config, method, url):
+    """Return ``(delay, status, payload)`` for a provider request"""
+    delay, fail = config.begin_call(HOST_PROVIDERS.get(urlsplit(url).netloc, 'other'))
+    if fail:
+        return delay, 503, {'errors': [{'status': 503, 'title': 'Stubbed provider outage'}]}
+    return (delay, *http_fixture(method, url))
+
+
+class StubAdapter(BaseAdapter):
+    """``requests`` transport adapter that answers from the fixtures"""
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+
+    def send(self, request, **kwargs):
+        delay, status, payload = stub_response(self.config, request.method, request.url)
+        time.sleep(delay)
+        response = requests.Response()
+        response.status_code = status
+        response.reason = 'OK' if status == 200 else 'Stubbed'
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response.encoding = 'utf-8'
+        response._content = json.dumps(payload).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """``httpx`` transport that answers from the fixtures"""
+
+    def __init__(self, config):
+        self.config = config
+
+    async def handle_async_request(self, request):
+        delay, status, payload = stub_response(self.config, request.method, str(request.url))
+        await asyncio.sleep(delay)
+        return httpx.Response(status, json=payload, request=request)
+
+
+class StubGeocoder:
+    """Stands in for ``OpenCageGeocode``"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def geocode(self, query, **kwargs):
+        delay, fail = self.config.begin_call('opencage')
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("Stubbed OpenCage outage")
+        results = load_fixture('opencage_geocode.json', city=query)
+        results[0]['geometry']['lat'], results[0]['geometry']['lng'] = place_coords(query)
+        return results
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def itinerary_text(num_days):
+    """The recorded itinerary, repeated or cut to ``num_days`` days"""
+    days = load_fixture('gemini_itinerary.txt').strip().split('\n\n')
+    blocks = []
+    for day in range(num_days):
+        blocks.append(re.sub(r'^Day \d+', f'Day {day + 1}', days[day % len(days)]))
+    return '\n\n'.join(blocks) + '\n'
+
+
+class StubGenerativeModel:
+    """Stands in for ``genai.GenerativeModel``.
+
+    Itinerary prompts get the recorded itinerary sized to the requested
+    number of days; anything else gets the recorded chat reply.
+    """
+
+    def __init__(self, model_name=None, config=None, **kwargs):
+        self.model_name = model_name
+        self.config = config
+
+    def _text(self, contents):
+        match = re.match(r'Create a (\d+)-day travel itinerary', str(contents))
+        if match:
+            return itinerary_text(int(match.group(1)))
+        return load_fixture('gemini_chat.txt')
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        delay, fail = self.config.begin_call('gemini')
+        if fail:
+            time.sleep(delay)
+            raise RuntimeError("Stubbed Gemini outage")
+        text = self._text(contents)
+        if stream:
+            return self._stream(text, delay)
+        time.sleep(delay)
+        return StubResponse(text)
+
+    def _stream(self, text, delay):
+        chunks = text.splitlines(keepends=True)
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield StubResponse(chunk)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        delay, fail = self.config.begin_call('gemini')
+        if fail:
+            await asyncio.sleep(delay)
+            raise RuntimeError("Stubbed Gemini outage")
+        text = self._text(contents)
+        if stream:
+            return self._astream(text, delay)
+        await asyncio.sleep(delay)
+        return StubResponse(text)
+
+    async def _astream(self, text, delay):
+        chunks = text.splitlines(keepends=True)
+        for chunk in chunks:
+            await asyncio.sleep(delay / len(chunks))
+            yield StubResponse(chunk)
+
+
+_originals = []
+_stubbed_keys = []
+
+
+def install(config=None, **options):
+    """Route every provider call to the stand-ins; returns the ``StubConfig``"""
+    uninstall()
+    config = config or StubConfig(**options)
+    replacements = [
+        (clients.ProviderClient, 'make_adapter', lambda client: StubAdapter(config)),
+        (clients.AsyncProviderClient, 'make_transport', lambda client: StubTransport(config)),
+        (geocoding, 'geocoder', StubGeocoder(config)),
+        (genai, 'GenerativeModel', partial(StubGenerativeModel, config=config)),
+    ]
+    for target, name, replacement in replacements:
+        _originals.append((target, name, getattr(target, name)))
+        setattr(target, name, replacement)
+    for key in STUB_API_KEYS:
+        if not os.environ.get(key):
+            os.environ[key] = 'stub-key'
+            _stubbed_keys.append(key)
+    # Pooled sessions were built with the real adapters
+    clients.reset_clients()
+    return config
+
+
+def uninstall():
+    """Put the real providers back"""
+    while _originals:
+        target, name, original = _originals.pop()
+        setattr(target, name, original)
+    while _stubbed_keys:
+        os.environ.pop(_stubbed_keys.pop(), None)
+    clients.reset_clients()
+
+
+@contextmanager
+def offline_providers(config=None, **options):
+    """Context manager form of ``install()``/``uninstall()``"""
+    config = install(config, **options)
+    try:
+        yield config
+    finally:
+        uninstall()
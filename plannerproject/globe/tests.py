@@ -1,3 +1,1023 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import amadeus, exports, metrics, pdf_jobs, providers, response_cache, singleflight
+from .airports import AirportIndex
+from .benchmarks import BenchURLConf
+from .clients import AsyncProviderClient, CircuitBreaker, CircuitOpenError, ProviderClient
+from .flight_offers import FlightOffer, OfferTable, duration_minutes, parse_offers
+from .hotels import hotel_id_chunks, merge_offers, nearest_hotels, stay_nights
+from .itinerary import itinerary_cache_key
+from .itinerary_parser import ACTIVITY, TEXT, parse_itinerary
+from .models import DestinationSearchStat
+from .pipeline import PipelineError, Stage, run_stages, run_stages_async, select_stages
+from .response_cache import LocalLRU, local_cache
+from .stubs import offline_providers
+from .trip_search import SECTIONS
+from .weather import DayWeather, ForecastTable, add_day_weather, trip_weather
+
+SEARCH = {
+    'source_city': 'Delhi',
+    'destination_city': 'Mumbai',
+    'departure_date': '2030-11-01',
+    'return_date': '2030-11-04',
+}
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def sse_events(response, content=None):
+    """``[(event, data)]`` from a server-sent events response"""
+    events = []
+    content = b''.join(response.streaming_content) if content is None else content
+    for block in content.decode().split('\n\n'):
+        if block.strip():
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(CACHES=LOCMEM_CACHE, ITINERARY_STREAMING=True)
+class TripSearchTestCase(TestCase):
+    """Runs every provider call against the recorded fixtures in ``globe/stubs.py``"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.providers = self.enterContext(offline_providers())
+
+    def search(self, **changes):
+        response = self.client.post(reverse('home'), {**SEARCH, **changes})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class HomeSearchTests(TripSearchTestCase):
+    def test_search(self):
+        response = self.search()
+        self.assertEqual(response.context['num_days'], 4)
+        self.assertEqual(len(response.context['flights']), 5)
+        self.assertTrue(response.context['hotels'])
+        self.assertFalse(response.context['unavailable_sections'])
+        self.assertEqual(response.context['itinerary_stream_url'], reverse('itinerary_stream'))
+        self.assertEqual(self.client.session['destination'], 'Mumbai')
+
+    def test_search_is_cached(self):
+        self.search()
+        calls = dict(self.providers.calls)
+        self.search()
+        self.assertEqual(dict(self.providers.calls), calls)
+
+    @override_settings(ITINERARY_STREAMING=False)
+    def test_search_without_streaming(self):
+        response = self.search()
+        self.assertIsNone(response.context['itinerary_stream_url'])
+        self.assertEqual(len(response.context['parsed_itinerary'].days), 4)
+
+
+class ItineraryStreamTests(TripSearchTestCase):
+    def test_stream(self):
+        self.search()
+        response = self.client.get(reverse('itinerary_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(response)
+        self.assertEqual({event for event, _ in events[:-1]}, {'chunk'})
+        event, data = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(data['text'], ''.join(data['text'] for _, data in events[:-1]).strip())
+        self.assertEqual(parse_itinerary(data['text']).outline().count('Day '), 4)
+
+    def test_stream_without_search(self):
+        self.assertEqual(self.client.get(reverse('itinerary_stream')).status_code, 404)
+
+
+@override_settings(ROOT_URLCONF=BenchURLConf(True))
+class AsyncStreamTests(TripSearchTestCase):
+    async def stream(self, response):
+        self.assertTrue(response.is_async)
+        return sse_events(response, b''.join([part async for part in response.streaming_content]))
+
+    async def test_itinerary_stream(self):
+        await self.async_client.post(reverse('home'), SEARCH)
+        events = await self.stream(await self.async_client.get(reverse('itinerary_stream')))
+        self.assertEqual(events[-1][0], 'done')
+        self.assertGreater(len(events), 2)
+
+    async def test_chatbot_stream(self):
+        await self.async_client.post(reverse('home'), SEARCH)
+        response = await self.async_client.post(
+            reverse('chatbot_stream'), json.dumps({'message': 'When should I go?'}), content_type='application/json'
+        )
+        events = await self.stream(response)
+        event, data = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(data['text'], ''.join(data['text'] for _, data in events[:-1]).strip())
+
+
+class TripCostTests(TripSearchTestCase):
+    def today(self, days):
+        return (date.today() + timedelta(days=days)).isoformat()
+
+    def post_changes(self, changes):
+        return self.client.post(reverse('trip_cost'), json.dumps(changes), content_type='application/json')
+
+    def test_estimate(self):
+        self.search()
+        summary = self.client.get(reverse('trip_cost')).json()
+        self.assertEqual(summary['num_days'], 4)
+        self.assertEqual(summary['nights'], 3)
+        self.assertEqual(summary['total'], sum(summary['parts'].values()))
+
+    def test_change_hotel(self):
+        response = self.search()
+        hotel = response.context['hotels'][-1].hotel_id
+        summary = self.post_changes({'hotel': hotel}).json()
+        self.assertEqual(summary['hotel'], hotel)
+        self.assertEqual(summary['recomputed'], ['lodging'])
+        self.assertEqual(self.client.session['estimated_cost'], summary['total'])
+
+    def test_change_dates_reprices(self):
+        response = self.search()
+        hotel = response.context['hotels'][-1].hotel_id
+        self.post_changes({'hotel': hotel})
+        amadeus_calls = self.providers.calls['amadeus']
+        summary = self.post_changes({'return_date': '2030-11-06'}).json()
+        self.assertGreater(self.providers.calls['amadeus'], amadeus_calls)
+        self.assertEqual((summary['num_days'], summary['nights']), (6, 5))
+        self.assertEqual(set(summary['recomputed']), {'flights', 'lodging', 'daily_spend'})
+        self.assertEqual(summary['hotel'], hotel)
+        self.assertEqual(summary['stale_parts'], [])
+        self.assertTrue(summary['itinerary_stale'])
+        self.assertEqual(self.client.session['return_date'], '2030-11-06')
+        self.assertEqual(self.client.session['num_days'], 6)
+
+    def test_change_dates_moves_weather(self):
+        self.search(departure_date=self.today(1), return_date=self.today(3))
+        summary = self.post_changes({'departure_date': self.today(2), 'return_date': self.today(3)}).json()
+        self.assertTrue(summary['itinerary_stale'])
+        days = self.client.session['trip_weather']
+        self.assertEqual([day['day'] for day in days], [self.today(2), self.today(3)])
+
+    def test_needs_csrf_token(self):
+        self.search()
+        client = Client(enforce_csrf_checks=True)
+        client.cookies = self.client.cookies
+        response = client.post(reverse('trip_cost'), json.dumps({'hotel': 'x'}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_change_dates_when_search_fails(self):
+        self.search()
+        before = self.client.get(reverse('trip_cost')).json()
+        with mock.patch('globe.providers.search_hotels', side_effect=RuntimeError("Amadeus is down")):
+            summary = self.post_changes({'return_date': '2030-11-06'}).json()
+        self.assertEqual(summary['stale_parts'], ['lodging'])
+        self.assertEqual(summary['hotel'], before['hotel'])
+        # Searching the hotels again for the same dates brings the prices up to date
+        data = self.client.post(reverse('trip_section', args=['hotels'])).json()
+        self.assertEqual(data['cost']['stale_parts'], [])
+
+    def test_invalid_changes(self):
+        self.search()
+        self.assertEqual(self.post_changes({'return_date': '2030-10-01'}).status_code, 400)
+        self.assertEqual(self.post_changes(['return_date']).status_code, 400)
+
+    def test_without_search(self):
+        self.assertEqual(self.client.get(reverse('trip_cost')).status_code, 404)
+
+
+class TripSectionTests(TripSearchTestCase):
+    def section(self, section, **params):
+        return self.client.post(reverse('trip_section', args=[section]), params)
+
+    def test_change_return_date(self):
+        self.search()
+        calls = dict(self.providers.calls)
+        response = self.section('flights', return_date='2030-11-06')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['num_days'], 6)
+        self.assertIn('flight-card', data['html'])
+        self.assertEqual(data['cost']['return_date'], '2030-11-06')
+        self.assertEqual(self.client.session['return_date'], '2030-11-06')
+        self.assertEqual(self.client.session['num_days'], 6)
+        self.assertTrue(data['itinerary_stale'])
+        # Only the flight search runs again
+        new_calls = {name: count - calls.get(name, 0) for name, count in self.providers.calls.items()}
+        self.assertEqual({name for name, count in new_calls.items() if count}, {'amadeus'})
+
+    def test_update_itinerary(self):
+        self.search()
+        self.section('flights', return_date='2030-11-06')
+        data = self.section('itinerary').json()
+        self.assertEqual(parse_itinerary(self.client.session['itinerary']).outline().count('Day '), 6)
+        self.assertFalse(data['itinerary_stale'])
+        self.assertTrue(DestinationSearchStat.objects.filter(num_days=6).exists())
+
+    def test_get_only_reads(self):
+        self.search()
+        session = dict(self.client.session)
+        calls = self.providers.calls['gemini']
+        for section in SECTIONS:
+            response = self.client.get(reverse('trip_section', args=[section]), {'return_date': '2030-11-06'})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('cost', response.json())
+        # Nothing was cached for six days, so there is no itinerary to show
+        self.assertNotIn('Day 1', response.json()['html'])
+        self.assertEqual(dict(self.client.session), session)
+        self.assertEqual(self.providers.calls['gemini'], calls)
+        self.assertFalse(DestinationSearchStat.objects.filter(num_days=6).exists())
+
+    def test_other_trip_leaves_session(self):
+        self.search()
+        data = self.section('weather', destination='London').json()
+        self.assertNotIn('cost', data)
+        self.assertEqual(self.client.session['destination'], 'Mumbai')
+
+    def test_errors(self):
+        self.assertEqual(self.section('flights').status_code, 400)
+        self.search()
+        self.assertEqual(self.section('nope').status_code, 404)
+        self.assertEqual(self.section('flights', departure_date='soon').status_code, 400)
+        self.assertEqual(self.section('flights', return_date='2030-10-01').status_code, 400)
+
+
+class ItineraryParserTests(SimpleTestCase):
+    TEXT = (
+        "Here is your plan.\n"
+        "Day 1: Arrival\n"
+        "Get settled first.\n"
+        "Morning: Check in.\n"
+        "* Breakfast at a cafe\n"
+        "- Walk the old town\n"
+        "Evening:\n"
+        "  Dinner by the river  \n"
+        "\n"
+        "Day 2\n"
+        "Afternoon: Museum\n"
+    )
+
+    def test_parse(self):
+        itinerary = parse_itinerary(self.TEXT)
+        self.assertEqual(itinerary.intro, ["Here is your plan."])
+        self.assertEqual([(day.day_num, day.title) for day in itinerary.days], [(1, 'Arrival'), (2, '')])
+
+        untimed, morning, evening = itinerary.days[0].times
+        self.assertEqual(untimed.time, '')
+        self.assertEqual([(item.type, item.content) for item in untimed.items], [(TEXT, "Get settled first.")])
+        self.assertEqual(morning.icon, 'fa-sun')
+        self.assertEqual(
+            [(item.type, item.content, item.number) for item in morning.items],
+            [(TEXT, "Check in.", 0), (ACTIVITY, "Breakfast at a cafe", 1), (ACTIVITY, "Walk the old town", 2)],
+        )
+        self.assertEqual([item.content for item in evening.items], ["Dinner by the river"])
+        self.assertEqual(itinerary.outline(), "Day 1: Arrival\nDay 2")
+
+    def test_empty(self):
+        self.assertEqual(parse_itinerary('').days, [])
+        self.assertEqual(parse_itinerary(None).intro, [])
+
+
+class AirportIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = AirportIndex([
+            ('BER', 'Berlin', 'Germany', 52.52, 13.405, []),
+            ('BLR', 'Bangalore', 'India', 12.97, 77.59, ['Bengaluru']),
+            ('HYD', 'Hyderabad', 'India', 17.385, 78.487, []),
+            ('MLE', 'Male', 'Maldives', 4.17, 73.51, ['Maldives']),
+            ('SJC', 'San Jose', 'United States', 37.34, -121.89, []),
+            ('SFO', 'San Francisco', 'United States', 37.77, -122.42, []),
+        ])
+
+    def test_find(self):
+        self.assertEqual(self.index.find_code('Berlin'), 'BER')
+        self.assertEqual(self.index.find_code('  berlin, Germany'), 'BER')
+        self.assertEqual(self.index.find_code('bengaluru'), 'BLR')
+        self.assertEqual(self.index.find_code('hyd'), 'HYD')
+        self.assertEqual(self.index.find('Hyderabad').lat, 17.385)
+
+    def test_prefix(self):
+        self.assertEqual(self.index.find_code('bengal'), 'BLR')
+        self.assertEqual(self.index.find_code('san fran'), 'SFO')
+        self.assertIsNone(self.index.find_code('san'))
+
+    def test_fuzzy_only_for_typos(self):
+        self.assertEqual(self.index.find_code('Hyderbad'), 'HYD')
+        self.assertEqual(self.index.find_code('Berln'), 'BER')
+        self.assertIsNone(self.index.find_code('Bern'))
+        self.assertIsNone(self.index.find_code('Mali'))
+
+    def test_find_city(self):
+        self.assertEqual(self.index.find_city('Male').iata, 'MLE')
+        self.assertIsNone(self.index.find_city('Maldives'))
+        self.assertIsNone(self.index.find_city('MLE'))
+        self.assertIsNone(self.index.find_city('Berln'))
+
+    def test_remember(self):
+        self.assertIsNone(self.index.find('Bern'))
+        self.index.remember('Bern', 'BRN')
+        airport = self.index.find('Bern, Switzerland')
+        self.assertEqual((airport.iata, airport.lat), ('BRN', None))
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+            'TIMEOUT': 300,
+        }}))
+
+    def test_counters_survive_default_timeout(self):
+        metrics.incr('test_hits')
+        metrics.incr('test_hits', 2)
+        with mock.patch('time.time', return_value=time.time() + 301):
+            self.assertEqual(metrics.get_counters('test_hits'), {'test_hits': 3})
+            metrics.incr('test_hits')
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            self.assertEqual(metrics.get_counters('test_hits'), {'test_hits': 4})
+
+    def test_hit_rate(self):
+        metrics.record_cache_lookup('test', hit=True)
+        metrics.record_cache_lookup('test', hit=True)
+        metrics.record_cache_lookup('test', hit=False)
+        self.assertEqual(metrics.cache_hit_rate('test'), (2, 1, 2 / 3))
+
+
+def fail(message):
+    raise RuntimeError(message)
+
+
+def pipeline_stages(sleep):
+    """A small search: ``total`` needs ``a`` and ``b``; ``slow`` overruns its timeout"""
+    return [
+        Stage('a', lambda: 1),
+        Stage('b', lambda: fail("provider down"), default=0),
+        Stage('total', lambda a, b: a + b, requires=['a', 'b']),
+        Stage('slow', lambda: sleep(1), timeout=0.05, default='late'),
+        Stage('after_slow', lambda slow: f"got {slow}", requires=['slow']),
+    ]
+
+
+async def async_sleep(seconds):
+    await asyncio.sleep(seconds)
+
+
+class PipelineTests(SimpleTestCase):
+    def test_run_stages(self):
+        results, errors = run_stages(pipeline_stages(time.sleep))
+        self.assertEqual(results['total'], 1)
+        self.assertEqual(results['after_slow'], 'got late')
+        self.assertEqual(set(errors), {'b', 'slow'})
+        self.assertIn('timed out', errors['slow'])
+
+    def test_run_stages_async(self):
+        results, errors = asyncio.run(run_stages_async(pipeline_stages(async_sleep)))
+        self.assertEqual(results['total'], 1)
+        self.assertEqual(results['after_slow'], 'got late')
+        self.assertEqual(set(errors), {'b', 'slow'})
+
+    def test_pipeline_timeout(self):
+        started = time.monotonic()
+        results, errors = run_stages([Stage('slow', lambda: time.sleep(1), timeout=5, default='late')], timeout=0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(results, {'slow': 'late'})
+        self.assertIn('slow', errors)
+
+    def test_not_partial(self):
+        with self.assertRaises(PipelineError):
+            run_stages(pipeline_stages(time.sleep), partial=False)
+        with self.assertRaises(PipelineError):
+            asyncio.run(run_stages_async(pipeline_stages(async_sleep), partial=False))
+
+    def test_bad_pipelines(self):
+        with self.assertRaises(ValueError):
+            run_stages([Stage('a', lambda b: b, requires=['b'])])
+        with self.assertRaises(ValueError):
+            run_stages([Stage('a', lambda b: b, requires=['b']), Stage('b', lambda a: a, requires=['a'])])
+
+    def test_select_stages(self):
+        stages = pipeline_stages(time.sleep)
+        self.assertEqual([stage.name for stage in select_stages(stages, ['total'])], ['a', 'b', 'total'])
+        with self.assertRaises(ValueError):
+            select_stages(stages, ['nope'])
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    """Answers each request with the next status in ``statuses``; an exception in the list is raised"""
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        response = requests.Response()
+        response.status_code = status
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class ScriptedClient(ProviderClient):
+    def __init__(self, statuses, **options):
+        super().__init__('test', max_retries=1, backoff=0, breaker_threshold=2, breaker_cooldown=60, **options)
+        self.adapter = ScriptedAdapter(statuses)
+
+    def make_adapter(self):
+        return self.adapter
+
+
+class ProviderClientTests(SimpleTestCase):
+    def test_retries(self):
+        client = ScriptedClient([503, 200])
+        self.assertEqual(client.get('https://api.test/').status_code, 200)
+        self.assertEqual(client.adapter.sent, 2)
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_breaker_opens(self):
+        client = ScriptedClient([503, 503, requests.ConnectionError(), requests.ConnectionError()])
+        self.assertEqual(client.get('https://api.test/').status_code, 503)
+        with self.assertRaises(requests.ConnectionError):
+            client.get('https://api.test/')
+        self.assertTrue(client.breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            client.get('https://api.test/')
+        self.assertEqual(client.adapter.sent, 4)
+
+    def test_rate_limit_is_a_failure(self):
+        client = ScriptedClient([429, 429])
+        client.breaker.failures = 1
+        self.assertEqual(client.get('https://api.test/').status_code, 429)
+        self.assertTrue(client.breaker.is_open)
+
+    def test_half_open_trial(self):
+        client = ScriptedClient([200])
+        client.breaker.failures, client.breaker.opened_at = 2, time.monotonic() - 61
+        self.assertTrue(client.breaker.allow())
+        # Only one trial at a time
+        self.assertFalse(client.breaker.allow())
+        client.breaker.record_failure()
+        self.assertFalse(client.breaker.allow())
+
+        client.breaker.opened_at = time.monotonic() - 61
+        self.assertEqual(client.get('https://api.test/').status_code, 200)
+        self.assertFalse(client.breaker.is_open)
+
+    def test_unexpected_error_ends_trial(self):
+        client = ScriptedClient([requests.exceptions.InvalidURL()])
+        client.breaker.opened_at = time.monotonic() - 61
+        with self.assertRaises(requests.exceptions.InvalidURL):
+            client.get('https://api.test/')
+        self.assertFalse(client.breaker._trial_running)
+        self.assertTrue(client.breaker.is_open)
+
+
+class AsyncProviderClientTests(SimpleTestCase):
+    def make_client(self, handler):
+        client = AsyncProviderClient('test')
+        client.sync_client = ScriptedClient([])
+        client.breaker = CircuitBreaker(2, 60)
+        client.make_transport = lambda: httpx.MockTransport(handler)
+        return client
+
+    def test_rate_limit_is_a_failure(self):
+        client = self.make_client(lambda request: httpx.Response(429))
+        client.breaker.failures = 1
+        response = asyncio.run(client.get('https://api.test/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(client.breaker.is_open)
+
+    def test_cancelled_trial(self):
+        async def handler(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200)
+
+        client = self.make_client(handler)
+        client.breaker.opened_at = time.monotonic() - 61
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(client.get('https://api.test/'), 0.05))
+        # Cancelling isn't the provider's fault, but the next call may try again
+        self.assertEqual(client.breaker.failures, 0)
+        self.assertTrue(client.breaker.allow())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AmadeusTokenTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider = amadeus.AmadeusTokenProvider(refresh_margin=120)
+        self.tokens = iter(['token-1', 'token-2', 'token-3'])
+
+    def fetch(self, expires_in=1800):
+        token = next(self.tokens)
+        cache.set(self.provider.cache_key, {'token': token, 'expires_at': time.time() + expires_in})
+        return token
+
+    def test_token_is_shared(self):
+        with mock.patch.object(self.provider, '_fetch', side_effect=self.fetch) as fetch:
+            self.assertEqual(self.provider.get_token(), 'token-1')
+            self.assertEqual(amadeus.AmadeusTokenProvider().get_token(), 'token-1')
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_refreshed_before_expiry(self):
+        with mock.patch.object(self.provider, '_fetch', side_effect=self.fetch):
+            self.fetch(expires_in=60)
+            self.assertEqual(self.provider.get_token(), 'token-2')
+
+    def test_failed_early_refresh_keeps_token(self):
+        self.fetch(expires_in=60)
+        with mock.patch.object(self.provider, '_fetch', return_value=None):
+            self.assertEqual(self.provider.get_token(), 'token-1')
+
+    def test_expired_token(self):
+        self.fetch(expires_in=-1)
+        with mock.patch.object(self.provider, '_fetch', return_value=None):
+            self.assertIsNone(self.provider.get_token())
+
+    def test_retry_after_401(self):
+        self.fetch()
+        client = mock.Mock()
+        client.get.side_effect = [mock.Mock(status_code=401), mock.Mock(status_code=200)]
+        with mock.patch.object(amadeus, 'token_provider', self.provider), \
+                mock.patch.object(amadeus, 'get_client', return_value=client), \
+                mock.patch.object(self.provider, '_fetch', side_effect=self.fetch):
+            response = amadeus.amadeus_get('https://api.test/', {})
+        self.assertEqual(response.status_code, 200)
+        headers = [call.kwargs['headers']['Authorization'] for call in client.get.call_args_list]
+        self.assertEqual(headers, ['Bearer token-1', 'Bearer token-2'])
+
+
+class BulkExportTests(TestCase):
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(User.objects.create_user('traveller', password='secret'))
+
+    def export(self, **headers):
+        return self.client.post(
+            reverse('export_trips_pdf'), json.dumps({'trip_ids': []}), content_type='application/json', headers=headers
+        )
+
+    def test_needs_csrf_token(self):
+        self.assertEqual(self.export().status_code, 403)
+        self.client.get(reverse('saved_trips'))
+        self.assertEqual(self.export(X_CSRFToken=self.client.cookies['csrftoken'].value).status_code, 400)
+
+    def test_zip_names_are_unique(self):
+        trip_exports = [(f'key-{index}', {}, 'Mumbai.pdf') for index in range(3)]
+        pdf = tempfile.NamedTemporaryFile(suffix='.pdf')
+        self.addCleanup(pdf.close)
+        with mock.patch.object(exports.pdf_jobs, 'request_pdf'), \
+                mock.patch.object(exports.pdf_jobs, 'wait_for_pdf', return_value=exports.pdf_jobs.READY), \
+                mock.patch.object(exports.pdf_jobs, 'pdf_path', return_value=pdf.name):
+            content = b''.join(exports.stream_pdf_zip(trip_exports))
+        names = zipfile.ZipFile(io.BytesIO(content)).namelist()
+        self.assertEqual(names, ['Mumbai.pdf', 'Mumbai (2).pdf', 'Mumbai (3).pdf'])
+
+
+def forecast_slot(moment, temp, precipitation=0.0, pop=0.0, description='clear sky'):
+    return [int(moment.timestamp()), temp, temp - 1, temp + 1, precipitation, pop, 60, 3.0, description]
+
+
+class WeatherTests(SimpleTestCase):
+    def setUp(self):
+        start = datetime(2030, 11, 1, tzinfo=timezone.utc)
+        slots = [forecast_slot(start + timedelta(hours=hour), 20 + hour // 3) for hour in range(0, 24, 3)]
+        slots += [
+            forecast_slot(start + timedelta(days=1, hours=hour), 30, 1.5, 0.4 + hour / 100, 'light rain')
+            for hour in range(0, 24, 3)
+        ]
+        slots[-1][-1] = 'overcast clouds'
+        self.forecast = {'city': 'Mumbai', 'timezone': 0, 'slots': slots}
+
+    def test_daily(self):
+        first, second = ForecastTable(self.forecast).daily()
+        self.assertEqual(first, DayWeather(date(2030, 11, 1), 19, 28, 0, 0, 'clear sky'))
+        self.assertEqual((second.precipitation, second.pop, second.description), (12.0, 0.61, 'light rain'))
+        self.assertEqual(second.outlook, 'warm, rain likely')
+        self.assertEqual(DayWeather.from_dict(second.as_dict()), second)
+
+    def test_days_split_at_local_midnight(self):
+        days = ForecastTable({**self.forecast, 'timezone': 6 * 60 * 60}).daily()
+        self.assertEqual([day.day for day in days], [date(2030, 11, d) for d in (1, 2, 3)])
+
+    def test_trip_weather(self):
+        self.assertEqual([day.day for day in trip_weather(self.forecast, '2030-11-02', 4)], [date(2030, 11, 2)])
+        self.assertEqual(trip_weather(self.forecast, '2030-12-01', 4), [])
+        self.assertEqual(trip_weather(None, '2030-11-01', 4), [])
+
+    def test_add_day_weather(self):
+        itinerary = parse_itinerary("Day 1: Arrival\nDay 2: Museums\nDay 3: Beach")
+        days = trip_weather(self.forecast, '2030-11-01', 3)
+        add_day_weather(itinerary.days, days, '2030-11-01')
+        self.assertEqual([day.weather for day in itinerary.days], [*days, None])
+
+
+class ItineraryWeatherTests(TripSearchTestCase):
+    @override_settings(ITINERARY_STREAMING=False)
+    def test_itinerary_is_shared_across_dates(self):
+        tomorrow = date.today() + timedelta(days=1)
+        dates = [(tomorrow + timedelta(days=shift)).isoformat() for shift in (0, 1, 2, 3)]
+        first = self.search(departure_date=dates[0], return_date=dates[2])
+        second = self.search(departure_date=dates[1], return_date=dates[3])
+        self.assertEqual(self.providers.calls['gemini'], 1)
+        self.assertEqual(first.context['itinerary'], second.context['itinerary'])
+        # The forecast is added to each search's own days
+        first_day = second.context['parsed_itinerary'].days[0]
+        self.assertEqual(first_day.weather, second.context['trip_weather'][0])
+        self.assertEqual(first_day.weather.day.isoformat(), dates[1])
+        self.assertEqual(
+            self.client.session['itinerary_cache_key'], itinerary_cache_key('Mumbai', first.context['attractions'], 3),
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PdfJobsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store)
+        self.enterContext(override_settings(PDF_STORE_DIR=store))
+        self.enterContext(mock.patch.object(pdf_jobs, 'render_to_string', side_effect=self.render))
+        self.submit = self.enterContext(mock.patch.object(pdf_jobs, '_submit', side_effect=self.start_render))
+        self.renders = []
+
+    def render(self, template, context):
+        # The lock only guards the dedup check, not the template
+        self.assertFalse(pdf_jobs._pending_lock.locked())
+        return '<html></html>'
+
+    def start_render(self, func, html_string, path):
+        future = Future()
+        self.renders.append((future, path))
+        return future
+
+    def finish_render(self):
+        future, path = self.renders.pop()
+        Path(path).write_bytes(b'%PDF')
+        future.set_result(None)
+
+    def test_dedup(self):
+        self.assertEqual(pdf_jobs.request_pdf('a' * 64, {}, 'Trip.pdf'), pdf_jobs.PENDING)
+        self.assertEqual(pdf_jobs.request_pdf('a' * 64, {}, 'Trip.pdf'), pdf_jobs.PENDING)
+        # Another worker sees the job record rather than this process's future
+        with mock.patch.dict(pdf_jobs._pending, clear=True):
+            self.assertEqual(pdf_jobs.request_pdf('a' * 64, {}, 'Trip.pdf'), pdf_jobs.PENDING)
+        self.assertEqual(self.submit.call_count, 1)
+
+        self.finish_render()
+        self.assertEqual(pdf_jobs.pdf_job('a' * 64), {'status': pdf_jobs.READY, 'filename': 'Trip.pdf'})
+        self.assertEqual(pdf_jobs.request_pdf('a' * 64, {}, 'Trip.pdf'), pdf_jobs.READY)
+        self.assertEqual(self.submit.call_count, 1)
+
+    def test_failed_render_can_retry(self):
+        pdf_jobs.request_pdf('b' * 64, {}, 'Trip.pdf')
+        self.renders.pop()[0].set_exception(RuntimeError("out of memory"))
+        self.assertEqual(pdf_jobs.pdf_job('b' * 64)['status'], pdf_jobs.FAILED)
+        self.assertEqual(pdf_jobs.request_pdf('b' * 64, {}, 'Trip.pdf'), pdf_jobs.PENDING)
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_sweep(self):
+        old, new = pdf_jobs.pdf_path('c' * 64), pdf_jobs.pdf_path('d' * 64)
+        for path in (old, new):
+            path.write_bytes(b'%PDF')
+        expired = time.time() - settings.PDF_STORE_TIMEOUT - 60
+        os.utime(old, (expired, expired))
+        self.assertEqual(pdf_jobs.sweep_pdf_store(), 1)
+        self.assertEqual((old.exists(), new.exists()), (False, True))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SINGLEFLIGHT_WAIT=30)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.calls
+
+    def in_threads(self, func, count=4):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(func())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_do(self):
+        results = self.in_threads(lambda: singleflight.do('test', 'key', self.slow_call))
+        self.assertEqual((results, self.calls), ([1, 1, 1, 1], 1))
+        self.assertEqual(singleflight.dedup_stats('test'), (1, 3, 0.75))
+
+    def test_leader_error_is_shared(self):
+        def fail_slowly():
+            self.calls += 1
+            self.release.wait(5)
+            raise RuntimeError("provider is down")
+
+        def call():
+            try:
+                return singleflight.do('test', 'error-key', fail_slowly)
+            except RuntimeError as e:
+                return str(e)
+
+        self.assertEqual(self.in_threads(call, 3), ["provider is down"] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_result_from_another_worker(self):
+        cache.add(singleflight.lock_key('remote-key'), 'other-worker', 30)
+        threading.Timer(0.1, cache.set, [singleflight.result_key('remote-key', 'other-worker'), ('shared',)]).start()
+        self.assertEqual(singleflight.do('test', 'remote-key', self.slow_call), 'shared')
+        self.assertEqual(self.calls, 0)
+
+    def test_do_async(self):
+        async def call():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def main():
+            return await asyncio.gather(*[singleflight.do_async('test', 'key', call) for _ in range(3)])
+
+        self.assertEqual(asyncio.run(main()), ['result'] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_wait_ends_with_the_stage(self):
+        self.assertEqual(singleflight.follower_wait(), 30)
+        stages = [Stage('wait', singleflight.follower_wait, timeout=0.5)]
+        self.assertLessEqual(run_stages(stages)[0]['wait'], 0.5)
+        self.assertLessEqual(asyncio.run(run_stages_async(stages))[0]['wait'], 0.5)
+
+    def test_follower_gives_up_at_stage_deadline(self):
+        # Another worker holds the call and never publishes a result
+        cache.add(singleflight.lock_key('stage-key'), 'other-worker', 30)
+        done = threading.Event()
+
+        def call():
+            try:
+                return singleflight.do('test', 'stage-key', self.slow_call)
+            finally:
+                done.set()
+
+        results, errors = run_stages([Stage('call', call, timeout=0.5)])
+        self.assertEqual(errors, {'call': 'timed out after 0.5s'})
+        # The follower stops with the stage rather than calling the provider late
+        self.assertTrue(done.wait(1))
+        self.assertEqual(self.calls, 0)
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_drops_least_recently_used(self):
+        lru = LocalLRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        self.assertEqual(len(lru), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROVIDER_CACHE_TTLS={'test': 60}, PROVIDER_CACHE_STALE={'test': 600})
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.responses = iter(['first', 'second', 'third'])
+        self.calls = []
+        self.refreshed = threading.Event()
+
+        @response_cache.cached_response('test', lambda city: [city])
+        def fetch(city):
+            self.calls.append(city)
+            self.refreshed.set()
+            return next(self.responses)
+
+        self.fetch = fetch
+        self.key = singleflight.flight_key('test', ['Mumbai'])
+
+    def age(self, seconds):
+        """Make the cached entry ``seconds`` older, locally and in the shared cache"""
+        response, fresh_until, stale_until = local_cache.get(self.key)
+        entry = (response, fresh_until - seconds, stale_until - seconds)
+        local_cache.set(self.key, entry)
+        cache.set(response_cache.response_cache_key(self.key), entry)
+
+    def test_fresh(self):
+        self.assertEqual(self.fetch('Mumbai'), 'first')
+        self.assertEqual(self.fetch('Mumbai'), 'first')
+        self.assertEqual(self.calls, ['Mumbai'])
+
+    def test_shared_cache(self):
+        self.fetch('Mumbai')
+        local_cache.clear()
+        self.assertEqual(self.fetch('Mumbai'), 'first')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_while_revalidate(self):
+        self.fetch('Mumbai')
+        self.refreshed.clear()
+        self.age(120)
+        # The stale response is served at once while one refresh runs behind it
+        self.assertEqual(self.fetch('Mumbai'), 'first')
+        self.assertTrue(self.refreshed.wait(5))
+        for _ in range(50):
+            if local_cache.get(self.key)[0] == 'second':
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.fetch('Mumbai'), 'second')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_expired(self):
+        self.fetch('Mumbai')
+        self.age(700)
+        self.assertEqual(self.fetch('Mumbai'), 'second')
+
+    def test_empty_responses_are_not_cached(self):
+        self.responses = iter([None, 'first'])
+        self.assertIsNone(self.fetch('Mumbai'))
+        self.assertEqual(self.fetch('Mumbai'), 'first')
+
+
+def flight_segment(carrier, number, origin, destination, departs_at, arrives_at, duration):
+    return {
+        'carrierCode': carrier, 'number': number, 'duration': duration,
+        'departure': {'iataCode': origin, 'at': departs_at}, 'arrival': {'iataCode': destination, 'at': arrives_at},
+    }
+
+
+FLIGHT_OFFERS = {'data': [
+    {
+        'id': '1', 'price': {'total': '9500.00', 'currency': 'INR'},
+        'itineraries': [
+            {'duration': 'PT7H30M', 'segments': [
+                flight_segment('AI', '101', 'DEL', 'BLR', '2030-11-01T22:00:00', '2030-11-02T00:45:00', 'PT2H45M'),
+                flight_segment('AI', '505', 'BLR', 'BOM', '2030-11-02T03:55:00', '2030-11-02T05:30:00', 'PT1H35M'),
+            ]},
+            {'duration': 'PT2H10M', 'segments': [
+                flight_segment('AI', '866', 'BOM', 'DEL', '2030-11-04T09:00:00', '2030-11-04T11:10:00', 'PT2H10M'),
+            ]},
+        ],
+    },
+    {
+        'id': '2', 'price': {'total': '4200.50', 'currency': 'INR'},
+        'itineraries': [{'duration': 'PT2H5M', 'segments': [
+            flight_segment('6E', '2001', 'DEL', 'BOM', '2030-11-01T06:00:00', '2030-11-01T08:05:00', 'PT2H5M'),
+        ]}],
+    },
+    {'id': '3', 'price': {'total': '3000.00'}, 'itineraries': [{'segments': []}]},
+    {
+        'id': '4', 'price': {'total': '6100.00', 'currency': 'INR'},
+        'itineraries': [{'duration': 'PT2H15M', 'segments': [
+            flight_segment('UK', '955', 'DEL', 'BOM', '2030-11-01T17:45:00', '2030-11-01T20:00:00', 'PT2H15M'),
+        ]}],
+    },
+]}
+
+
+class OfferTableTests(SimpleTestCase):
+    def setUp(self):
+        self.table = OfferTable.from_response(FLIGHT_OFFERS)
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(list(self.table.price), [9500.0, 4200.5, 6100.0])
+        self.assertEqual(list(self.table.duration), [450, 125, 135])
+        self.assertEqual(list(self.table.stops), [1, 0, 0])
+
+    def test_cheapest(self):
+        self.assertEqual(self.table.cheapest().offer_id, '2')
+        self.assertEqual(self.table.cheapest_price(), 4200.5)
+        self.assertIsNone(OfferTable([]).cheapest())
+        self.assertIsNone(OfferTable.from_response(None).cheapest_price())
+
+    def test_filter(self):
+        self.assertEqual(self.table.filter(max_stops=0), [1, 2])
+        self.assertEqual(self.table.filter(max_price=7000, max_duration=130), [1])
+        self.assertEqual(self.table.filter(departs_after='12:00'), [0, 2])
+        self.assertEqual(self.table.filter(departs_after='12:00', departs_before=20 * 60), [2])
+
+    def test_rank(self):
+        self.assertEqual(self.table.rank(), [1, 2, 0])
+        self.assertEqual(self.table.rank(('stops', '-price')), [2, 1, 0])
+        self.assertEqual(self.table.pick(self.table.rank(('-departure',), [0, 1])), self.table.pick([0, 1]))
+        with self.assertRaises(ValueError):
+            self.table.rank(('airline',))
+
+
+class FlightOfferParsingTests(SimpleTestCase):
+    def test_multi_segment_offer(self):
+        offers = parse_offers(FLIGHT_OFFERS)
+        self.assertEqual([offer.offer_id for offer in offers], ['1', '2', '4'])
+        offer = offers[0]
+        self.assertEqual((offer.price, offer.price_text, offer.currency), (9500.0, '9500.00', 'INR'))
+
+        outbound = offer.outbound
+        self.assertEqual([segment.flight_number for segment in outbound.segments], ['AI 101', 'AI 505'])
+        self.assertEqual((outbound.first.origin, outbound.last.destination, outbound.stops), ('DEL', 'BOM', 1))
+        self.assertEqual([(layover.airport, layover.duration_label) for layover in outbound.layovers], [('BLR', '3h 10m')])
+        self.assertEqual([layover for _, layover in outbound.legs], [outbound.layovers[0], None])
+        self.assertEqual((outbound.duration_label, outbound.days_later), ('7h 30m', 1))
+        self.assertEqual((offer.inbound.first.origin, offer.inbound.stops), ('BOM', 0))
+        self.assertIsNone(offers[1].inbound)
+
+    def test_round_trip_through_session_data(self):
+        offer = parse_offers(FLIGHT_OFFERS)[0]
+        data = json.loads(json.dumps(offer.as_dict()))
+        self.assertEqual(FlightOffer.from_dict(data), offer)
+
+    def test_unreadable_offers_are_skipped(self):
+        broken = {'data': [{'id': '5', 'price': {}, 'itineraries': []}, *FLIGHT_OFFERS['data']]}
+        self.assertEqual(len(parse_offers(broken)), 3)
+        self.assertEqual(parse_offers(None), [])
+        self.assertEqual(duration_minutes('P1DT2H5M'), 26 * 60 + 5)
+        self.assertEqual(duration_minutes('soon'), 0)
+
+
+def city_hotel(hotel_id, distance=None):
+    return {'hotelId': hotel_id, 'name': f'HOTEL {hotel_id}', 'iataCode': 'BOM',
+            'distance': {'value': distance} if distance is not None else None}
+
+
+def hotel_offer(hotel_id, *totals, available=True):
+    return {'hotel': {'hotelId': hotel_id}, 'available': available, 'offers': [
+        {'price': {'total': total, 'currency': 'INR'}, 'room': {'typeEstimated': {'category': 'STANDARD_ROOM'}}}
+        for total in totals
+    ]}
+
+
+class HotelSearchTests(SimpleTestCase):
+    HOTELS = [city_hotel('A', 2.5), city_hotel('B', 0.5), city_hotel('C'), city_hotel('D', 1.0), city_hotel('E', 3.0)]
+
+    def test_nearest_hotels(self):
+        nearest = nearest_hotels([*self.HOTELS, {'name': 'No id'}], 4)
+        self.assertEqual([hotel['hotelId'] for hotel in nearest], ['B', 'D', 'A', 'E'])
+        self.assertEqual(hotel_id_chunks(nearest, 3), [['B', 'D', 'A'], ['E']])
+
+    def test_stay_nights(self):
+        self.assertEqual(stay_nights('2030-11-01', '2030-11-04'), 3)
+        self.assertEqual(stay_nights('2030-11-01', '2030-11-01'), 1)
+        self.assertEqual(stay_nights('2030-11-01', 'later'), 1)
+
+    def test_merge_offers(self):
+        answers = [
+            (['A', 'B'], [hotel_offer('A', '9000.00', '7500.00'), hotel_offer('B', '7500.00')]),
+            (['C', 'D'], [hotel_offer('C', '100.00', available=False)]),
+            (['E'], None),  # The request failed
+        ]
+        hotels = merge_offers(self.HOTELS, answers, 3)
+        # Priced by price then distance; then the hotels nothing is known about
+        self.assertEqual([hotel.hotel_id for hotel in hotels], ['B', 'A', 'E'])
+        self.assertEqual((hotels[0].price, hotels[0].nightly_price, hotels[0].room), (7500.0, 2500.0, 'Standard Room'))
+        self.assertEqual((hotels[0].name, hotels[2].price), ('Hotel B', None))
+
+    @override_settings(HOTEL_SEARCH_BUDGET=0.2, HOTEL_OFFERS_CHUNK_SIZE=2)
+    def test_search_within_budget(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def get_hotel_offers(chunk, *args):
+            if 'E' in chunk:
+                release.wait(5)  # Misses the budget
+            return [hotel_offer(hotel_id, '5000.00') for hotel_id in chunk]
+
+        with mock.patch.object(providers, 'get_city_hotels', return_value=nearest_hotels(self.HOTELS, 5)), \
+                mock.patch.object(providers, 'get_hotel_offers', side_effect=get_hotel_offers):
+            started = time.monotonic()
+            hotels = providers.search_hotels('BOM', '2030-11-01', '2030-11-03', 'token')
+        self.assertLess(time.monotonic() - started, 1)
+        # A and E share the late chunk, so they follow unpriced, nearest first
+        self.assertEqual([hotel.hotel_id for hotel in hotels], ['B', 'D', 'C', 'A', 'E'])
+        self.assertEqual([hotel.price for hotel in hotels], [5000.0] * 3 + [None] * 2)
+        self.assertEqual(hotels[0].nights, 2)
@@ -0,0 +1,369 @@
+"""The trip search behind the home page, shared by the sync and async views.
+
+The stage graph is built against a providers module, either
+``globe.providers`` (blocking, run on a thread pool) or
+``globe.async_providers`` (coroutines, run on the event loop).
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.urls import reverse
+
+from .cost_estimate import (
+    chosen_offer, date_changes, estimate_summary, estimate_total, flight_choices, hotel_choices, new_estimate,
+)
+from .flight_offers import OfferTable
+from .hotels import best_hotels
+from .itinerary import itinerary_cache_key
+from .itinerary_parser import parse_itinerary
+from .pipeline import Stage
+from .weather import ForecastTable, add_day_weather, trip_weather
+
+
+class TripSearch(NamedTuple):
+    source: str
+    dest: str
+    departure_date: str
+    return_date: str
+    num_days: int
+    checkout_date: str
+    # Dates exactly as submitted, for the PDF export
+    submitted_departure_date: str
+    submitted_return_date: str
+
+
+def parse_trip_search(post):
+    """Read a ``TripSearch`` from the home page form"""
+    source = post.get("source_city")
+    dest = post.get("destination_city")
+    departure_date = post.get("departure_date")
+    return_date = post.get("return_date")  # Get return date
+
+    # If no date provided, use tomorrow
+    if not departure_date:
+        departure_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # Calculate number of days for itinerary
+    num_days = 3  # Default
+    if departure_date and return_date:
+        try:
+            dep_date = datetime.strptime(departure_date, "%Y-%m-%d")
+            ret_date = datetime.strptime(return_date, "%Y-%m-%d")
+            # Add 1 to include both departure and return days
+            num_days = max((ret_date - dep_date).days + 1, 1)
+            print(f"Calculated trip duration: {num_days} days (from {departure_date} to {return_date})")
+        except Exception as e:
+            print(f"Error calculating days: {e}")
+            num_days = 3
+
+    # Checkout date for hotels: return date or the end of the trip
+    if return_date:
+        checkout_date = return_date
+    else:
+        checkin = datetime.strptime(departure_date, "%Y-%m-%d")
+        checkout_date = (checkin + timedelta(days=num_days)).strftime("%Y-%m-%d")
+
+    return TripSearch(
+        source, dest, departure_date, return_date, num_days, checkout_date,
+        post.get('departure_date', ''), post.get('return_date', ''),
+    )
+
+
+def trip_search_stages(search, providers, stream_itinerary=None):
+    """Build the pipeline stages for a search against a providers module.
+
+    With ``stream_itinerary`` (``ITINERARY_STREAMING`` by default) the
+    itinerary stage only reads a cached itinerary and a new one is streamed
+    later; otherwise the stage generates it.
+    """
+    source, dest, num_days = search.source, search.dest, search.num_days
+    if stream_itinerary is None:
+        stream_itinerary = settings.ITINERARY_STREAMING
+
+    def find_flights(travel_date, reverse=False):
+        def run(origin_code, destination_code, access_token):
+            if not (access_token and origin_code and destination_code and travel_date):
+                return None
+            if reverse:
+                origin_code, destination_code = destination_code, origin_code
+            return providers.search_flights(origin_code, destination_code, travel_date, access_token)
+        return run
+
+    def find_hotels(access_token, destination_code):
+        if not (access_token and destination_code):
+            return []
+        return providers.search_hotels(destination_code, search.departure_date, search.checkout_date, access_token)
+
+    if stream_itinerary:
+        # Only use a cached itinerary here; a new one is streamed to the
+        # page by itinerary_stream once everything else has rendered
+        itinerary_stage = Stage(
+            'itinerary',
+            lambda attractions: providers.get_cached_itinerary(dest, attractions, num_days),
+            requires=['attractions'],
+        )
+    else:
+        itinerary_stage = Stage(
+            'itinerary',
+            lambda attractions: providers.generate_itinerary(dest, attractions, num_days),
+            requires=['attractions'],
+            timeout=settings.TRIP_SEARCH_ITINERARY_TIMEOUT,
+        )
+
+    # Independent providers run in parallel; dependent stages start as
+    # soon as their inputs are ready. Slow or failing providers fall back
+    # to their default so the rest of the page still renders.
+    flight_inputs = ['origin_code', 'destination_code', 'access_token']
+    return [
+        Stage('source_coords', lambda: providers.get_coords(source), default=(None, None)),
+        Stage('dest_coords', lambda: providers.get_coords(dest), default=(None, None)),
+        Stage('access_token', providers.get_amadeus_token),
+        Stage('origin_code', lambda: providers.get_airport_code(source)),
+        Stage('destination_code', lambda: providers.get_airport_code(dest)),
+        Stage('outbound_flights', find_flights(search.departure_date), requires=flight_inputs),
+        Stage('return_flights', find_flights(search.return_date, reverse=True), requires=flight_inputs),
+        Stage('attractions', lambda: providers.get_google_places(dest), default=[]),
+        Stage('weather', lambda: providers.get_weather(dest)),
+        Stage('hotels', find_hotels, requires=['access_token', 'destination_code'], default=[]),
+        Stage('exchange_rates', lambda: providers.get_exchange_rates(settings.COST_CURRENCY)),
+        itinerary_stage,
+    ]
+
+
+def best_offers(offers):
+    """The offers to show, ranked by ``FLIGHT_RANKING``"""
+    return offers.pick(offers.rank(settings.FLIGHT_RANKING)[:settings.FLIGHT_RESULTS_SHOWN])
+
+
+def offer_choices(offers, shown):
+    """The offers the cost estimate can use: the cheapest, then the shown ones"""
+    cheapest = offers.cheapest()
+    return ([cheapest] if cheapest else []) + [offer for offer in shown if offer is not cheapest]
+
+
+def search_context(search):
+    """The search itself, which every section shows"""
+    return {
+        "source": search.source,
+        "destination": search.dest,
+        "departure_date": search.departure_date,
+        "return_date": search.return_date,
+        "num_days": search.num_days,
+    }
+
+
+def flights_context(search, results):
+    """Context for the flights section, plus the offers the cost estimate can choose from"""
+    access_token = results['access_token']
+    origin_code = results['origin_code']
+    destination_code = results['destination_code']
+    flight_results = results['outbound_flights']
+
+    outbound_offers = OfferTable.from_response(flight_results)
+    return_offers = OfferTable.from_response(results['return_flights'])
+    flights_data = []
+    return_flights_data = []
+    error_message = None
+
+    if access_token:
+        print(f"Origin code: {origin_code}, Destination code: {destination_code}")  # Debug
+
+        if origin_code and destination_code:
+            print(f"Flight results found: {len(flight_results.get('data', [])) if flight_results else 0}")  # Debug
+
+            if outbound_offers:
+                flights_data = best_offers(outbound_offers)
+                print(f"Outbound flights found: {len(flights_data)}")
+            else:
+                print("No outbound flights found in API response")
+                # Only set error if there are NO outbound flights
+                error_message = "No outbound flights found for the selected route and date."
+
+            if return_offers:
+                return_flights_data = best_offers(return_offers)
+                print(f"Return flights found: {len(return_flights_data)}")
+            elif search.return_date:
+                print("No return flights found in API response")
+                # Don't set error_message for return flights, just log it
+        else:
+            error_message = f"Could not find airport codes. Origin: {origin_code}, Destination: {destination_code}"
+    else:
+        error_message = "Unable to connect to flight search service."
+
+    return {
+        "outbound_flights": flights_data,  # Changed key name for clarity
+        "flights": flights_data,  # Keep both for backward compatibility
+        "return_flights": return_flights_data,
+        # Cheapest of all the offers, shown or not, for the cost estimate and saved trips
+        "cheapest_flight": outbound_offers.cheapest(),
+        "cheapest_return_flight": return_offers.cheapest(),
+        "flight_choices": offer_choices(outbound_offers, flights_data),
+        "return_flight_choices": offer_choices(return_offers, return_flights_data),
+        "error_message": error_message,
+    }
+
+
+def hotels_context(search, results):
+    return {"hotels": best_hotels(results['hotels'])}
+
+
+def weather_context(search, results):
+    weather = results['weather']
+    days = trip_weather(weather, search.departure_date, search.num_days)
+    return {
+        "weather": ForecastTable(weather) if weather else None,
+        # Summaries of the trip's days that the forecast reaches
+        "trip_weather": days,
+    }
+
+
+def attractions_context(search, results):
+    return {"attractions": results['attractions']}
+
+
+def itinerary_context(search, results):
+    itinerary = results['itinerary']
+    itinerary_stream_url = None
+    if not itinerary and settings.ITINERARY_STREAMING:
+        itinerary_stream_url = reverse('itinerary_stream')
+    parsed_itinerary = None
+    if itinerary:
+        parsed_itinerary = parse_itinerary(itinerary)
+        days = trip_weather(results.get('weather'), search.departure_date, search.num_days)
+        add_day_weather(parsed_itinerary.days, days, search.departure_date)
+    return {
+        "itinerary": itinerary,
+        "parsed_itinerary": parsed_itinerary,
+        "itinerary_stream_url": itinerary_stream_url,
+    }
+
+
+# Each section of the page: the stages it shows and how it builds its context.
+# The section endpoints run only these stages (and the ones they require).
+SECTIONS = {
+    'flights': (('outbound_flights', 'return_flights'), flights_context),
+    'hotels': (('hotels',), hotels_context),
+    'weather': (('weather',), weather_context),
+    'attractions': (('attractions',), attractions_context),
+    'itinerary': (('itinerary', 'weather'), itinerary_context),
+}
+
+
+def build_trip_context(search, results, failed_stages):
+    """Turn pipeline results into the home page template context"""
+    source_lat, source_lng = results['source_coords']
+    dest_lat, dest_lng = results['dest_coords']
+
+    context = {
+        **search_context(search),
+        "source_lat": source_lat,
+        "source_lng": source_lng,
+        "dest_lat": dest_lat,
+        "dest_lng": dest_lng,
+        "unavailable_sections": sorted(failed_stages),
+    }
+    for _, section_context in SECTIONS.values():
+        context.update(section_context(search, results))
+
+    # Estimate the trip cost from the cheapest flights and stay; the page can
+    # switch them through the cost endpoint
+    cost_estimate = new_estimate(
+        search, context['flight_choices'], context['return_flight_choices'], context['hotels'],
+        results['exchange_rates'],
+    )
+    context.update({
+        "cost_estimate": cost_estimate,
+        "cost_summary": estimate_summary(cost_estimate),
+        "estimated_cost": estimate_total(cost_estimate),
+    })
+
+    # Debug output
+    print("\n=== CONTEXT DATA ===")
+    print(f"Outbound flights: {len(context['flights'])}")
+    print(f"Return flights: {len(context['return_flights'])}")
+    print(f"Error message: {context['error_message']}")
+    print(f"Failed stages: {failed_stages}")
+    print("==================\n")
+    return context
+
+
+def trip_session_data(search, context):
+    """Session values the itinerary stream and PDF export read back later"""
+    attractions = context['attractions']
+    data = {
+        # Store in session for PDF export (dates are already strings from POST).
+        # A streamed itinerary is picked up from the cache by its key.
+        'itinerary': context['itinerary'],
+        'itinerary_cache_key': itinerary_cache_key(search.dest, attractions, search.num_days),
+        'trip_weather': [day.as_dict() for day in context['trip_weather']],
+        'source': search.source,
+        'destination': search.dest,
+        'num_days': search.num_days,
+        'itinerary_num_days': search.num_days,
+        'estimated_cost': context['estimated_cost'],
+        'trip_costs': context['cost_estimate'],
+        'outbound_flight': chosen_offer(context['cost_estimate'], 'outbound_flight'),
+        'return_flight': chosen_offer(context['cost_estimate'], 'return_flight'),
+        'departure_date': search.submitted_departure_date,
+        'return_date': search.submitted_return_date,
+    }
+    if context['itinerary_stream_url']:
+        data['itinerary_request'] = {
+            'destination': search.dest,
+            'num_days': search.num_days,
+            'attractions': [{'name': a.get('name', '')} for a in attractions],
+        }
+    return data
+
+
+def trip_dates_session_data(search, results):
+    """Session values that move the session's trip to the dates of ``search``.
+
+    The number of days and the trip's weather move with the dates, so
+    ``results`` should include the weather stage; without a forecast the
+    trip has no weather. The itinerary keeps its own number of days until
+    it is planned again (see ``itinerary_is_stale``).
+    """
+    days = trip_weather(results.get('weather'), search.departure_date, search.num_days)
+    return {
+        'departure_date': search.submitted_departure_date,
+        'return_date': search.submitted_return_date,
+        'num_days': search.num_days,
+        'trip_weather': [day.as_dict() for day in days],
+    }
+
+
+def itinerary_is_stale(session):
+    """Whether the session's itinerary was planned for a different number of days than its trip"""
+    planned = session.get('itinerary_num_days', session.get('num_days'))
+    return planned != session.get('num_days')
+
+
+def section_cost_changes(search, section, context):
+    """Cost estimate inputs replaced by a search of one section"""
+    if section == 'flights':
+        return {**date_changes(search), **flight_choices(context['flight_choices'], context['return_flight_choices'])}
+    if section == 'hotels':
+        return {**date_changes(search), **hotel_choices(context['hotels'])}
+    return {}
+
+
+def section_session_data(search, section, results, context):
+    """Session values replaced by a search of one section of the session's trip.
+
+    As for ``trip_dates_session_data``, ``results`` should include the
+    weather stage, so the trip's days and weather move with its dates.
+    """
+    if section == 'attractions':
+        # The only section that doesn't depend on the dates
+        return {}
+    data = trip_dates_session_data(search, results)
+    if section == 'itinerary':
+        data.update({
+            'itinerary': context['itinerary'],
+            'itinerary_cache_key': itinerary_cache_key(search.dest, results['attractions'], search.num_days),
+            'itinerary_num_days': search.num_days,
+            'itinerary_request': None,
+        })
+    return data
@@ -1,14 +1,37 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-urlpatterns = [
-    path("", views.home, name="home"),
-    path("export-pdf/", views.export_itinerary_pdf, name="export_pdf"),
-    path("chatbot/", views.chatbot, name="chatbot"),
-    path("clear-chat/", views.clear_chat, name="clear_chat"),
-    # Auth routes
-    path('login/', views.CustomLoginView.as_view(), name='login'),
-    path('logout/', views.CustomLogoutView.as_view(), name='logout'),
-    path('signup/', views.signup, name='signup'),
-]
+from . import async_views, views
 
+
+def build_urlpatterns(use_async_views=False):
+    """URL patterns with the sync or the async home, chatbot and streaming views"""
+    io_views = async_views if use_async_views else views
+    return [
+        path("", io_views.home, name="home"),
+        path("itinerary/stream/", io_views.itinerary_stream, name="itinerary_stream"),
+        path("flights/calendar/", views.flexible_fares, name="fare_calendar"),
+        path("trip/cost/", views.trip_cost, name="trip_cost"),
+        path("trip/<str:section>/", views.trip_section, name="trip_section"),
+        path("export-pdf/", views.export_itinerary_pdf, name="export_pdf"),
+        path("export-pdf/bulk/", io_views.export_trips_pdf, name="export_trips_pdf"),
+        path("export-pdf/<str:key>/status/", views.export_pdf_status, name="export_pdf_status"),
+        path("export-pdf/<str:key>/", views.export_pdf_download, name="export_pdf_download"),
+        path("trips/", views.saved_trip_list, name="saved_trips"),
+        path("trips/save/", views.save_trip, name="save_trip"),
+        path("trips/<int:trip_id>/", views.saved_trip, name="saved_trip"),
+        path("trips/<int:trip_id>/share/", views.share_saved_trip, name="share_saved_trip"),
+        path("trips/<int:trip_id>/pdf/", views.saved_trip_pdf, name="saved_trip_pdf"),
+        path("shared/<str:token>/", views.shared_trip, name="shared_trip"),
+        path("shared/<str:token>/pdf/", views.shared_trip_pdf, name="shared_trip_pdf"),
+        path("cache-report/", views.cache_report, name="cache_report"),
+        path("chatbot/", io_views.chatbot, name="chatbot"),
+        path("chatbot/stream/", io_views.chatbot_stream, name="chatbot_stream"),
+        path("clear-chat/", views.clear_chat, name="clear_chat"),
+        # Auth routes
+        path('login/', views.CustomLoginView.as_view(), name='login'),
+        path('logout/', views.CustomLogoutView.as_view(), name='logout'),
+        path('signup/', views.signup, name='signup'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
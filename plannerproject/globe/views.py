@@ -1,476 +1,88 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.template.loader import render_to_string
 from django.contrib.auth import login
-from opencage.geocoder import OpenCageGeocode
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LoginView, LogoutView 
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import render_to_string
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-import requests
 from plannerproject import settings
-from datetime import datetime, timedelta
 import os
 import google.generativeai as genai
-import re
 import json
-from django.core.cache import cache
-
-geocoder = OpenCageGeocode(settings.OPENCAGE_API_KEY)
-
-def generate_itinerary(dest, attractions, num_days=3):
-    """Generate or retrieve cached itinerary for a destination"""
-    itinerary_cleaned = None
-    
-    # Create cache key based on destination, attractions, and number of days
-    attraction_names = [a.get('name', '') for a in attractions[:5]]
-    cache_key = f"itinerary_{dest.lower().replace(' ', '_')}_{num_days}days_{hash(tuple(attraction_names))}"
-    
-    # Try to get from cache first (cache for 7 days)
-    cached_itinerary = cache.get(cache_key)
-    if cached_itinerary:
-        print(f"Using cached itinerary for {dest} ({num_days} days)")
-        return cached_itinerary
-    
-    try:
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-        # Prepare prompt
-        attractions_list = ", ".join([a["name"] for a in attractions]) if attractions else "None"
-
-        prompt = (
-            f"Create a {num_days}-day travel itinerary for a trip to {dest}. "
-            f"The top attractions are: {attractions_list}. "
-            f"Organize by Day 1, Day 2, {'Day 3, ' if num_days >= 3 else ''}etc., with morning, afternoon, and evening plans for each day. "
-            f"Keep the tone friendly and concise."
-        )
-
-        # Generate text with Gemini
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
-
-        itinerary = response.text.strip()
-        itinerary_cleaned = re.sub(r"\*\*(.*?)\*\*", r"\1", itinerary)
-        
-        # Cache the result for 7 days (604800 seconds)
-        cache.set(cache_key, itinerary_cleaned, 604800)
-        print(f"Cached new itinerary for {dest} ({num_days} days)")
-
-    except Exception as e:
-        itinerary_cleaned = f"Could not generate itinerary: {str(e)}"
-
-    return itinerary_cleaned
-
-def get_amadeus_token():
-    """Get access token from Amadeus API"""
-    url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': settings.AMADEUS_API_KEY,
-        'client_secret': settings.AMADEUS_API_SECRET
-    }
-    
-    try:
-        response = requests.post(url, data=data)
-        print(f"Token response status: {response.status_code}")  # Debug
-        if response.status_code == 200:
-            return response.json()['access_token']
-        else:
-            print(f"Token error: {response.text}")  # Debug
-    except Exception as e:
-        print(f"Error getting Amadeus token: {e}")
-    return None
-
-def get_airport_code(city_name, access_token):
-    """Get IATA airport code for a city with fallback options"""
-    # Common airport mappings as fallback
-    common_airports = {
-        'delhi': 'DEL', 'new delhi': 'DEL',
-        'mumbai': 'BOM', 'bombay': 'BOM',
-        'bangalore': 'BLR', 'bengaluru': 'BLR',
-        'hyderabad': 'HYD',
-        'chennai': 'MAA',
-        'kolkata': 'CCU', 'calcutta': 'CCU',
-        'goa': 'GOI',
-        'jaipur': 'JAI',
-        'pune': 'PNQ',
-        'ahmedabad': 'AMD',
-        'london': 'LHR',
-        'paris': 'CDG',
-        'new york': 'JFK',
-        'dubai': 'DXB',
-        'singapore': 'SIN',
-        'bangkok': 'BKK',
-        'tokyo': 'NRT',
-        'sydney': 'SYD',
-        'los angeles': 'LAX',
-        'san francisco': 'SFO',
-    }
-    
-    # Check common airports first
-    city_lower = city_name.lower().strip()
-    if city_lower in common_airports:
-        print(f"Using common airport code for {city_name}: {common_airports[city_lower]}")
-        return common_airports[city_lower]
-    
-    # Try API search
-    url = "https://test.api.amadeus.com/v1/reference-data/locations"
-    
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    
-    params = {
-        'keyword': city_name,
-        'subType': 'AIRPORT,CITY',
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        print(f"Airport search for {city_name}: {response.status_code}")  # Debug
-        
-        if response.status_code == 200:
-            data = response.json()
-            print(f"Airport data: {data}")  # Debug
-            
-            if data.get('data'):
-                # Look for airports first, then cities
-                for location in data['data']:
-                    if location.get('subType') == 'AIRPORT':
-                        return location.get('iataCode')
-                
-                # If no direct airport, look for city with associated airport
-                for location in data['data']:
-                    if location.get('subType') == 'CITY':
-                        return location.get('iataCode')
-                        
-                # Fallback: return first available iataCode
-                for location in data['data']:
-                    if location.get('iataCode'):
-                        return location.get('iataCode')
-        else:
-            print(f"Airport search error: {response.text}")  # Debug
-            
-    except Exception as e:
-        print(f"Error getting airport code for {city_name}: {e}")
-    return None
-
-def search_flights(origin_code, destination_code, departure_date, access_token, adults=1):
-    """Search for flights using Amadeus API"""
-    url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
-    
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    
-    params = {
-        'originLocationCode': origin_code,
-        'destinationLocationCode': destination_code,
-        'departureDate': departure_date,
-        'adults': adults,
-        'currencyCode': 'INR',
-        'max': 5
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        print(f"Flight search response: {response.status_code}")  # Debug
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Flight search error: {response.text}")  # Debug
-            
-    except Exception as e:
-        print(f"Error searching flights: {e}")
-    return None
-
-def get_google_places(city_name):
-    """Fetch top attractions for a given city using Google Places API."""
-    api_key = os.getenv("GOOGLE_PLACES_API_KEY")
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    params = {
-        "query": f"top attractions in {city_name}",
-        "key": api_key
-    }
-    try:
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get("results", [])
-            
-            # Enrich results with image URLs
-            for place in results:
-                if place.get('photos'):
-                    # Get the first photo reference
-                    photo_reference = place['photos'][0]['photo_reference']
-                    # Construct the photo URL
-                    place['image_url'] = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_reference}&key={api_key}"
-                else:
-                    # Placeholder image if no photo available
-                    place['image_url'] = "https://via.placeholder.com/400x300?text=No+Image"
-                    
-            return results
-        else:
-            print(f"Google Places error: {response.text}")
-    except Exception as e:
-        print(f"Error fetching Google Places data: {e}")
-    return []
-
-def search_hotels(city_code, checkin_date, checkout_date, access_token, adults=1):
-    """Search for hotels using Amadeus API"""
-    url = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
-    
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    
-    params = {
-        'cityCode': city_code
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        print(f"Hotel search response: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            hotels = data.get('data', [])[:5]  # Get top 5 hotels
-            return hotels
-        else:
-            print(f"Hotel search error: {response.text}")
-    except Exception as e:
-        print(f"Error searching hotels: {e}")
-    return []
-
-def get_weather(city_name):
-    """Get weather forecast using OpenWeather API"""
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
-        print("Warning: OPENWEATHER_API_KEY not found in environment variables")
-        return None
-        
-    url = "https://api.openweathermap.org/data/2.5/forecast"
-    params = {
-        "q": city_name,
-        "appid": api_key,
-        "units": "metric",
-        "cnt": 8  # Get 8 forecast entries (24 hours worth)
-    }
-    
-    try:
-        response = requests.get(url, params=params)
-        print(f"Weather API response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            print(f"Weather data received for: {data.get('city', {}).get('name')}")
-            return {
-                'city': data.get('city', {}).get('name'),
-                'forecast': data.get('list', [])[:8]
-            }
-        else:
-            print(f"Weather API error: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"Error fetching weather data: {e}")
-    return None
-
-def get_coords(city_name):
-    result = geocoder.geocode(city_name)
-    if result:
-        return result[0]['geometry']['lat'], result[0]['geometry']['lng']
-    return None, None
+from . import cost_estimate, exports, fare_calendar, pdf_jobs, providers, saved_trips
+from .exports import pdf_export
+from .models import SavedTrip
+from .itinerary import clean_itinerary, session_itinerary, stream_itinerary
+from .itinerary_parser import parse_itinerary
+from .pipeline import run_stages, select_stages
+from .pregeneration import record_search
+from .response_cache import cache_report as build_cache_report, local_cache
+from .saved_trips import saved_trip_context, trip_pdf_export, trips_with_itineraries
+from .trip_search import (
+    SECTIONS, build_trip_context, itinerary_is_stale, parse_trip_search, search_context, section_cost_changes,
+    section_session_data, trip_dates_session_data, trip_search_stages, trip_session_data,
+)
+from .weather import DayWeather, add_day_weather
 
 def home(request):
     context = {}
     
     if request.method == "POST":
-        source = request.POST.get("source_city")
-        dest = request.POST.get("destination_city")
-        departure_date = request.POST.get("departure_date")
-        return_date = request.POST.get("return_date")  # Get return date
-        
-        # If no date provided, use tomorrow
-        if not departure_date:
-            departure_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-        
-        # Calculate number of days for itinerary
-        num_days = 3  # Default
-        if departure_date and return_date:
-            try:
-                dep_date = datetime.strptime(departure_date, "%Y-%m-%d")
-                ret_date = datetime.strptime(return_date, "%Y-%m-%d")
-                # Add 1 to include both departure and return days
-                num_days = max((ret_date - dep_date).days + 1, 1)
-                print(f"Calculated trip duration: {num_days} days (from {departure_date} to {return_date})")
-            except Exception as e:
-                print(f"Error calculating days: {e}")
-                num_days = 3
-
-        # Get coordinates (your existing functionality)
-        source_lat, source_lng = get_coords(source)
-        dest_lat, dest_lng = get_coords(dest)
-
-        # Get Amadeus access token
-        access_token = get_amadeus_token()
-        
-        flights_data = []
-        return_flights_data = []
-        error_message = None
-        
-        if access_token:
-            print(f"Successfully got Amadeus token")  # Debug
-            
-            # Get airport codes
-            origin_code = get_airport_code(source, access_token)
-            destination_code = get_airport_code(dest, access_token)
-            
-            print(f"Origin code: {origin_code}, Destination code: {destination_code}")  # Debug
-            
-            if origin_code and destination_code:
-                # Search for flights
-                flight_results = search_flights(
-                    origin_code, 
-                    destination_code, 
-                    departure_date, 
-                    access_token
-                )
-                
-                print(f"Flight results found: {len(flight_results.get('data', [])) if flight_results else 0}")  # Debug
-                
-                if flight_results and flight_results.get('data'):
-                    for flight in flight_results['data']:
-                        # Parse flight data
-                        itinerary = flight['itineraries'][0]  # First itinerary
-                        segment = itinerary['segments'][0]    # First segment
-                        
-                        flight_info = {
-                            'airline': segment['carrierCode'],
-                            'flight_number': segment['number'],
-                            'departure_time': segment['departure']['at'],
-                            'arrival_time': segment['arrival']['at'],
-                            'departure_airport': segment['departure']['iataCode'],
-                            'arrival_airport': segment['arrival']['iataCode'],
-                            'duration': itinerary['duration'],
-                            'price': flight['price']['total'],
-                            'currency': flight['price']['currency'],
-                            'stops': len(itinerary['segments']) - 1
-                        }
-                        flights_data.append(flight_info)
-                    print(f"Outbound flights found: {len(flights_data)}")
-                else:
-                    print("No outbound flights found in API response")
-                    # Only set error if there are NO outbound flights
-                    error_message = "No outbound flights found for the selected route and date."
-                
-                # Search for return flights if return date provided
-                if return_date and origin_code and destination_code:
-                    return_flight_results = search_flights(
-                        destination_code,  # Return: destination becomes origin
-                        origin_code,       # Return: origin becomes destination
-                        return_date,
-                        access_token
-                    )
-                    
-                    if return_flight_results and return_flight_results.get('data'):
-                        for flight in return_flight_results['data']:
-                            itinerary = flight['itineraries'][0]
-                            segment = itinerary['segments'][0]
-                            
-                            flight_info = {
-                                'airline': segment['carrierCode'],
-                                'flight_number': segment['number'],
-                                'departure_time': segment['departure']['at'],
-                                'arrival_time': segment['arrival']['at'],
-                                'departure_airport': segment['departure']['iataCode'],
-                                'arrival_airport': segment['arrival']['iataCode'],
-                                'duration': itinerary['duration'],
-                                'price': flight['price']['total'],
-                                'currency': flight['price']['currency'],
-                                'stops': len(itinerary['segments']) - 1
-                            }
-                            return_flights_data.append(flight_info)
-                        print(f"Return flights found: {len(return_flights_data)}")
-                    else:
-                        print("No return flights found in API response")
-                        # Don't set error_message for return flights, just log it
-            else:
-                error_message = f"Could not find airport codes. Origin: {origin_code}, Destination: {destination_code}"
-        else:
-            error_message = "Unable to connect to flight search service."
-        
-        # Fetch attractions
-        attractions = get_google_places(dest)
-        
-        # Fetch weather
-        weather_data = get_weather(dest)
-        
-        # Fetch hotels (if we have destination code)
-        hotels_data = []
-        if access_token and destination_code:
-            # Calculate checkout date based on return date or default to trip duration
-            checkin = datetime.strptime(departure_date, "%Y-%m-%d")
-            if return_date:
-                checkout_date = return_date
-            else:
-                checkout = checkin + timedelta(days=num_days)
-                checkout_date = checkout.strftime("%Y-%m-%d")
-            hotels_data = search_hotels(
-                destination_code,
-                departure_date,
-                checkout_date,
-                access_token
-            )
-
-        itinerary = generate_itinerary(dest, attractions, num_days)
-        
-        # Calculate estimated trip cost
-        total_cost = 0
-        if flights_data:
-            # Get cheapest outbound flight
-            total_cost += min([float(f['price']) for f in flights_data])
-        if return_flights_data:
-            # Add cheapest return flight
-            total_cost += min([float(f['price']) for f in return_flights_data])
-        
-        # Debug output
-        print(f"\n=== CONTEXT DATA ===")
-        print(f"Outbound flights: {len(flights_data)}")
-        print(f"Return flights: {len(return_flights_data)}")
-        print(f"Error message: {error_message}")
-        print(f"==================\n")
-        
-        # Store in session for PDF export (dates are already strings from POST)
-        request.session['itinerary'] = itinerary
-        request.session['destination'] = dest
-        request.session['num_days'] = num_days
-        request.session['departure_date'] = request.POST.get('departure_date', '')
-        request.session['return_date'] = request.POST.get('return_date', '')
-        
-        context = {
-            "source": source, 
-            "destination": dest,
-            "departure_date": departure_date,
-            "return_date": return_date,
-            "num_days": num_days,
-            "source_lat": source_lat,
-            "source_lng": source_lng,
-            "dest_lat": dest_lat,
-            "dest_lng": dest_lng,
-            "outbound_flights": flights_data,  # Changed key name for clarity
-            "flights": flights_data,  # Keep both for backward compatibility
-            "return_flights": return_flights_data,
-            "error_message": error_message,
-            "attractions": attractions,
-            "itinerary": itinerary,
-            "weather": weather_data,
-            "hotels": hotels_data,
-            "estimated_cost": total_cost if total_cost > 0 else None
-        }
+        search = parse_trip_search(request.POST)
+        record_search(search.dest, search.num_days)
+        results, failed_stages = run_stages(trip_search_stages(search, providers))
+        context = build_trip_context(search, results, failed_stages)
+        request.session.update(trip_session_data(search, context))
 
     return render(request, "globe/home.html", context)
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def itinerary_stream(request):
+    """Stream the itinerary for the last trip search as server-sent events"""
+    itinerary_request = request.session.get('itinerary_request')
+    if not itinerary_request:
+        return JsonResponse({'error': 'No trip search found'}, status=404)
+    weather = [DayWeather.from_dict(day) for day in request.session.get('trip_weather') or []]
+    departure_date = request.session.get('departure_date')
+
+    def events():
+        parts = []
+        try:
+            for text in stream_itinerary(
+                itinerary_request['destination'],
+                itinerary_request['attractions'],
+                itinerary_request['num_days'],
+            ):
+                parts.append(text)
+                yield sse_event('chunk', {'text': text})
+            itinerary = clean_itinerary(''.join(parts))
+            parsed_itinerary = parse_itinerary(itinerary)
+            add_day_weather(parsed_itinerary.days, weather, departure_date)
+            yield sse_event('done', {
+                'text': itinerary,
+                'html': render_to_string('globe/itinerary_days.html', {'parsed_itinerary': parsed_itinerary}),
+            })
+        except Exception as e:
+            print(f"Itinerary stream error: {e}")
+            yield sse_event('error', {'message': f"Could not generate itinerary: {str(e)}"})
+
+    return sse_response(events())
+
+
+def sse_response(events):
+    """A streaming response sending ``events`` (sync or async) as server-sent events"""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
+
 # Signup view
 def signup(request):
     if request.method == "POST":
@@ -492,131 +104,485 @@ class CustomLogoutView(LogoutView):
     next_page = "home"  # redirect after logout using URL name
 
 
-def parse_itinerary_for_pdf(itinerary_text):
-    """Parse itinerary text into structured data for PDF template"""
-    days = []
-    lines = itinerary_text.split('\n')
-    
-    current_day = None
-    current_time = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Day headers
-        if re.match(r'^Day\s+\d+', line, re.IGNORECASE):
-            if current_day and current_time:
-                current_day['times'].append(current_time)
-            if current_day:
-                days.append(current_day)
-                
-            match = re.match(r'Day\s+(\d+)[:\s]*(.*)', line, re.IGNORECASE)
-            day_num = match.group(1) if match else len(days) + 1
-            title = match.group(2).strip() if match and match.group(2) else ''
-            
-            current_day = {
-                'day_num': day_num,
-                'title': title,
-                'times': []
-            }
-            current_time = None
-            
-        # Time blocks
-        elif re.match(r'^(Morning|Afternoon|Evening|Night|Breakfast|Lunch|Dinner):', line, re.IGNORECASE):
-            if current_time:
-                current_day['times'].append(current_time)
-                
-            match = re.match(r'^([^:]+):(.*)', line)
-            time_name = match.group(1).strip()
-            content = match.group(2).strip()
-            
-            current_time = {
-                'time': time_name,
-                'items': []
-            }
-            if content:
-                current_time['items'].append({'type': 'text', 'content': content})
-                
-        # Activity items
-        elif re.match(r'^[\*\-•]\s+', line):
-            content = re.sub(r'^[\*\-•]\s+', '', line)
-            if current_time:
-                current_time['items'].append({'type': 'activity', 'content': content})
-            elif current_day:
-                if not current_day['times']:
-                    current_day['times'].append({'time': '', 'items': []})
-                current_day['times'][-1]['items'].append({'type': 'activity', 'content': content})
-                
-        # Regular text
-        else:
-            if current_time:
-                current_time['items'].append({'type': 'text', 'content': line})
-            elif current_day and current_day['times']:
-                current_day['times'][-1]['items'].append({'type': 'text', 'content': line})
+def itinerary_pdf_export(session):
+    """Return ``(key, context, filename)`` for the session's itinerary PDF, or None"""
+    itinerary = session_itinerary(session)
+    destination = session.get('destination', 'Trip')
+    num_days = session.get('num_days', 3)
+    departure_date = session.get('departure_date', '')
+    return_date = session.get('return_date', '')
     
-    # Add last time block and day
-    if current_time and current_day:
-        current_day['times'].append(current_time)
-    if current_day:
-        days.append(current_day)
-    
-    return days
+    weather = [DayWeather.from_dict(day) for day in session.get('trip_weather') or []]
+
+    if not itinerary:
+        return None
+    return pdf_export(itinerary, destination, num_days, departure_date, return_date, weather=weather)
+
+
+def pdf_job_payload(key, job):
+    payload = {
+        'status': job['status'],
+        'status_url': reverse('export_pdf_status', args=[key]),
+    }
+    if job['status'] == pdf_jobs.READY:
+        payload['download_url'] = reverse('export_pdf_download', args=[key])
+    if job.get('error'):
+        payload['error'] = 'Could not render the PDF. Please try again.'
+    return payload
+
+
+def pdf_download_response(key, filename):
+    response = FileResponse(open(pdf_jobs.pdf_path(key), 'rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 def export_itinerary_pdf(request):
-    """Export itinerary as PDF"""
-    try:
-        from weasyprint import HTML, CSS
-    except ImportError:
-        return HttpResponse("WeasyPrint not installed. Run: pip install weasyprint", status=500)
-    
-    # Get itinerary from session
-    itinerary = request.session.get('itinerary', '')
-    destination = request.session.get('destination', 'Trip')
-    num_days = request.session.get('num_days', 3)
-    departure_date = request.session.get('departure_date', '')
-    return_date = request.session.get('return_date', '')
-    
-    if not itinerary:
+    """Export itinerary as PDF.
+
+    The PDF is rendered in the background. Script clients asking for JSON
+    get the job status and poll it; a plain link waits briefly for the
+    render and then downloads it.
+    """
+    export = itinerary_pdf_export(request.session)
+    if export is None:
         return HttpResponse("No itinerary found. Please generate an itinerary first.", status=404)
-    
-    # Parse dates
-    if departure_date:
-        try:
-            departure_date = datetime.strptime(departure_date, '%Y-%m-%d')
-        except:
-            departure_date = None
-    
-    if return_date:
+    return pdf_export_response(request, export)
+
+
+def pdf_export_response(request, export):
+    """Start the background render for ``export`` and answer as described in ``export_itinerary_pdf``"""
+    key, context, filename = export
+    status = pdf_jobs.request_pdf(key, context, filename)
+
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(pdf_job_payload(key, pdf_jobs.pdf_job(key)), status=200 if status == pdf_jobs.READY else 202)
+
+    if status == pdf_jobs.PENDING:
+        status = pdf_jobs.wait_for_pdf(key, settings.PDF_EXPORT_WAIT)
+    if status == pdf_jobs.READY:
+        return pdf_download_response(key, filename)
+    if status == pdf_jobs.FAILED:
+        return HttpResponse("Could not render the PDF. Please try again.", status=500)
+
+    response = HttpResponse("Your PDF is still being prepared. This page will retry shortly.", status=202)
+    response['Refresh'] = '3'
+    return response
+
+
+def export_pdf_status(request, key):
+    """Poll endpoint for a background PDF render"""
+    if not pdf_jobs.is_valid_key(key):
+        return JsonResponse({'error': 'Unknown PDF'}, status=404)
+    return JsonResponse(pdf_job_payload(key, pdf_jobs.pdf_job(key)))
+
+
+def export_pdf_download(request, key):
+    """Serve a rendered PDF from the store"""
+    if not pdf_jobs.is_valid_key(key):
+        return HttpResponse("Unknown PDF", status=404)
+    job = pdf_jobs.pdf_job(key)
+    if job['status'] != pdf_jobs.READY:
+        return HttpResponse("This PDF is not ready yet.", status=404)
+    return pdf_download_response(key, job.get('filename') or 'Itinerary.pdf')
+
+
+def read_bulk_export(request):
+    """Return ``(trip_ids, format)`` from a bulk export request, or an error message"""
+    try:
+        data = json.loads(request.body)
+        trip_ids = [int(trip_id) for trip_id in data['trip_ids']]
+        export_format = data.get('format', 'pdf')
+    except (ValueError, TypeError, KeyError):
+        return None, "Send JSON with a list of trip_ids"
+    if export_format not in ('pdf', 'zip'):
+        return None, "format must be 'pdf' or 'zip'"
+    if not trip_ids:
+        return None, "No trips selected"
+    if len(trip_ids) > settings.BULK_EXPORT_MAX_TRIPS:
+        return None, f"At most {settings.BULK_EXPORT_MAX_TRIPS} trips can be exported at once"
+    return (list(dict.fromkeys(trip_ids)), export_format), None
+
+
+def export_trips_pdf(request):
+    """Export the itineraries of several saved trips at once.
+
+    POST ``{"trip_ids": [...], "format": "pdf" | "zip"}``. ``pdf`` renders one
+    combined document in the background and answers with the same job status
+    as the single export; ``zip`` streams one PDF per trip as they render.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Please log in to export saved trips'}, status=401)
+
+    parsed, error = read_bulk_export(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    trip_ids, export_format = parsed
+
+    trips = trips_with_itineraries().filter(user=request.user, pk__in=trip_ids, stored_itinerary__isnull=False)
+    trips_by_id = {trip.pk: trip for trip in trips}
+    missing = [trip_id for trip_id in trip_ids if trip_id not in trips_by_id]
+    if missing:
+        return JsonResponse({'error': 'No itinerary found for some trips', 'trip_ids': missing}, status=404)
+
+    trip_exports = [trip_pdf_export(trips_by_id[trip_id]) for trip_id in trip_ids]
+
+    if export_format == 'zip':
+        response = StreamingHttpResponse(exports.stream_pdf_zip(trip_exports), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="Itineraries.zip"'
+        return response
+
+    key, context, filename = exports.combined_pdf_export(trip_exports)
+    status = pdf_jobs.request_pdf(key, context, filename, template=pdf_jobs.BULK_PDF_TEMPLATE)
+    return JsonResponse(pdf_job_payload(key, pdf_jobs.pdf_job(key)), status=200 if status == pdf_jobs.READY else 202)
+
+
+@login_required
+def save_trip(request):
+    """Save the last trip search, itinerary included, to the user's trips"""
+    if request.method != 'POST':
+        return redirect('saved_trips')
+    if not request.session.get('destination'):
+        return HttpResponse("No trip search found. Please search for a trip first.", status=404)
+    trip = saved_trips.save_trip(request.user, request.session)
+    return redirect('saved_trip', trip_id=trip.pk)
+
+
+@login_required
+def saved_trip_list(request):
+    trips = SavedTrip.objects.filter(user=request.user)
+    return render(request, 'globe/saved_trips.html', {'trips': trips})
+
+
+@login_required
+def saved_trip(request, trip_id):
+    """Reopen a saved trip from the database, without calling any provider"""
+    trip = get_object_or_404(trips_with_itineraries(), pk=trip_id, user=request.user)
+    context = saved_trip_context(trip)
+    # So the chatbot and the session export pick up this trip
+    request.session.update(saved_trips.saved_trip_session_data(context))
+    context['export_pdf_url'] = reverse('saved_trip_pdf', args=[trip.pk])
+    if trip.share_token:
+        context['share_url'] = request.build_absolute_uri(reverse('shared_trip', args=[trip.share_token]))
+    return render(request, 'globe/home.html', context)
+
+
+@login_required
+def share_saved_trip(request, trip_id):
+    """Create the trip's share link"""
+    trip = get_object_or_404(SavedTrip, pk=trip_id, user=request.user)
+    if request.method == 'POST':
+        saved_trips.share_trip(trip)
+    return redirect('saved_trip', trip_id=trip.pk)
+
+
+def shared_trip(request, token):
+    """Read-only view of a shared trip"""
+    trip = get_object_or_404(trips_with_itineraries(), share_token=token)
+    context = saved_trip_context(trip)
+    context['shared'] = True
+    context['export_pdf_url'] = reverse('shared_trip_pdf', args=[token])
+    return render(request, 'globe/home.html', context)
+
+
+@login_required
+def saved_trip_pdf(request, trip_id):
+    trip = get_object_or_404(trips_with_itineraries(), pk=trip_id, user=request.user)
+    return saved_trip_pdf_response(request, trip)
+
+
+def shared_trip_pdf(request, token):
+    trip = get_object_or_404(trips_with_itineraries(), share_token=token)
+    return saved_trip_pdf_response(request, trip)
+
+
+def saved_trip_pdf_response(request, trip):
+    export = trip_pdf_export(trip)
+    if export is None:
+        return HttpResponse("This trip has no itinerary.", status=404)
+    return pdf_export_response(request, export)
+
+
+def read_fare_calendar_request(request):
+    """Return ``((source, destination, departure, return, window), error)``.
+
+    Each value comes from the query string, or else from the last trip search.
+    """
+    def value(name, session_name):
+        return request.GET.get(name) or request.session.get(session_name) or ''
+
+    source, destination = value('source', 'source'), value('destination', 'destination')
+    if not (source and destination):
+        return None, 'Search for a trip first'
+    departure_date = exports.parse_date(value('departure_date', 'departure_date'))
+    if not departure_date:
+        return None, 'departure_date must be a YYYY-MM-DD date'
+    return_value = value('return_date', 'return_date')
+    return_date = exports.parse_date(return_value)
+    if return_value and not return_date:
+        return None, 'return_date must be a YYYY-MM-DD date'
+    try:
+        window = int(request.GET.get('window', settings.FARE_CALENDAR_WINDOW))
+    except ValueError:
+        return None, 'window must be a number of days'
+    if not 0 <= window <= settings.FARE_CALENDAR_MAX_WINDOW:
+        return None, f'window must be between 0 and {settings.FARE_CALENDAR_MAX_WINDOW} days'
+    return (source, destination, departure_date.date(), return_date.date() if return_date else None, window), None
+
+
+def flexible_fares(request):
+    """Cheapest fares for the dates around the trip's, as a JSON price matrix"""
+    parsed, error = read_fare_calendar_request(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    source, destination, departure_date, return_date, window = parsed
+
+    access_token = providers.get_amadeus_token()
+    origin_code = providers.get_airport_code(source, access_token)
+    destination_code = providers.get_airport_code(destination, access_token)
+    if not (access_token and origin_code and destination_code):
+        return JsonResponse({'error': 'Flight search is unavailable for this route'}, status=502)
+
+    return JsonResponse(fare_calendar.fare_calendar(
+        providers, origin_code, destination_code, departure_date, return_date,
+        window=window, access_token=access_token,
+    ))
+
+
+def trip_cost(request):
+    """The last trip search's cost estimate, as JSON.
+
+    POST any of ``departure_date``, ``return_date``, ``outbound_flight``,
+    ``return_flight`` and ``hotel`` to change them; only the parts of the
+    estimate that depend on a changed input are recomputed. New dates also
+    search flights and hotels again, as the page's sections do, and
+    ``itinerary_stale`` tells whether the itinerary is for other dates.
+    """
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    estimate = request.session.get('trip_costs')
+    if not estimate:
+        return JsonResponse({'error': 'Search for a trip first'}, status=404)
+
+    recomputed = []
+    if request.method == 'POST':
         try:
-            return_date = datetime.strptime(return_date, '%Y-%m-%d')
-        except:
-            return_date = None
-    
-    # Parse itinerary
-    parsed_itinerary = parse_itinerary_for_pdf(itinerary)
-    
-    # Render HTML
-    context = {
-        'destination': destination,
-        'num_days': num_days,
-        'departure_date': departure_date,
-        'return_date': return_date,
-        'parsed_itinerary': parsed_itinerary,
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Send a JSON object of changes'}, status=400)
+        changes, error = cost_estimate.read_changes(estimate, data)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        if any(changes.get(name, estimate[name]) != estimate[name] for name in cost_estimate.DATE_INPUTS):
+            changes = repriced_changes(request.session, estimate, changes)
+
+        recomputed = update_session_estimate(request.session, estimate, changes)
+
+    return JsonResponse({
+        **cost_estimate.estimate_summary(estimate),
+        'recomputed': recomputed,
+        'itinerary_stale': itinerary_is_stale(request.session),
+    })
+
+
+def repriced_changes(session, estimate, changes):
+    """``changes`` plus the flight and hotel offers for the new dates they set.
+
+    Runs only the flight, hotel and weather stages, through the same cached
+    providers as ``trip_section``, and moves the session's trip, its days
+    and its weather to the new dates. The cheapest offers are chosen,
+    except a hotel asked for in ``changes`` (or already chosen) that is
+    still offered. A section whose search fails keeps its old offers, which
+    the estimate then lists as stale.
+    """
+    search = parse_trip_search({
+        'source_city': session.get('source') or '',
+        'destination_city': session.get('destination') or '',
+        'departure_date': changes['departure_date'],
+        'return_date': changes['return_date'],
+    })
+    all_stages = trip_search_stages(search, providers, stream_itinerary=False)
+    results, failed_stages = run_stages(
+        select_stages(all_stages, SECTIONS['flights'][0] + SECTIONS['hotels'][0] + SECTIONS['weather'][0])
+    )
+    hotel = changes.get('hotel', estimate['hotel'])
+    changes = dict(changes)
+    for section in ('flights', 'hotels'):
+        targets, section_context = SECTIONS[section]
+        if any(stage.name in failed_stages for stage in select_stages(all_stages, targets)):
+            continue
+        changes.update(section_cost_changes(search, section, section_context(search, results)))
+    if hotel in changes.get('hotels', ()):
+        changes['hotel'] = hotel
+    session.update(trip_dates_session_data(search, results))
+    return changes
+
+
+def update_session_estimate(session, estimate, changes):
+    """Apply ``changes`` to the session's cost estimate; returns the parts recomputed"""
+    rates = providers.get_exchange_rates(settings.COST_CURRENCY)
+    recomputed = cost_estimate.update_estimate(estimate, changes, rates)
+    # Saving the trip keeps the chosen flights and the new total
+    session.update({
+        'trip_costs': estimate,
+        'estimated_cost': cost_estimate.estimate_total(estimate),
+        'outbound_flight': cost_estimate.chosen_offer(estimate, 'outbound_flight'),
+        'return_flight': cost_estimate.chosen_offer(estimate, 'return_flight'),
+    })
+    return recomputed
+
+
+def read_section_search(request):
+    """Return ``(TripSearch, error)`` for a section request.
+
+    Like the fare calendar, each value comes from the query string (or the
+    POST data), or else from the last trip search; an empty ``return_date``
+    makes it one way.
+    """
+    session = request.session
+    params = request.POST if request.method == 'POST' else request.GET
+    values = {
+        'source_city': params.get('source') or session.get('source') or '',
+        'destination_city': params.get('destination') or session.get('destination') or '',
+        'departure_date': params.get('departure_date', session.get('departure_date') or ''),
+        'return_date': params.get('return_date', session.get('return_date') or ''),
     }
+    if not (values['source_city'] and values['destination_city']):
+        return None, 'Search for a trip first'
+    departure_date = exports.parse_date(values['departure_date'])
+    if values['departure_date'] and not departure_date:
+        return None, 'departure_date must be a YYYY-MM-DD date'
+    return_date = exports.parse_date(values['return_date'])
+    if values['return_date'] and not return_date:
+        return None, 'return_date must be a YYYY-MM-DD date'
+    if departure_date and return_date and return_date < departure_date:
+        return None, 'The return date must not be before the departure date'
+    return parse_trip_search(values), None
+
+
+def trip_section(request, section):
+    """One section of the home page (flights, hotels, weather, attractions or
+    itinerary) as JSON, with its HTML for the page to swap in.
+
+    Only the stages the section needs are run, through the same cached
+    providers as the full search: changing the dates searches flights and
+    hotels again but never geocodes, looks up places or asks for an
+    itinerary.
+
+    GET only reads: the itinerary comes from the cache, if it's there. POST
+    plans a new itinerary, and for a section of the session's trip also
+    updates the session and its cost estimate, so saving or exporting the
+    trip uses the new dates.
+    """
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if section not in SECTIONS:
+        return JsonResponse({'error': f'Unknown section: {section}'}, status=404)
+    search, error = read_section_search(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    session = request.session
+    update_session = (
+        request.method == 'POST'
+        and session.get('source') == search.source and session.get('destination') == search.dest
+    )
+    targets, section_context = SECTIONS[section]
+    if update_session:
+        # The session's trip takes its weather from the same forecast
+        targets += SECTIONS['weather'][0]
+    if section == 'itinerary' and request.method == 'POST':
+        record_search(search.dest, search.num_days)
+    all_stages = trip_search_stages(search, providers, stream_itinerary=request.method == 'GET')
+    results, failed_stages = run_stages(select_stages(all_stages, targets))
+    context = {**search_context(search), **section_context(search, results)}
+    if section == 'itinerary':
+        # Nothing is streamed to a section: it was generated here, or isn't cached
+        context['itinerary_stream_url'] = None
+    payload = {
+        'section': section,
+        'departure_date': search.departure_date,
+        'return_date': search.return_date,
+        'num_days': search.num_days,
+        'unavailable_sections': sorted(failed_stages),
+    }
+
+    if update_session:
+        session.update(section_session_data(search, section, results, context))
+        estimate = session.get('trip_costs')
+        changes = section_cost_changes(search, section, context)
+        if estimate and changes:
+            update_session_estimate(session, estimate, changes)
+            # Flight and hotel cards offer to use them in the estimate
+            context['cost_summary'] = payload['cost'] = cost_estimate.estimate_summary(estimate)
+        payload['itinerary_stale'] = itinerary_is_stale(session)
+
+    payload['html'] = render_to_string(f'globe/{section}_section.html', context, request=request)
+    return JsonResponse(payload)
+
+
+@staff_member_required
+def cache_report(request):
+    """Hit rates and lifetimes of the provider caches, for staff"""
+    return render(request, "globe/cache_report.html", {
+        'rows': build_cache_report(),
+        'local_entries': len(local_cache),
+        'local_max_entries': local_cache.max_entries,
+    })
+
+def build_chat_context(session, user_message):
+    """Build the Gemini prompt for a chat message from the session's history"""
+    # Get conversation history from session
+    conversation_history = session.get('chat_history', [])
     
-    html_string = render_to_string('globe/itinerary_pdf.html', context)
+    # Get destination context if available
+    destination = session.get('destination', '')
+    context = f"The user is planning a trip to {destination}. " if destination else ""
+    outline = parse_itinerary(session_itinerary(session)).outline()
+    if outline:
+        context += f"Their itinerary so far:\n{outline}\n"
     
-    # Generate PDF
-    pdf_file = HTML(string=html_string).write_pdf()
+    # Build conversation context
+    chat_context = (
+        f"You are WanderMate, a friendly and knowledgeable travel assistant. {context}"
+        "Provide helpful, specific travel advice and recommendations. "
+        "Keep responses concise (2-3 paragraphs max) and friendly. "
+        "If asked about specific places, provide practical tips like best time to visit, must-see spots, local food, etc.\n\n"
+    )
     
-    # Return PDF response
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{destination}_{num_days}Day_Itinerary.pdf"'
+    # Add conversation history
+    for msg in conversation_history[-6:]:  # Last 3 exchanges
+        chat_context += f"User: {msg['user']}\nAssistant: {msg['bot']}\n\n"
     
-    return response
+    chat_context += f"User: {user_message}\nAssistant:"
+    return chat_context
+
+
+def save_chat_exchange(session, user_message, bot_response):
+    """Append an exchange to the session's chat history"""
+    conversation_history = session.get('chat_history', [])
+    conversation_history.append({
+        'user': user_message,
+        'bot': bot_response
+    })
+    
+    # Keep only last 10 exchanges
+    session['chat_history'] = conversation_history[-10:]
+
+
+def get_chat_model():
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel("gemini-2.5-flash")
+
+
+def read_chat_message(request):
+    """Return the user's message from a JSON chat request, or '' if missing"""
+    data = json.loads(request.body)
+    return data.get('message', '').strip()
 
 
 @csrf_exempt
@@ -624,52 +590,17 @@ def chatbot(request):
     """AI Travel Chatbot using Gemini"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            user_message = data.get('message', '').strip()
+            user_message = read_chat_message(request)
             
             if not user_message:
                 return JsonResponse({'error': 'Message is required'}, status=400)
             
-            # Get conversation history from session
-            conversation_history = request.session.get('chat_history', [])
-            
-            # Get destination context if available
-            destination = request.session.get('destination', '')
-            context = f"The user is planning a trip to {destination}. " if destination else ""
-            
-            # Configure Gemini
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            
-            # Build conversation context
-            chat_context = (
-                f"You are WanderMate, a friendly and knowledgeable travel assistant. {context}"
-                "Provide helpful, specific travel advice and recommendations. "
-                "Keep responses concise (2-3 paragraphs max) and friendly. "
-                "If asked about specific places, provide practical tips like best time to visit, must-see spots, local food, etc.\n\n"
-            )
-            
-            # Add conversation history
-            for msg in conversation_history[-6:]:  # Last 3 exchanges
-                chat_context += f"User: {msg['user']}\nAssistant: {msg['bot']}\n\n"
-            
-            chat_context += f"User: {user_message}\nAssistant:"
-            
             # Generate response
-            response = model.generate_content(chat_context)
+            model = get_chat_model()
+            response = model.generate_content(build_chat_context(request.session, user_message))
             bot_response = response.text.strip()
             
-            # Update conversation history
-            conversation_history.append({
-                'user': user_message,
-                'bot': bot_response
-            })
-            
-            # Keep only last 10 exchanges
-            if len(conversation_history) > 10:
-                conversation_history = conversation_history[-10:]
-            
-            request.session['chat_history'] = conversation_history
+            save_chat_exchange(request.session, user_message, bot_response)
             
             return JsonResponse({
                 'response': bot_response,
@@ -686,6 +617,47 @@ def chatbot(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
+@csrf_exempt
+def chatbot_stream(request):
+    """AI Travel Chatbot that streams the reply as server-sent events"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        user_message = read_chat_message(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not user_message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+
+    chat_context = build_chat_context(request.session, user_message)
+
+    # The session middleware saves the session before the body is streamed,
+    # so make sure it is saved (and its cookie sent) now, and save the
+    # updated history ourselves once the reply is complete.
+    request.session.setdefault('chat_history', [])
+    request.session.modified = True
+
+    def events():
+        parts = []
+        try:
+            model = get_chat_model()
+            for chunk in model.generate_content(chat_context, stream=True):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield sse_event('chunk', {'text': chunk.text})
+
+            bot_response = ''.join(parts).strip()
+            save_chat_exchange(request.session, user_message, bot_response)
+            request.session.save()
+            yield sse_event('done', {'text': bot_response})
+        except Exception as e:
+            print(f"Chatbot error: {e}")
+            yield sse_event('error', {'message': 'Sorry, I encountered an error. Please try again.'})
+
+    return sse_response(events())
+
+
 def clear_chat(request):
     """Clear chat history"""
     if 'chat_history' in request.session:
@@ -0,0 +1,171 @@
+"""Weather for the trip's dates, from OpenWeather's 5-day forecast.
+
+The forecast comes as up to 40 three-hour slots. ``get_weather`` fetches
+all of them once per city and forecast run (a new run comes out every three
+hours) and ``parse_forecast`` keeps only what is used here, so the cached
+entry stays small.
+
+``ForecastTable`` lays the slots out as columns and ``daily`` aggregates
+them per local day in one pass over the columns: lowest and highest
+temperature, total rain and snow, highest chance of precipitation and the
+most frequent conditions. ``trip_weather`` picks the days of the trip; the
+page, the itinerary's days and the PDF all show those same summaries.
+"""
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+SLOT_HOURS = 3
+SECONDS_PER_DAY = 24 * 60 * 60
+EPOCH_DATE = date(1970, 1, 1)
+
+# Slot fields kept from the API, in this order
+SLOT_FIELDS = ('dt', 'temp', 'temp_min', 'temp_max', 'precipitation', 'pop', 'humidity', 'wind', 'description')
+
+# A day counts as wet from this much rain or snow (mm), or this chance of it
+WET_PRECIPITATION = 1.0
+WET_CHANCE = 0.5
+# Highest temperature (°C) from which a day counts as each band, warmest first
+TEMPERATURE_BANDS = ((32, 'hot'), (24, 'warm'), (15, 'mild'), (5, 'cool'))
+
+
+def forecast_run(now=None):
+    """The forecast run current at ``now``: the UTC time rounded down to three hours, e.g. ``2030-11-10T09``"""
+    now = now or datetime.now(timezone.utc)
+    return now.replace(hour=now.hour - now.hour % SLOT_HOURS).strftime('%Y-%m-%dT%H')
+
+
+def parse_forecast(data):
+    """The compact forecast cached for a city: its name, UTC offset and slots as rows of ``SLOT_FIELDS``"""
+    slots = []
+    for slot in data.get('list', []):
+        try:
+            main = slot['main']
+            precipitation = (slot.get('rain') or {}).get('3h', 0) + (slot.get('snow') or {}).get('3h', 0)
+            slots.append([
+                slot['dt'], main['temp'], main.get('temp_min', main['temp']), main.get('temp_max', main['temp']),
+                precipitation, slot.get('pop', 0), main.get('humidity'), (slot.get('wind') or {}).get('speed'),
+                (slot.get('weather') or [{}])[0].get('description', ''),
+            ])
+        except (KeyError, TypeError) as e:
+            print(f"Skipping unreadable forecast slot: {e}")
+    city = data.get('city') or {}
+    return {'city': city.get('name'), 'timezone': city.get('timezone') or 0, 'slots': slots}
+
+
+@dataclass(slots=True)
+class DayWeather:
+    day: date
+    temp_min: float
+    temp_max: float
+    precipitation: float  # mm of rain and snow
+    pop: float  # Highest chance of precipitation, 0 to 1
+    description: str
+
+    @property
+    def is_wet(self):
+        return self.precipitation >= WET_PRECIPITATION or self.pop >= WET_CHANCE
+
+    @property
+    def chance_percent(self):
+        return round(self.pop * 100)
+
+    @property
+    def outlook(self):
+        """A coarse description for the itinerary's day, e.g. ``'warm, rain likely'``"""
+        band = next((name for temperature, name in TEMPERATURE_BANDS if self.temp_max >= temperature), 'cold')
+        return f"{band}, {'rain likely' if self.is_wet else 'mostly dry'}"
+
+    def as_dict(self):
+        """Plain data for the session; ``from_dict`` rebuilds the day"""
+        return {
+            'day': self.day.isoformat(), 'temp_min': self.temp_min, 'temp_max': self.temp_max,
+            'precipitation': self.precipitation, 'pop': self.pop, 'description': self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(date.fromisoformat(data['day']), data['temp_min'], data['temp_max'],
+                   data['precipitation'], data['pop'], data['description'])
+
+
+class ForecastTable:
+    """A city's forecast slots, with their numbers as columns"""
+
+    def __init__(self, data):
+        self.city = data['city']
+        offset = data['timezone']
+        slots = data['slots']
+        # Seconds since 1970 in the city's local time, so days split at local midnight
+        self.time = array('q', [slot[0] + offset for slot in slots])
+        self.temp = array('d', [slot[1] for slot in slots])
+        self.temp_min = array('d', [slot[2] for slot in slots])
+        self.temp_max = array('d', [slot[3] for slot in slots])
+        self.precipitation = array('d', [slot[4] for slot in slots])
+        self.pop = array('d', [slot[5] for slot in slots])
+        self.humidity = [slot[6] for slot in slots]
+        self.wind = [slot[7] for slot in slots]
+        self.description = [slot[8] for slot in slots]
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def current(self):
+        """The first slot, as the page shows the weather now, or None without slots"""
+        if not self:
+            return None
+        return {'temp': self.temp[0], 'description': self.description[0],
+                'humidity': self.humidity[0], 'wind': self.wind[0]}
+
+    def daily(self):
+        """A ``DayWeather`` per local day of the forecast, in order"""
+        days = []
+        day_numbers = [t // SECONDS_PER_DAY for t in self.time]
+        start = 0
+        # Slots come in time order, so each day is one run of the columns
+        for end in range(1, len(day_numbers) + 1):
+            if end < len(day_numbers) and day_numbers[end] == day_numbers[start]:
+                continue
+            days.append(DayWeather(
+                EPOCH_DATE + timedelta(days=day_numbers[start]),
+                min(self.temp_min[start:end]),
+                max(self.temp_max[start:end]),
+                round(sum(self.precipitation[start:end]), 1),
+                max(self.pop[start:end]),
+                Counter(self.description[start:end]).most_common(1)[0][0],
+            ))
+            start = end
+        return days
+
+
+def trip_weather(weather, departure_date, num_days):
+    """The forecast days within the trip, first day first; days beyond the forecast are left out.
+
+    ``weather`` is the compact forecast from ``get_weather`` (or None);
+    ``departure_date`` a ``YYYY-MM-DD`` string.
+    """
+    if not weather:
+        return []
+    try:
+        first = date.fromisoformat(departure_date)
+    except (TypeError, ValueError):
+        return []
+    last = first + timedelta(days=num_days - 1)
+    return [day for day in ForecastTable(weather).daily() if first <= day.day <= last]
+
+
+def add_day_weather(itinerary_days, days, departure_date):
+    """Give each itinerary day the forecast for its date, as ``weather``.
+
+    Itineraries are cached without the trip's dates, so the forecast is
+    added when one is shown; days the forecast doesn't reach are left as
+    they are.
+    """
+    if not days:
+        return
+    first = date.fromisoformat(departure_date)
+    by_day_num = {(day.day - first).days + 1: day for day in days}
+    for itinerary_day in itinerary_days:
+        itinerary_day.weather = by_day_num.get(itinerary_day.day_num)
@@ -3,6 +3,10 @@ ASGI config for plannerproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Set ASYNC_VIEWS=true and serve it with an ASGI server, e.g.
+``uvicorn plannerproject.asgi:application``, to run the trip search and
+chatbot on the event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
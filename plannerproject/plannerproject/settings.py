@@ -134,6 +134,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # API's and Redirects
 load_dotenv(BASE_DIR / '.env')
 
+LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
@@ -146,4 +147,155 @@ if not AMADEUS_API_KEY or not AMADEUS_API_SECRET:
         "Amadeus API credentials are required. "
         "Please set AMADEUS_API_KEY and AMADEUS_API_SECRET environment variables."
     )
-OPENCAGE_API_KEY = os.environ.get('OPENCAGE_API_KEY')
\ No newline at end of file
+OPENCAGE_API_KEY = os.environ.get('OPENCAGE_API_KEY')
+
+# Trip search pipeline timeouts (seconds). Stages that run past their timeout
+# are dropped from the page instead of holding up the whole response.
+TRIP_SEARCH_TIMEOUT = float(os.environ.get('TRIP_SEARCH_TIMEOUT', 45))
+TRIP_SEARCH_STAGE_TIMEOUT = float(os.environ.get('TRIP_SEARCH_STAGE_TIMEOUT', 10))
+TRIP_SEARCH_ITINERARY_TIMEOUT = float(os.environ.get('TRIP_SEARCH_ITINERARY_TIMEOUT', 30))
+TRIP_SEARCH_MAX_WORKERS = int(os.environ.get('TRIP_SEARCH_MAX_WORKERS', 8))
+
+# Refresh the shared Amadeus OAuth token this many seconds before it expires
+AMADEUS_TOKEN_REFRESH_MARGIN = int(os.environ.get('AMADEUS_TOKEN_REFRESH_MARGIN', 120))
+
+# Outbound provider HTTP clients (see globe/clients.py). Override any of these
+# per provider in PROVIDER_CLIENTS, e.g. {'amadeus': {'read_timeout': 20}}.
+PROVIDER_CONNECT_TIMEOUT = float(os.environ.get('PROVIDER_CONNECT_TIMEOUT', 3.05))
+PROVIDER_READ_TIMEOUT = float(os.environ.get('PROVIDER_READ_TIMEOUT', 10))
+PROVIDER_MAX_RETRIES = int(os.environ.get('PROVIDER_MAX_RETRIES', 2))
+PROVIDER_BACKOFF = float(os.environ.get('PROVIDER_BACKOFF', 0.25))
+PROVIDER_POOL_SIZE = int(os.environ.get('PROVIDER_POOL_SIZE', 20))
+PROVIDER_BREAKER_THRESHOLD = int(os.environ.get('PROVIDER_BREAKER_THRESHOLD', 5))
+PROVIDER_BREAKER_COOLDOWN = float(os.environ.get('PROVIDER_BREAKER_COOLDOWN', 30))
+PROVIDER_CLIENTS = {}
+
+# Airport codes resolved through the Amadeus API are shared via the cache
+AIRPORT_CODE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Geocoded coordinates barely change; failed lookups are retried sooner
+GEOCODE_CACHE_TIMEOUT = 60 * 60 * 24 * 90
+GEOCODE_MISS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Shared cache, so every worker and restart sees the same itineraries, tokens
+# and counters. Set CACHE_URL to a redis:// URL for Redis or any
+# Redis-compatible server; otherwise entries are stored as files in CACHE_DIR.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+ITINERARY_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Stream new itineraries to the page instead of generating them inside the
+# trip-search POST
+ITINERARY_STREAMING = os.environ.get('ITINERARY_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+
+# Serve the trip search and chatbot with async views. Only worth turning on
+# under an ASGI server (see plannerproject/asgi.py); under WSGI each async
+# view still occupies a worker for the whole request.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Answer every provider call from the recorded fixtures in
+# globe/data/provider_fixtures instead of the network (see globe/stubs.py)
+PROVIDER_STUBS = os.environ.get('PROVIDER_STUBS', 'false').lower() in ('1', 'true', 'yes')
+PROVIDER_STUB_LATENCY = float(os.environ.get('PROVIDER_STUB_LATENCY', 0.2))
+PROVIDER_STUB_ERROR_RATE = float(os.environ.get('PROVIDER_STUB_ERROR_RATE', 0))
+
+# Itinerary PDFs are rendered in a pool of worker processes and kept on disk,
+# keyed by a hash of their content, so repeat exports skip rendering
+PDF_STORE_DIR = os.environ.get('PDF_STORE_DIR', BASE_DIR / 'pdf_store')
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_TIMEOUT = 120
+# How long a plain (non-JavaScript) export request waits for its PDF
+PDF_EXPORT_WAIT = 15
+# How long a stored PDF (and its download name) is kept
+PDF_STORE_TIMEOUT = 60 * 60 * 24 * 30
+# How often an export sweeps PDFs older than PDF_STORE_TIMEOUT from the store
+PDF_STORE_SWEEP_INTERVAL = 60 * 60
+# Most saved trips one bulk export may include
+BULK_EXPORT_MAX_TRIPS = int(os.environ.get('BULK_EXPORT_MAX_TRIPS', 200))
+
+# Pre-generate the itineraries of the most searched (destination, days) pairs
+# with "manage.py pregenerate_itineraries" (run it from cron, or with --every)
+PREGENERATE_TOP_TRIPS = int(os.environ.get('PREGENERATE_TOP_TRIPS', 50))
+# Only count destinations searched within this many days
+PREGENERATE_WINDOW_DAYS = 30
+PREGENERATE_CONCURRENCY = int(os.environ.get('PREGENERATE_CONCURRENCY', 4))
+# Stay under the Gemini quota; shared by all pregeneration threads
+GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 10))
+# Regenerate an itinerary when its cache entry has less than this left
+ITINERARY_REFRESH_MARGIN = 60 * 60 * 24
+
+# Identical provider calls in flight at the same time (in this process or,
+# through the shared cache, in any worker) share one upstream call. A caller
+# waits at most this many seconds for the call it joined before making its own,
+# and never past the deadline of the trip search stage it runs in.
+SINGLEFLIGHT_WAIT = int(os.environ.get('SINGLEFLIGHT_WAIT', 30))
+# How long a finished call's result stays in the cache for other workers' waiters
+SINGLEFLIGHT_RESULT_TIMEOUT = 10
+
+# How long (seconds) each provider's responses are cached: attractions
+# barely change, forecasts update every few hours, fares hold for minutes
+PROVIDER_CACHE_TTLS = {
+    'google_places': 60 * 60 * 24 * 7,
+    'weather': 60 * 60 * 3,
+    'flights': 60 * 10,
+    'hotel_list': 60 * 60 * 24 * 7,
+    'hotel_offers': 60 * 30,
+    'exchange_rates': 60 * 60 * 12,
+}
+# How much longer an expired response may still be served while it is
+# refreshed in the background
+PROVIDER_CACHE_STALE = {
+    'google_places': 60 * 60 * 24,
+    # Each forecast run is cached under its own key, so none is served past its run
+    'weather': 0,
+    'flights': 60 * 2,
+    'hotel_list': 60 * 60 * 24,
+    'hotel_offers': 60 * 10,
+    'exchange_rates': 60 * 60 * 24,
+}
+# Responses each process keeps in memory in front of the shared cache
+PROVIDER_CACHE_LOCAL_ENTRIES = int(os.environ.get('PROVIDER_CACHE_LOCAL_ENTRIES', 500))
+
+# Fare calendar: how many days either side of the trip's dates to search by
+# default and at most, and how many flight searches run at once
+FARE_CALENDAR_WINDOW = 3
+FARE_CALENDAR_MAX_WINDOW = 7
+FARE_CALENDAR_CONCURRENCY = int(os.environ.get('FARE_CALENDAR_CONCURRENCY', 4))
+
+# Flight offers requested per search (the API allows up to 250); the page
+# shows the FLIGHT_RESULTS_SHOWN best, ranked by FLIGHT_RANKING (any of
+# price, duration, stops, departure, arrival; '-' for descending)
+FLIGHT_SEARCH_MAX_OFFERS = int(os.environ.get('FLIGHT_SEARCH_MAX_OFFERS', 50))
+FLIGHT_RESULTS_SHOWN = 5
+FLIGHT_RANKING = ('price', 'duration')
+
+# Hotel search: the HOTEL_SEARCH_HOTELS hotels nearest the city centre
+# (within HOTEL_SEARCH_RADIUS km) are priced for the trip's dates,
+# HOTEL_OFFERS_CHUNK_SIZE per request with up to HOTEL_OFFERS_CONCURRENCY
+# requests at once. The search waits at most HOTEL_SEARCH_BUDGET seconds for
+# prices and shows the HOTEL_RESULTS_SHOWN best.
+HOTEL_SEARCH_RADIUS = 20
+HOTEL_SEARCH_HOTELS = int(os.environ.get('HOTEL_SEARCH_HOTELS', 40))
+HOTEL_OFFERS_CHUNK_SIZE = 20
+HOTEL_OFFERS_CONCURRENCY = int(os.environ.get('HOTEL_OFFERS_CONCURRENCY', 8))
+HOTEL_SEARCH_BUDGET = float(os.environ.get('HOTEL_SEARCH_BUDGET', 4))
+HOTEL_RESULTS_SHOWN = 5
+
+# Currency of the trip cost estimate; prices and daily spend in other
+# currencies are converted with the exchange-rate table for it
+COST_CURRENCY = 'INR'